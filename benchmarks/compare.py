@@ -0,0 +1,55 @@
+"""Porównanie dwóch wyników benchmarks.hot_paths (np. przed i po aktualizacji zależności).
+
+Uruchomienie: python -m benchmarks.compare before.json after.json --threshold 1.2
+Kod wyjścia 1, gdy którykolwiek przypadek jest wolniejszy o więcej niż `threshold` razy.
+"""
+import argparse
+import json
+import sys
+
+
+def load_results(path: str) -> tuple[dict, dict[str, dict]]:
+    with open(path) as file:
+        data = json.load(file)
+    return data, {result["name"]: result for result in data["results"]}
+
+def compare(baseline_path: str, candidate_path: str, threshold: float) -> list[dict]:
+    baseline, baseline_results = load_results(baseline_path)
+    candidate, candidate_results = load_results(candidate_path)
+    if baseline["parameters"] != candidate["parameters"]:
+        print(f"Uwaga: różne parametry pomiaru: {baseline['parameters']} vs {candidate['parameters']}", file=sys.stderr)
+
+    rows = []
+    for name, before in baseline_results.items():
+        after = candidate_results.get(name)
+        if after is None:
+            continue
+        ratio = after["median_us"] / before["median_us"] if before["median_us"] else None
+        rows.append({
+            "name": name,
+            "before_us": before["median_us"],
+            "after_us": after["median_us"],
+            "ratio": round(ratio, 3) if ratio is not None else None,
+            "regression": ratio is not None and ratio > threshold,
+        })
+    return rows
+
+def format_table(rows: list[dict]) -> str:
+    width = max([len(row["name"]) for row in rows] + [4])
+    lines = [f"{'case':<{width}}  {'before_us':>12}  {'after_us':>12}  {'ratio':>7}"]
+    for row in rows:
+        marker = "  <-- regresja" if row["regression"] else ""
+        lines.append(f"{row['name']:<{width}}  {row['before_us']:>12.3f}  {row['after_us']:>12.3f}  {row['ratio']:>7.3f}{marker}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline", help="Wynik bazowy (JSON)")
+    parser.add_argument("candidate", help="Wynik porównywany (JSON)")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Dopuszczalny stosunek czasów (candidate / baseline)")
+    parser.add_argument("--json", action="store_true", help="Wynik w JSON zamiast tabeli")
+    args = parser.parse_args()
+    rows = compare(args.baseline, args.candidate, args.threshold)
+    print(json.dumps(rows, indent=2) if args.json else format_table(rows))
+    sys.exit(1 if any(row["regression"] for row in rows) else 0)
@@ -0,0 +1,70 @@
+"""Koszt budowy i serializacji punktów GPS z wierszy QuestDB: walidacja Pydantic vs zaufana ścieżka (model_construct + orjson).
+
+Uruchomienie: python -m benchmarks.gps_serialization --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+from fitapp_api.gps.models import GPSPoint
+from fitapp_api.gps.encoding import encode_points_json
+from fitapp_api.misc import gps_points_from_rows
+
+COLUMNS = ("timestamp", "user_id", "session_id", "last_entry", "latitude", "longitude", "activity")
+POINTS_ADAPTER = TypeAdapter(list[GPSPoint])
+
+
+def generate_rows(count: int) -> list[tuple]:
+    """Wiersze w kształcie zwracanym przez asyncpg dla gps_points (symbole jako tekst)."""
+    started = datetime(2025, 1, 1, 8, 0, 0)
+    return [
+        (started + timedelta(seconds=i), "1", "1735718400_1", "true" if i == count - 1 else "false", 50.06 + i * 1e-5, 19.94 + i * 1e-5, 1)
+        for i in range(count)
+    ]
+
+def validated_path(rows: list[tuple]) -> bytes:
+    """Dotychczasowa ścieżka: GPSPoint(**row), walidacja response_model i serializacja JSONResponse."""
+    points = [GPSPoint(**dict(zip(COLUMNS, row))) for row in rows]
+    validated = POINTS_ADAPTER.validate_python(points)
+    return JSONResponse(content=jsonable_encoder(validated)).body
+
+def trusted_path(rows: list[tuple]) -> bytes:
+    return encode_points_json(gps_points_from_rows(rows))
+
+def measure(path, rows: list[tuple], repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = path(rows)
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    return {
+        "best_s": round(best, 4),
+        "per_point_us": round(best / len(rows) * 1e6, 3),
+        "body_bytes": len(body),
+    }
+
+def main(sizes: list[int], repeat: int) -> list[dict]:
+    results = []
+    for size in sizes:
+        rows = generate_rows(size)
+        validated = measure(validated_path, rows, repeat)
+        trusted = measure(trusted_path, rows, repeat)
+        results.append({
+            "points": size,
+            "validated": validated,
+            "trusted": trusted,
+            "speedup": round(validated["best_s"] / trusted["best_s"], 1) if trusted["best_s"] else None,
+        })
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="Liczby punktów w sesji")
+    parser.add_argument("--repeat", type=int, default=3, help="Liczba powtórzeń (raportowany najlepszy czas)")
+    args = parser.parse_args()
+    print(json.dumps(main(args.sizes, args.repeat), indent=2))
@@ -0,0 +1,149 @@
+"""Mikrobenchmarki ścieżek CPU wykonywanych przy każdym żądaniu; wynik w JSON do porównania między commitami.
+
+Uruchomienie: python -m benchmarks.hot_paths --points 3600 --trips 1000 --output before.json
+Porównanie:   python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from importlib import metadata
+from typing import Any, Callable, NamedTuple
+from pydantic import TypeAdapter
+from fitapp_api.gps.encoding import encode_points_json
+from fitapp_api.gps.models import GPSPoint
+from fitapp_api.misc import gps_points_from_rows
+from fitapp_api.statistics.router import generate_statistics_for_trips, split_trips_into_activities
+from fitapp_api.trips.models import Trip, TripResponse
+from fitapp_api.trips.accumulators import calculate_trip_metrics
+from fitapp_api.users.cache import user_cache
+from fitapp_api.users.models import User
+from fitapp_api.users.router import create_access_token, get_current_user
+from benchmarks.synthetic import generate_point_rows, generate_track_points, generate_trips, parse_activity_mix, pick_activity
+
+PACKAGES = ("fastapi", "pydantic", "pydantic-core", "sqlmodel", "numpy", "haversine", "python-jose", "orjson")
+POINT_COLUMNS = ("timestamp", "user_id", "session_id", "last_entry", "latitude", "longitude", "activity")
+
+
+class Case(NamedTuple):
+    name: str
+    function: Callable[[], Any]
+    items: int
+
+
+def run_coroutine(coroutine) -> Any:
+    """Wykonanie korutyny, która nie zawiesza się (np. get_current_user z trafieniem w cache) - bez narzutu pętli zdarzeń."""
+    try:
+        coroutine.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coroutine.close()
+    raise RuntimeError("Korutyna oczekuje na I/O - nie nadaje się do mikrobenchmarku")
+
+def build_cases(points_count: int, trips_count: int, activity_mix: dict, seed: int) -> list[Case]:
+    rng = random.Random(seed)
+    points = generate_track_points(session_id="1735718400_1", user_id=1, count=points_count, activity=pick_activity(rng, activity_mix), rng=rng)
+    rows = generate_point_rows(points)
+    row_dicts = [dict(zip(POINT_COLUMNS, row)) for row in rows]
+    trusted_points = gps_points_from_rows(rows)
+    points_adapter = TypeAdapter(list[GPSPoint])
+
+    trips = generate_trips(count=trips_count, activity_mix=activity_mix, seed=seed)
+    trip = Trip(id=1, session_id=points[0].session_id, user_id=1, started_at=points[0].timestamp)
+    trip.summary, _ = calculate_trip_metrics(trip_id=trip.id, session_id=trip.session_id, points=points)
+
+    email = "benchmark@example.com"
+    user_cache.put(email, User(id=1, name="Jan", last_name="Kowalski", email=email, hashed_password=""))
+    token = create_access_token(data={"sub": email}, expires_delta=timedelta(hours=1))
+
+    return [
+        Case("calculate_trip_metrics", lambda: calculate_trip_metrics(trip_id=1, session_id=trip.session_id, points=points, weight=70.0), points_count),
+        Case("split_trips_into_activities", lambda: split_trips_into_activities(trips), trips_count),
+        Case("generate_statistics_for_trips", lambda: generate_statistics_for_trips(trips), trips_count),
+        Case("gps_point_validate", lambda: [GPSPoint(**row) for row in row_dicts], points_count),
+        Case("gps_points_from_rows", lambda: gps_points_from_rows(rows), points_count),
+        Case("gps_points_dump_json_pydantic", lambda: points_adapter.dump_json(trusted_points), points_count),
+        Case("encode_points_json", lambda: encode_points_json(trusted_points), points_count),
+        Case("create_access_token", lambda: create_access_token(data={"sub": email}, expires_delta=timedelta(hours=1)), 1),
+        Case("get_current_user_cached", lambda: run_coroutine(get_current_user(token=token, db=None)), 1),
+        Case("trip_response_from_trip", lambda: TripResponse.from_trip(trip=trip, points=trusted_points), points_count),
+    ]
+
+def measure(case: Case, repeat: int, min_time: float) -> dict:
+    """Liczba wywołań dobierana jak w timeit.autorange; raportowane min i mediana z `repeat` serii."""
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            case.function()
+        if time.perf_counter() - started >= min_time:
+            break
+        calls *= 2
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(calls):
+            case.function()
+        timings.append((time.perf_counter() - started) / calls)
+    best, median = min(timings), statistics.median(timings)
+    return {
+        "name": case.name,
+        "items": case.items,
+        "calls": calls,
+        "repeat": repeat,
+        "best_us": round(best * 1e6, 3),
+        "median_us": round(median * 1e6, 3),
+        "per_item_us": round(median * 1e6 / case.items, 4),
+    }
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    packages = {}
+    for package in PACKAGES:
+        try:
+            packages[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            packages[package] = None
+    return {
+        "commit": commit,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "packages": packages,
+    }
+
+def main(points: int, trips: int, activity_mix: str, seed: int, repeat: int, min_time: float, only: list[str] | None = None) -> dict:
+    cases = build_cases(points_count=points, trips_count=trips, activity_mix=parse_activity_mix(activity_mix), seed=seed)
+    return {
+        "environment": environment(),
+        "parameters": {"points": points, "trips": trips, "activity_mix": activity_mix, "seed": seed, "repeat": repeat, "min_time": min_time},
+        "results": [measure(case, repeat=repeat, min_time=min_time) for case in cases if not only or case.name in only],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=3600, help="Liczba punktów syntetycznej trasy (1 Hz)")
+    parser.add_argument("--trips", type=int, default=1000, help="Liczba tras dla funkcji statystyk")
+    parser.add_argument("--activity-mix", default="RUNNING=0.5,CYCLING=0.3,WALKING=0.2", help="Udział aktywności, np. RUNNING=0.6,CYCLING=0.4")
+    parser.add_argument("--seed", type=int, default=0, help="Ziarno generatora danych")
+    parser.add_argument("--repeat", type=int, default=5, help="Liczba serii pomiarowych")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimalny czas jednej serii w sekundach")
+    parser.add_argument("--only", nargs="+", help="Uruchom tylko wskazane przypadki")
+    parser.add_argument("--output", help="Plik wynikowy JSON (domyślnie standardowe wyjście)")
+    args = parser.parse_args()
+    result = main(args.points, args.trips, args.activity_mix, args.seed, args.repeat, args.min_time, args.only)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(result, file, indent=2)
+    else:
+        print(json.dumps(result, indent=2))
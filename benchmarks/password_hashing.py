@@ -0,0 +1,60 @@
+"""Opóźnienie pętli zdarzeń podczas równoczesnych logowań: bcrypt w pętli vs w dedykowanej puli.
+
+Uruchomienie: python -m benchmarks.password_hashing --logins 20
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from fitapp_api.users.router import pwd_context, verify_password, verify_and_update_password
+
+TICK_SECONDS = 0.005
+
+
+async def measure_loop_lag(stop: asyncio.Event) -> list[float]:
+    """Opóźnienia wybudzeń (ms) krótkiego zadania - miara zablokowania pętli."""
+    lags = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append((time.perf_counter() - started - TICK_SECONDS) * 1000)
+    return lags
+
+async def inline_login(password: str, hashed_password: str) -> bool:
+    return verify_password(password, hashed_password)
+
+async def executor_login(password: str, hashed_password: str) -> bool:
+    verified, _ = await verify_and_update_password(password, hashed_password)
+    return verified
+
+async def run_scenario(login, logins: int, hashed_password: str) -> dict:
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(login("password", hashed_password) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    lags = await lag_task
+    return {
+        "logins": logins,
+        "elapsed_s": round(elapsed, 4),
+        "loop_lag_p50_ms": round(statistics.median(lags), 2) if lags else None,
+        "loop_lag_max_ms": round(max(lags), 2) if lags else None,
+        "ticks": len(lags),
+    }
+
+async def main(logins: int) -> dict:
+    hashed_password = pwd_context.hash("password")
+    return {
+        "bcrypt_rounds": pwd_context.to_dict()["bcrypt__rounds"],
+        "inline": await run_scenario(inline_login, logins, hashed_password),
+        "executor": await run_scenario(executor_login, logins, hashed_password),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=20, help="Liczba równoczesnych logowań")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main(args.logins)), indent=2))
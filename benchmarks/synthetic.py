@@ -0,0 +1,101 @@
+"""Syntetyczne trasy do benchmarków: losowe (ale powtarzalne dzięki ziarnu) przebiegi GPS i podsumowania tras."""
+from datetime import datetime, timedelta
+import math
+import random
+from fitapp_api.gps.models import GPSPoint
+from fitapp_api.trips.enums import TripActivity
+from fitapp_api.trips.models import Trip, TripSummary
+
+START_TIME = datetime(2025, 1, 1, 8, 0, 0)
+START_LATITUDE = 50.0614
+START_LONGITUDE = 19.9366
+METERS_PER_DEGREE = 111_320.0
+
+# Typowe prędkości aktywności w m/s
+ACTIVITY_SPEEDS = {
+    TripActivity.RUNNING: 3.0,
+    TripActivity.CYCLING: 6.5,
+    TripActivity.WALKING: 1.4,
+    TripActivity.CLIMBING: 0.5,
+    TripActivity.DIVING: 0.3,
+    TripActivity.SWIMMING: 0.8,
+    TripActivity.OTHER: 2.0,
+}
+
+
+def parse_activity_mix(value: str) -> dict[TripActivity, float]:
+    """Udział aktywności w postaci "RUNNING=0.6,CYCLING=0.3,WALKING=0.1"."""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        mix[TripActivity[name.strip().upper()]] = float(weight or 1)
+    return mix
+
+def pick_activity(rng: random.Random, activity_mix: dict[TripActivity, float]) -> TripActivity:
+    return rng.choices(list(activity_mix), weights=list(activity_mix.values()))[0]
+
+def generate_track_points(
+    session_id: str,
+    user_id: int,
+    count: int,
+    activity: TripActivity = TripActivity.RUNNING,
+    start_time: datetime = START_TIME,
+    rng: random.Random | None = None,
+) -> list[GPSPoint]:
+    """Przebieg 1 Hz: błądzenie losowe z prędkością typową dla aktywności; ostatni punkt ma last_entry."""
+    rng = rng or random.Random(0)
+    speed = ACTIVITY_SPEEDS[activity]
+    latitude, longitude, heading = START_LATITUDE, START_LONGITUDE, rng.uniform(0, 2 * math.pi)
+    points = []
+    for i in range(count):
+        points.append(GPSPoint(
+            session_id=session_id,
+            timestamp=start_time + timedelta(seconds=i),
+            user_id=user_id,
+            latitude=latitude,
+            longitude=longitude,
+            acceleration=rng.gauss(0, 0.3),
+            last_entry=i == count - 1,
+            activity=activity,
+        ))
+        heading += rng.gauss(0, 0.2)
+        step = speed * rng.uniform(0.7, 1.3)
+        latitude += step * math.cos(heading) / METERS_PER_DEGREE
+        longitude += step * math.sin(heading) / (METERS_PER_DEGREE * math.cos(math.radians(latitude)))
+    return points
+
+def generate_point_rows(points: list[GPSPoint]) -> list[tuple]:
+    """Wiersze w kształcie zwracanym przez asyncpg dla gps_points (symbole jako tekst)."""
+    return [
+        (point.timestamp, str(point.user_id), point.session_id, str(point.last_entry).lower(), point.latitude, point.longitude, point.activity.value)
+        for point in points
+    ]
+
+def generate_trips(
+    count: int,
+    activity_mix: dict[TripActivity, float],
+    user_id: int = 1,
+    seed: int = 0,
+) -> list[Trip]:
+    """Zakończone trasy z podsumowaniami (bez punktów) - wejście dla funkcji statystyk."""
+    rng = random.Random(seed)
+    trips = []
+    for i in range(count):
+        activity = pick_activity(rng, activity_mix)
+        start_time = START_TIME + timedelta(hours=6 * i)
+        duration = rng.uniform(600, 7200)
+        distance = duration * ACTIVITY_SPEEDS[activity] * rng.uniform(0.8, 1.2)
+        session_id = f"{int(start_time.timestamp())}_{user_id}"
+        trip = Trip(id=i + 1, session_id=session_id, user_id=user_id, started_at=start_time)
+        trip.summary = TripSummary(
+            trip_id=trip.id,
+            session_id=session_id,
+            start_time=start_time,
+            end_time=start_time + timedelta(seconds=duration),
+            duration=duration,
+            distance=distance,
+            calories_burned=distance / 1000 * 70,
+            activity=activity,
+        )
+        trips.append(trip)
+    return trips
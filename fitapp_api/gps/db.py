@@ -1,14 +1,35 @@
 import os
+import asyncio
+import time
 from questdb.ingress import Sender
 from dotenv import load_dotenv
 import asyncpg
+from fitapp_api.gps.models import IngestStats
+from fitapp_api.monitoring.metrics import ILP_FLUSH_DURATION, QUESTDB_POOL_ACQUIRE_DURATION, record_request_timing
 
 load_dotenv()
 
+QDB_SENDER_POOL_SIZE = int(os.getenv("QDB_SENDER_POOL_SIZE", 2))
+QDB_FLUSH_MAX_ROWS = int(os.getenv("QDB_FLUSH_MAX_ROWS", 10000))
+QDB_FLUSH_INTERVAL_MS = int(os.getenv("QDB_FLUSH_INTERVAL_MS", 10))
+QDB_INGEST_QUEUE_SIZE = int(os.getenv("QDB_INGEST_QUEUE_SIZE", 1000))
+# Maksymalny czas oczekiwania przy zamykaniu na zapis zakolejkowanych wierszy (s)
+QDB_SHUTDOWN_TIMEOUT = float(os.getenv("QDB_SHUTDOWN_TIMEOUT", 30))
+# Pula PGWire (odczyty); min_size połączeń otwieranych przy starcie
+QDB_POOL_MIN_SIZE = int(os.getenv("QDB_POOL_MIN_SIZE", 2))
+QDB_POOL_MAX_SIZE = int(os.getenv("QDB_POOL_MAX_SIZE", 10))
+QDB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("QDB_POOL_ACQUIRE_TIMEOUT", 30))
+QDB_COMMAND_TIMEOUT = float(os.getenv("QDB_COMMAND_TIMEOUT", 60))
+QDB_POOL_MAX_INACTIVE_LIFETIME = float(os.getenv("QDB_POOL_MAX_INACTIVE_LIFETIME", 300))
+QDB_STATEMENT_CACHE_SIZE = int(os.getenv("QDB_STATEMENT_CACHE_SIZE", 100))
+
 
 class GPSDB:
     _instance = None
     _pool = None
+    _ingest_queue: asyncio.Queue | None = None
+    _flush_workers: list[asyncio.Task] = []
+    _stats: IngestStats = IngestStats()
     http_conf = ""
 
     def __new__(cls):
@@ -27,12 +48,12 @@ class GPSDB:
         pg_host = os.getenv("QDB_PG_HOST", "localhost")
         pg_port = int(os.getenv("QDB_PG_PORT", "8812"))
         pg_database = os.getenv("QDB_PG_DB", "qdb")
-        # Interfejs HTTP/ILP
+        # Interfejs HTTP/ILP (flush wyłącznie jawny - sterują nim workery zapisu)
         http_host = os.getenv("QDB_HTTP_HOST", "localhost")
         http_port = int(os.getenv("QDB_HTTP_PORT", "9000"))
         http_user = os.getenv("QDB_HTTP_USER", "admin")
         http_password = os.getenv("QDB_HTTP_PASSWORD", "quest")
-        self.http_conf = f"http::addr={http_host}:{http_port};username={http_user};password={http_password};"
+        self.http_conf = f"http::addr={http_host}:{http_port};username={http_user};password={http_password};auto_flush=off;"
         
         self._pool = await asyncpg.create_pool(
             user=pg_user,
@@ -40,15 +61,212 @@ class GPSDB:
             host=pg_host,
             port=pg_port,
             database=pg_database,
-            min_size=1,
-            max_size=10
+            min_size=QDB_POOL_MIN_SIZE,
+            max_size=QDB_POOL_MAX_SIZE,
+            command_timeout=QDB_COMMAND_TIMEOUT,
+            max_inactive_connection_lifetime=QDB_POOL_MAX_INACTIVE_LIFETIME,
+            statement_cache_size=QDB_STATEMENT_CACHE_SIZE,
         )
+        await self.start_ingest_workers()
 
     async def get_connection(self):
         """
         Udostępnia połączenie z QuestDB.
         """
-        async with self._pool.acquire() as connection:
-            yield connection
+        started = time.perf_counter()
+        try:
+            async with self._pool.acquire(timeout=QDB_POOL_ACQUIRE_TIMEOUT) as connection:
+                QUESTDB_POOL_ACQUIRE_DURATION.observe(time.perf_counter() - started)
+                yield connection
+        finally:
+            record_request_timing("questdb", time.perf_counter() - started)
+
+    def pool_status(self) -> dict[str, int]:
+        if self._pool is None:
+            return {}
+        return {"size": self._pool.get_size(), "idle": self._pool.get_idle_size(), "max_size": self._pool.get_max_size()}
+
+    async def ping(self, timeout: float) -> float:
+        """Czas (w sekundach) prostego zapytania - sprawdzenie łączności dla /health/ready."""
+        if self._pool is None:
+            raise RuntimeError("Pula QuestDB nie została zainicjalizowana")
+        started = time.perf_counter()
+        await self._pool.fetchval("SELECT 1", timeout=timeout)
+        return time.perf_counter() - started
+
+    async def start_ingest_workers(self) -> None:
+        """Uruchamia workery zapisu ILP - każdy z własnym, długo żyjącym senderem."""
+        if self._ingest_queue is not None:
+            return
+        self._ingest_queue = asyncio.Queue(maxsize=QDB_INGEST_QUEUE_SIZE)
+        self._stats = IngestStats(senders=QDB_SENDER_POOL_SIZE)
+        self._flush_workers = [
+            asyncio.create_task(self._flush_worker()) for _ in range(QDB_SENDER_POOL_SIZE)
+        ]
+
+    async def close(self) -> None:
+        """Czeka na zapis zakolejkowanych wierszy, zamyka workery, sendery i pulę połączeń."""
+        if self._ingest_queue is not None:
+            try:
+                await asyncio.wait_for(self._ingest_queue.join(), QDB_SHUTDOWN_TIMEOUT)
+            except asyncio.TimeoutError:
+                print(f"Nie zapisano zakolejkowanych wierszy QuestDB w ciągu {QDB_SHUTDOWN_TIMEOUT} s ({self._ingest_queue.qsize()} zleceń)")
+            for worker in self._flush_workers:
+                worker.cancel()
+            await asyncio.gather(*self._flush_workers, return_exceptions=True)
+            while not self._ingest_queue.empty():
+                _, future = self._ingest_queue.get_nowait()
+                if not future.done():
+                    future.set_exception(RuntimeError("Zapis do QuestDB przerwany przy zamykaniu aplikacji"))
+            self._ingest_queue = None
+            self._flush_workers = []
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    async def write_rows(self, rows: list[dict]) -> None:
+        """Kolejkuje wiersze ILP (argumenty `Buffer.row`) i wraca dopiero po ich potwierdzonym flushu."""
+        if not rows:
+            return
+        if self._ingest_queue is None:
+            await self.start_ingest_workers()
+        started = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        await self._ingest_queue.put((rows, future))
+        try:
+            await future
+        finally:
+            record_request_timing("questdb", time.perf_counter() - started)
+
+    def get_ingest_stats(self) -> IngestStats:
+        return self._stats.model_copy(update={"queue_depth": self._ingest_queue.qsize() if self._ingest_queue else 0})
+
+    async def _collect_batch(self, batch: list[tuple[list[dict], asyncio.Future]]) -> None:
+        """Zbiera zlecenia z kolejki (do `batch` - widoczne dla workera także po anulowaniu) do osiągnięcia limitu wierszy lub upływu okna czasowego."""
+        loop = asyncio.get_running_loop()
+        batch.append(await self._ingest_queue.get())
+        row_count = len(batch[0][0])
+        deadline = loop.time() + QDB_FLUSH_INTERVAL_MS / 1000
+        while row_count < QDB_FLUSH_MAX_ROWS:
+            try:
+                item = self._ingest_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._ingest_queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            batch.append(item)
+            row_count += len(item[0])
+
+    @staticmethod
+    def _flush_rows(sender: Sender, rows: list[dict]) -> int:
+        """Buduje bufor ILP i wysyła go (blokująco - wywoływane poza pętlą zdarzeń). Zwraca liczbę wysłanych bajtów."""
+        buffer = sender.new_buffer()
+        for row in rows:
+            buffer.row(**row)
+        size = len(buffer)
+        sender.flush(buffer, transactional=True)
+        return size
+
+    @staticmethod
+    def _close_sender(sender: Sender | None) -> None:
+        if sender is not None:
+            try:
+                sender.close()
+            except Exception:
+                pass
+
+    def _reconnect(self, sender: Sender | None) -> Sender:
+        self._close_sender(sender)
+        sender = self.get_new_sender()
+        sender.establish()
+        return sender
+
+    async def _flush_worker(self) -> None:
+        sender = None
+        batch: list[tuple[list[dict], asyncio.Future]] = []
+        try:
+            # Zestawienie połączenia ILP przed pierwszym zapisem (błąd - ponowna próba przy flushu)
+            try:
+                sender = await asyncio.to_thread(self._reconnect, None)
+            except Exception as e:
+                print(f"Nie udało się połączyć z QuestDB (ILP): {str(e)}")
+            while True:
+                batch = []
+                await self._collect_batch(batch)
+                rows = [row for item_rows, _ in batch for row in item_rows]
+                started = time.perf_counter()
+                flushed_bytes = 0
+                try:
+                    try:
+                        if sender is None:
+                            sender = await asyncio.to_thread(self._reconnect, None)
+                        flushed_bytes = await asyncio.to_thread(self._flush_rows, sender, rows)
+                        results = [(future, None) for _, future in batch]
+                    except Exception as e:
+                        print(f"Błąd flushu ILP ({len(rows)} wierszy): {str(e)}")
+                        # Połączenie po błędzie jest w nieznanym stanie - zamykane, kolejny zapis otworzy nowe
+                        await asyncio.to_thread(self._close_sender, sender)
+                        sender = None
+                        results = [(future, e) for _, future in batch]
+                        # Izolacja błędu - każde zlecenie z paczki wysyłane osobno
+                        if len(batch) > 1:
+                            results = []
+                            for item_rows, future in batch:
+                                try:
+                                    if sender is None:
+                                        sender = await asyncio.to_thread(self._reconnect, None)
+                                    flushed_bytes += await asyncio.to_thread(self._flush_rows, sender, item_rows)
+                                    results.append((future, None))
+                                except Exception as item_error:
+                                    await asyncio.to_thread(self._close_sender, sender)
+                                    sender = None
+                                    results.append((future, item_error))
+                except Exception as e:
+                    # Nieoczekiwany błąd nie może zatrzymać workera - close() czeka na obsłużenie całej kolejki
+                    print(f"Błąd workera zapisu ILP: {str(e)}")
+                    results = [(future, e) for _, future in batch]
+                finally:
+                    for _ in batch:
+                        self._ingest_queue.task_done()
+                # Wynik zleceń przed statystykami - błąd statystyk nie może zgłosić zapisanych wierszy jako niezapisane
+                for future, error in results:
+                    if future.done():
+                        continue
+                    if error is None:
+                        future.set_result(None)
+                    else:
+                        future.set_exception(error)
+                try:
+                    self._record_flush(
+                        rows=sum(len(item_rows) for (item_rows, _), (_, error) in zip(batch, results) if error is None),
+                        size=flushed_bytes,
+                        latency=time.perf_counter() - started,
+                        errors=sum(1 for _, error in results if error is not None),
+                    )
+                except Exception as e:
+                    print(f"Błąd statystyk zapisu ILP: {str(e)}")
+        finally:
+            # Worker anulowany przez close() po QDB_SHUTDOWN_TIMEOUT - zlecenia przerwanej paczki kończą się błędem
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Zapis do QuestDB przerwany przy zamykaniu aplikacji"))
+            if sender is not None:
+                await asyncio.to_thread(sender.close)
+
+    def _record_flush(self, rows: int, size: int, latency: float, errors: int) -> None:
+        ILP_FLUSH_DURATION.observe(latency)
+        stats = self._stats
+        latency_ms = latency * 1000
+        stats.flushes += 1
+        stats.rows_flushed += rows
+        stats.bytes_flushed += size
+        stats.failed_requests += errors
+        stats.last_flush_latency_ms = latency_ms
+        stats.max_flush_latency_ms = max(stats.max_flush_latency_ms, latency_ms)
+        stats.avg_flush_latency_ms += (latency_ms - stats.avg_flush_latency_ms) / stats.flushes
 
 gps_db: GPSDB = GPSDB()
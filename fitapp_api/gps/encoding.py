@@ -0,0 +1,100 @@
+"""Kompaktowe formaty przesyłania punktów GPS (negocjowane przez Accept lub parametr `format`)."""
+from fitapp_api.gps.models import GPSPoint, PointsFormat, ColumnarGPSPoints, PolylineGPSPoints
+from fitapp_api.trips.utils import GPSTrack
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from typing import Optional
+import numpy as np
+import orjson
+
+COLUMNAR_MEDIA_TYPE = "application/vnd.fitapp.columnar+json"
+POLYLINE_MEDIA_TYPE = "application/vnd.fitapp.polyline+json"
+COORDINATE_SCALE = 1_000_000
+POLYLINE_PRECISION = 5
+
+MEDIA_TYPES = {
+    PointsFormat.COLUMNAR: COLUMNAR_MEDIA_TYPE,
+    PointsFormat.POLYLINE: POLYLINE_MEDIA_TYPE,
+}
+
+
+def resolve_points_format(format: Optional[PointsFormat], accept: Optional[str]) -> PointsFormat:
+    """Parametr `format` ma pierwszeństwo przed nagłówkiem Accept; domyślnie zwykły JSON."""
+    if format is not None:
+        return format
+    if accept:
+        for points_format, media_type in MEDIA_TYPES.items():
+            if media_type in accept:
+                return points_format
+    return PointsFormat.JSON
+
+def delta_encode(values: np.ndarray, scale: int) -> list[int]:
+    return np.diff(np.round(values * scale).astype(np.int64), prepend=0).tolist()
+
+def encode_polyline(latitudes: np.ndarray, longitudes: np.ndarray, precision: int = POLYLINE_PRECISION) -> str:
+    """Wektorowe kodowanie Encoded Polyline (przeplatane delty lat/lon, 5-bitowe porcje)."""
+    deltas = np.column_stack((
+        np.diff(np.round(latitudes * 10 ** precision).astype(np.int64), prepend=0),
+        np.diff(np.round(longitudes * 10 ** precision).astype(np.int64), prepend=0),
+    )).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1).astype(np.uint64)
+    shifts = np.arange(0, 35, 5, dtype=np.uint64)
+    shifted = values[:, None] >> shifts
+    chunk_counts = np.maximum(1, np.count_nonzero(shifted, axis=1))
+    positions = np.arange(len(shifts))
+    continuation = positions[None, :] < (chunk_counts - 1)[:, None]
+    chars = (shifted & 0x1F) + np.where(continuation, 0x20, 0) + 63
+    return chars[positions[None, :] < chunk_counts[:, None]].astype(np.uint8).tobytes().decode("ascii")
+
+def encode_points_columnar(session_id: str, user_id: int, points: list[GPSPoint]) -> ColumnarGPSPoints:
+    track = GPSTrack.from_points(points)
+    activities: list[list] = []
+    for point in points:
+        if activities and activities[-1][0] == point.activity:
+            activities[-1][1] += 1
+        else:
+            activities.append([point.activity, 1])
+    timestamps_ms = (track.timestamps - track.timestamps[:1]) // np.timedelta64(1, "ms")
+    return ColumnarGPSPoints(
+        session_id=session_id,
+        user_id=user_id,
+        count=len(points),
+        base_timestamp=points[0].timestamp if points else None,
+        timestamps=np.diff(timestamps_ms.astype(np.int64), prepend=0).tolist(),
+        coordinate_scale=COORDINATE_SCALE,
+        latitudes=delta_encode(track.latitudes, COORDINATE_SCALE),
+        longitudes=delta_encode(track.longitudes, COORDINATE_SCALE),
+        activities=[(activity, count) for activity, count in activities],
+        last_entry_indices=np.flatnonzero(track.last_entries).tolist(),
+    )
+
+def encode_points_polyline(session_id: str, user_id: int, points: list[GPSPoint]) -> PolylineGPSPoints:
+    track = GPSTrack.from_points(points)
+    return PolylineGPSPoints(
+        session_id=session_id,
+        user_id=user_id,
+        count=len(points),
+        start_time=points[0].timestamp if points else None,
+        end_time=points[-1].timestamp if points else None,
+        polyline=encode_polyline(track.latitudes, track.longitudes),
+    )
+
+def encode_points(points_format: PointsFormat, session_id: str, user_id: int, points: list[GPSPoint]) -> ColumnarGPSPoints | PolylineGPSPoints:
+    if points_format == PointsFormat.POLYLINE:
+        return encode_points_polyline(session_id=session_id, user_id=user_id, points=points)
+    return encode_points_columnar(session_id=session_id, user_id=user_id, points=points)
+
+def encode_points_json(points: list[GPSPoint]) -> bytes:
+    """Punkty jako JSON bez walidacji modelu - pola punktu serializowane bezpośrednio przez orjson."""
+    return orjson.dumps(points, default=vars)
+
+def encode_trip_json(session_id: str, summary: BaseModel, points: list[GPSPoint]) -> bytes:
+    """Odpowiednik TripResponse.model_dump_json() z punktami serializowanymi bez walidacji."""
+    return orjson.dumps({"session_id": session_id, "summary": summary.model_dump(mode="json"), "points": points}, default=vars)
+
+def json_response(body: bytes, headers: Optional[dict[str, str]] = None) -> Response:
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def compact_points_response(content: BaseModel, points_format: PointsFormat) -> JSONResponse:
+    return JSONResponse(content=content.model_dump(mode="json"), media_type=MEDIA_TYPES[points_format], headers={"Vary": "Accept"})
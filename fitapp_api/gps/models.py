@@ -3,6 +3,7 @@ from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
 from fitapp_api.trips.enums import TripActivity
+from enum import Enum
 
 class GPSPoint(BaseModel):
     session_id: str
@@ -13,3 +14,54 @@ class GPSPoint(BaseModel):
     acceleration: Optional[float] = 0.0
     last_entry: Optional[bool] = False
     activity: Optional[TripActivity] = TripActivity.RUNNING
+
+
+class PointsFormat(str, Enum):
+    JSON = "json"
+    COLUMNAR = "columnar"
+    POLYLINE = "polyline"
+
+
+# Interwał SAMPLE BY w QuestDB: sekundy, minuty lub godziny (wstawiany do zapytania - tylko zwalidowany)
+RESOLUTION_PATTERN = r"^[1-9][0-9]{0,5}[smh]$"
+
+
+class ResolutionMode(str, Enum):
+    AVG = "avg"
+    LAST = "last"
+
+
+class ColumnarGPSPoints(BaseModel):
+    """Kolumnowa reprezentacja punktów jednej sesji. Pierwsza wartość kolumn delta jest bezwzględna, kolejne to różnice."""
+    session_id: str
+    user_id: int
+    count: int = Field(ge=0, description="Liczba punktów")
+    base_timestamp: Optional[datetime] = Field(default=None, description="Znacznik czasu pierwszego punktu")
+    timestamps: list[int] = Field(description="Przyrosty czasu w ms (pierwszy względem base_timestamp)")
+    coordinate_scale: int = Field(description="Mnożnik współrzędnych całkowitych")
+    latitudes: list[int] = Field(description="Szerokość geograficzna * coordinate_scale, kodowana delta")
+    longitudes: list[int] = Field(description="Długość geograficzna * coordinate_scale, kodowana delta")
+    activities: list[tuple[TripActivity, int]] = Field(description="Aktywność kodowana długością serii: (aktywność, liczba punktów)")
+    last_entry_indices: list[int] = Field(description="Indeksy punktów z last_entry")
+
+
+class PolylineGPSPoints(BaseModel):
+    """Geometria sesji jako Encoded Polyline (algorytm Google, precyzja 5)."""
+    session_id: str
+    user_id: int
+    count: int = Field(ge=0, description="Liczba punktów")
+    start_time: Optional[datetime] = Field(default=None, description="Znacznik czasu pierwszego punktu")
+    end_time: Optional[datetime] = Field(default=None, description="Znacznik czasu ostatniego punktu")
+    polyline: str
+
+
+class IngestStats(BaseModel):
+    queue_depth: int = Field(default=0, description="Liczba zleceń zapisu oczekujących w kolejce")
+    senders: int = Field(default=0, description="Liczba senderów ILP w puli")
+    flushes: int = Field(default=0, description="Liczba wykonanych flushy")
+    rows_flushed: int = Field(default=0, description="Liczba zapisanych wierszy")
+    bytes_flushed: int = Field(default=0, description="Liczba wysłanych bajtów ILP")
+    failed_requests: int = Field(default=0, description="Liczba zleceń zakończonych błędem")
+    last_flush_latency_ms: float = Field(default=0.0, description="Czas ostatniego flushu w ms")
+    avg_flush_latency_ms: float = Field(default=0.0, description="Średni czas flushu w ms")
+    max_flush_latency_ms: float = Field(default=0.0, description="Maksymalny czas flushu w ms")
@@ -1,35 +1,92 @@
-from fastapi import APIRouter, HTTPException
-from fitapp_api.gps.models import GPSPoint
+from fastapi import APIRouter, HTTPException, Request, Header, Query
+from fitapp_api.gps.models import GPSPoint, IngestStats, PointsFormat, ResolutionMode, RESOLUTION_PATTERN
+from fitapp_api.gps.encoding import resolve_points_format, encode_points, compact_points_response, encode_points_json, json_response
+from fitapp_api.gps.simplify import simplify_points, simplified_tracks
+from typing import Optional
+from fitapp_api.gps.db import gps_db
 from fitapp_api.users.models import User
-from fitapp_api.users.router import get_current_user
-from fitapp_api.misc import insert_gps_points_to_db, get_gps_points_by_trip_id
-from fitapp_api.gps.utils import get_session_ids_by_user_id
+from fitapp_api.users.router import get_current_user, get_current_admin_user
+from fitapp_api.misc import insert_gps_points_to_db, get_gps_points_by_trip_id, check_if_user_owns_trip
+from fitapp_api.gps.utils import iter_ndjson_gps_chunks
 from fastapi import Depends
-from fitapp_api.trips.router import get_trip_summary
+from fitapp_api.trips.router import finalize_trip_summary
 
 
 gps_router = APIRouter()
 
+# Funkcje pomocnicze
+def check_gps_points_upload_permissions(points: list[GPSPoint], current_user: User) -> None:
+    for point in points:
+        if point.user_id != current_user.id and not current_user.is_admin:
+            raise HTTPException(status_code=403, detail="Brak autoryzacji do uploadu punktów GPS innych uzytkowników!")
+
+async def finalize_trips(session_ids: list[str], current_user: User) -> None:
+    for session_id in session_ids:
+        await finalize_trip_summary(session_id=session_id, current_user=current_user)
+
 # Endpointy
 @gps_router.post("/", status_code=200)
 async def insert_gps_points(points: list[GPSPoint], current_user: User = Depends(get_current_user)) -> bool:
-    sessions_ids_with_last_entry = []
-    for point in points:
-        if point.user_id != current_user.id and not current_user.isAdmin:
-            raise HTTPException(status_code=403, detail="Brak autoryzacji do uploadu punktów GPS innych uzytkowników!")
-        if point.last_entry:
-            has_last_entry = True
-            sessions_ids_with_last_entry.append(point.session_id)
+    check_gps_points_upload_permissions(points=points, current_user=current_user)
+    sessions_ids_with_last_entry = [point.session_id for point in points if point.last_entry]
     result = await insert_gps_points_to_db(points)
     if sessions_ids_with_last_entry:
-        for session_id in sessions_ids_with_last_entry:
-            await get_trip_summary(session_id=session_id, current_user=current_user)
+        await finalize_trips(session_ids=sessions_ids_with_last_entry, current_user=current_user)
     return result
 
+@gps_router.post("/stream", status_code=200)
+async def insert_gps_points_stream(request: Request, current_user: User = Depends(get_current_user)) -> int:
+    """Strumieniowy upload punktów GPS (NDJSON - jeden punkt w linii), zapisywanych w paczkach w trakcie odbioru."""
+    inserted_points = 0
+    sessions_ids_with_last_entry: list[str] = []
+    try:
+        async for points in iter_ndjson_gps_chunks(request.stream()):
+            check_gps_points_upload_permissions(points=points, current_user=current_user)
+            await insert_gps_points_to_db(points)
+            inserted_points += len(points)
+            for point in points:
+                if point.last_entry and point.session_id not in sessions_ids_with_last_entry:
+                    sessions_ids_with_last_entry.append(point.session_id)
+    except HTTPException as e:
+        if inserted_points:
+            e.detail = f"{e.detail} (zapisano wcześniej {inserted_points} punktów)"
+        raise e
+    if sessions_ids_with_last_entry:
+        await finalize_trips(session_ids=sessions_ids_with_last_entry, current_user=current_user)
+    return inserted_points
+
 
 @gps_router.get("/points/{session_id}", response_model=list[GPSPoint])
-async def get_gps_points_by_session_id(session_id: str, current_user: User = Depends(get_current_user)) -> list[GPSPoint]:
-    if session_id not in await get_session_ids_by_user_id(current_user.id):
+async def get_gps_points_by_session_id(
+    session_id: str,
+    format: Optional[PointsFormat] = None,
+    tolerance: Optional[float] = Query(default=None, gt=0, description="Tolerancja uproszczenia przebiegu w metrach"),
+    max_points: Optional[int] = Query(default=None, ge=2, description="Maksymalna liczba zwracanych punktów"),
+    resolution: Optional[str] = Query(default=None, pattern=RESOLUTION_PATTERN, description="Przedział próbkowania punktów, np. 10s, 1m"),
+    resolution_mode: ResolutionMode = Query(default=ResolutionMode.AVG, description="Współrzędne uśrednione lub ostatnie w przedziale"),
+    accept: Optional[str] = Header(default=None),
+    current_user: User = Depends(get_current_user),
+) -> list[GPSPoint]:
+    if not await check_if_user_owns_trip(session_id=session_id, user_id=current_user.id):
         raise HTTPException(status_code=403, detail="Brak autoryzacji")
     
-    return await get_gps_points_by_trip_id(session_id=session_id)
+    simplify = tolerance is not None or max_points is not None
+    sampling = f"{resolution}:{resolution_mode.value}" if resolution else None
+    points = simplified_tracks.get(session_id, tolerance, max_points, sampling) if simplify or sampling else None
+    if points is None:
+        points = await get_gps_points_by_trip_id(session_id=session_id, resolution=resolution, resolution_mode=resolution_mode)
+        if simplify:
+            points = simplify_points(points, tolerance=tolerance, max_points=max_points)
+        # Przebieg zakończonej trasy już się nie zmieni
+        if (simplify or sampling) and points[-1].last_entry:
+            simplified_tracks.put(session_id, tolerance, max_points, points, sampling)
+    points_format = resolve_points_format(format=format, accept=accept)
+    if points_format == PointsFormat.JSON:
+        return json_response(encode_points_json(points), headers={"Vary": "Accept"})
+    return compact_points_response(encode_points(points_format, session_id=session_id, user_id=points[0].user_id, points=points), points_format)
+
+
+@gps_router.get("/ingest/stats")
+async def get_ingest_stats(current_user: User = Depends(get_current_admin_user)) -> IngestStats:
+    """Głębokość kolejki i czasy flushy zapisu punktów GPS do QuestDB."""
+    return gps_db.get_ingest_stats()
@@ -0,0 +1,115 @@
+"""Upraszczanie przebiegu trasy (Douglas-Peucker) do prezentacji na mapie."""
+from collections import OrderedDict
+from typing import Optional
+from dotenv import load_dotenv
+import heapq
+import numpy as np
+import os
+from fitapp_api.gps.models import GPSPoint
+from fitapp_api.trips.utils import GPSTrack
+
+load_dotenv()
+
+# Łączna liczba punktów we wszystkich wpisach (rozmiar trasy jest nieograniczony, więc nie liczba wpisów)
+SIMPLIFIED_TRACKS_CACHE_MAX_POINTS = int(os.getenv("SIMPLIFIED_TRACKS_CACHE_MAX_POINTS", 200_000))
+EARTH_RADIUS_METERS = 6371008.8
+
+
+def project_to_meters(latitudes: np.ndarray, longitudes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Rzut równoodległościowy wokół środka trasy - wystarczający dla tolerancji rzędu metrów."""
+    reference_latitude = np.radians(latitudes.mean()) if len(latitudes) else 0.0
+    x = EARTH_RADIUS_METERS * np.radians(longitudes) * np.cos(reference_latitude)
+    y = EARTH_RADIUS_METERS * np.radians(latitudes)
+    return x, y
+
+def _farthest_point(x: np.ndarray, y: np.ndarray, start: int, end: int) -> tuple[float, int]:
+    """Największa odległość (i jej indeks) punktów wewnętrznych od odcinka start-end."""
+    if end - start < 2:
+        return 0.0, -1
+    dx, dy = x[end] - x[start], y[end] - y[start]
+    px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+    segment_length_sq = dx * dx + dy * dy
+    if segment_length_sq == 0:
+        distances = np.hypot(px, py)
+    else:
+        t = np.clip((px * dx + py * dy) / segment_length_sq, 0.0, 1.0)
+        distances = np.hypot(px - t * dx, py - t * dy)
+    index = int(np.argmax(distances))
+    return float(distances[index]), start + 1 + index
+
+def simplify_track(latitudes: np.ndarray, longitudes: np.ndarray, tolerance: Optional[float] = None, max_points: Optional[int] = None) -> np.ndarray:
+    """Indeksy punktów zachowanych przez Douglas-Peucker.
+
+    Segmenty są dzielone od największego odchylenia, do osiągnięcia `tolerance` (w metrach)
+    lub limitu `max_points`. Pierwszy i ostatni punkt są zawsze zachowane.
+    """
+    count = len(latitudes)
+    if count <= 2 or (max_points is not None and max_points >= count and not tolerance):
+        return np.arange(count)
+
+    x, y = project_to_meters(latitudes, longitudes)
+    kept = [0, count - 1]
+    distance, index = _farthest_point(x, y, 0, count - 1)
+    queue = [(-distance, index, 0, count - 1)]
+    while queue:
+        negative_distance, index, start, end = heapq.heappop(queue)
+        if index < 0 or -negative_distance <= (tolerance or 0.0):
+            break
+        if max_points is not None and len(kept) >= max_points:
+            break
+        kept.append(index)
+        for segment_start, segment_end in ((start, index), (index, end)):
+            distance, farthest = _farthest_point(x, y, segment_start, segment_end)
+            if farthest >= 0:
+                heapq.heappush(queue, (-distance, farthest, segment_start, segment_end))
+    return np.sort(np.array(kept))
+
+def simplify_points(points: list[GPSPoint], tolerance: Optional[float] = None, max_points: Optional[int] = None) -> list[GPSPoint]:
+    track = GPSTrack.from_points(points)
+    return [points[index] for index in simplify_track(track.latitudes, track.longitudes, tolerance=tolerance, max_points=max_points)]
+
+
+class SimplifiedTracksCache:
+    """LRU uproszczonych przebiegów zakończonych tras ograniczony łączną liczbą punktów, kluczowany (session_id, tolerance, max_points, resolution)."""
+
+    def __init__(self, max_points: int = SIMPLIFIED_TRACKS_CACHE_MAX_POINTS) -> None:
+        self.max_points = max_points
+        self.size_points = 0
+        self._entries: OrderedDict[tuple, list[GPSPoint]] = OrderedDict()
+        self._keys_by_session_id: dict[str, set[tuple]] = {}
+
+    def get(self, session_id: str, tolerance: Optional[float], max_points: Optional[int], resolution: Optional[str] = None) -> Optional[list[GPSPoint]]:
+        key = (session_id, tolerance, max_points, resolution)
+        points = self._entries.get(key)
+        if points is not None:
+            self._entries.move_to_end(key)
+        return points
+
+    def put(self, session_id: str, tolerance: Optional[float], max_points: Optional[int], points: list[GPSPoint], resolution: Optional[str] = None) -> None:
+        if len(points) > self.max_points:
+            return
+        key = (session_id, tolerance, max_points, resolution)
+        self._remove(key)
+        self._entries[key] = points
+        self._keys_by_session_id.setdefault(session_id, set()).add(key)
+        self.size_points += len(points)
+        while self.size_points > self.max_points:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, session_id: str) -> None:
+        for key in self._keys_by_session_id.pop(session_id, set()):
+            self._remove(key)
+
+    def _remove(self, key: tuple) -> None:
+        points = self._entries.pop(key, None)
+        if points is None:
+            return
+        self.size_points -= len(points)
+        keys = self._keys_by_session_id.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_session_id[key[0]]
+
+
+simplified_tracks = SimplifiedTracksCache()
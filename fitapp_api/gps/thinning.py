@@ -0,0 +1,65 @@
+"""Przerzedzanie punktów GPS przy zapisie - pomijanie próbek w miejscu (postój, światła) i zbędnie gęstych.
+
+Punkt jest pomijany, gdy leży bliżej niż INGEST_THINNING_DISTANCE metrów od ostatniego zachowanego punktu sesji
+i upłynęło od niego mniej niż INGEST_THINNING_MAX_INTERVAL sekund. Zawsze zachowywane są: pierwszy punkt sesji,
+ostatni punkt paczki (punkt odniesienia dla kolejnej paczki) oraz punkty `last_entry`.
+
+Tolerancja dystansu: z nierówności trójkąta dystans trasy po przerzedzeniu nigdy nie przekracza pierwotnego, a ubytek
+wynosi co najwyżej 2 x INGEST_THINNING_DISTANCE na każdy pominięty punkt (pominięte punkty leżą w promieniu
+INGEST_THINNING_DISTANCE od poprzedniego zachowanego). Ubytek względny zależy więc od prędkości - dla syntetycznych
+tras 1 Hz (benchmarks.synthetic) przy 3 m: poniżej 0.5% dla biegu (33% mniej punktów), poniżej 1% dla marszu (63%),
+bez zmian dla roweru i do 5% dla aktywności wolniejszych niż 1 m/s (pływanie, wspinaczka, nurkowanie).
+"""
+from datetime import datetime
+from typing import NamedTuple, Optional
+from dotenv import load_dotenv
+import math
+import os
+from fitapp_api.gps.models import GPSPoint
+from fitapp_api.trips.utils import strip_timezone
+
+load_dotenv()
+
+# 0 wyłącza przerzedzanie
+INGEST_THINNING_DISTANCE = float(os.getenv("INGEST_THINNING_DISTANCE", 0.0))
+INGEST_THINNING_MAX_INTERVAL = float(os.getenv("INGEST_THINNING_MAX_INTERVAL", 30.0))
+EARTH_RADIUS_METERS = 6371008.8
+
+
+class KeptPoint(NamedTuple):
+    """Ostatni zachowany punkt sesji - stan przerzedzania między paczkami (czas bez strefy, jak w akumulatorze)."""
+    timestamp: datetime
+    latitude: float
+    longitude: float
+
+
+def thin_points(
+    points: list[GPSPoint],
+    last_kept: Optional[KeptPoint] = None,
+    distance: float = INGEST_THINNING_DISTANCE,
+    max_interval: float = INGEST_THINNING_MAX_INTERVAL,
+) -> list[GPSPoint]:
+    """Punkty jednej sesji (posortowane po czasie) po przerzedzeniu; `last_kept` - ostatni zachowany punkt poprzedniej paczki."""
+    if distance <= 0 or not points:
+        return points
+    if last_kept is not None and strip_timezone(points[0].timestamp) <= last_kept.timestamp:
+        # Paczka sięga wcześniej niż zapisane punkty - brak wiarygodnego punktu odniesienia
+        last_kept = None
+
+    # Rzut równoodległościowy - przy odległościach rzędu metrów błąd pomijalny
+    longitude_scale = math.cos(math.radians(points[0].latitude))
+    distance_sq = (distance / EARTH_RADIUS_METERS) ** 2
+
+    kept = []
+    reference = last_kept
+    last_index = len(points) - 1
+    for index, point in enumerate(points):
+        timestamp = strip_timezone(point.timestamp)
+        if reference is not None and not point.last_entry and index != last_index:
+            dy = math.radians(point.latitude - reference.latitude)
+            dx = math.radians(point.longitude - reference.longitude) * longitude_scale
+            if dx * dx + dy * dy < distance_sq and (timestamp - reference.timestamp).total_seconds() < max_interval:
+                continue
+        kept.append(point)
+        reference = KeptPoint(timestamp=timestamp, latitude=point.latitude, longitude=point.longitude)
+    return kept
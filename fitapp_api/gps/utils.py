@@ -1,13 +1,50 @@
-from fitapp_api.gps.db import gps_db
-from asyncpg.exceptions._base import UnknownPostgresError
+from fitapp_api.gps.models import GPSPoint
+from fastapi import HTTPException
+from pydantic import ValidationError
+from typing import AsyncIterator
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+GPS_STREAM_CHUNK_SIZE = int(os.getenv("GPS_STREAM_CHUNK_SIZE", 500))
+GPS_STREAM_MAX_LINE_BYTES = int(os.getenv("GPS_STREAM_MAX_LINE_BYTES", 4096))
 
 # Funkcje pomocnicze
-async def get_session_ids_by_user_id(user_id: id) -> list[str]:
-    query = f"SELECT session_id from gps_points WHERE user_id ilike '{user_id}' GROUP BY session_id"
-    try:
-        async for connection in gps_db.get_connection():
-            results = await connection.fetch(query)
-        return [str(row[0]) for row in results]
-    except UnknownPostgresError as e:
-        return []
+async def iter_ndjson_gps_chunks(byte_stream: AsyncIterator[bytes], chunk_size: int = GPS_STREAM_CHUNK_SIZE) -> AsyncIterator[list[GPSPoint]]:
+    """Parsuje strumień NDJSON (jeden punkt GPS w linii) i zwraca zwalidowane punkty w paczkach o ograniczonym rozmiarze."""
+    buffer = b""
+    line_number = 0
+    chunk: list[GPSPoint] = []
+
+    def parse_line(line: bytes) -> GPSPoint | None:
+        line = line.strip()
+        if not line:
+            return None
+        try:
+            return GPSPoint.model_validate_json(line)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=f"Nieprawidłowy punkt GPS w linii {line_number}: {e.errors(include_url=False)}")
+
+    async for data in byte_stream:
+        buffer += data
+        lines = buffer.split(b"\n")
+        buffer = lines.pop()
+        if len(buffer) > GPS_STREAM_MAX_LINE_BYTES:
+            raise HTTPException(status_code=413, detail=f"Linia {line_number + len(lines) + 1} przekracza {GPS_STREAM_MAX_LINE_BYTES} bajtów")
+        for line in lines:
+            line_number += 1
+            point = parse_line(line)
+            if point is None:
+                continue
+            chunk.append(point)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
 
+    line_number += 1
+    point = parse_line(buffer)
+    if point is not None:
+        chunk.append(point)
+    if chunk:
+        yield chunk
@@ -7,7 +7,10 @@ from fitapp_api.postgres.db import pg_db
 from fitapp_api.gps.db import gps_db
 from fitapp_api.statistics.router import statistics_router
 from fitapp_api.reminders.router import reminders_router
-from fitapp_api.reminders.utils import create_fcm_push_reminders
+from fitapp_api.monitoring.router import monitoring_router, ApplicationState
+from fitapp_api.monitoring.metrics import MetricsMiddleware
+from fitapp_api.monitoring.profiling import ProfilingMiddleware
+from fitapp_api.reminders.utils import create_fcm_push_reminders, push_dispatcher
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 app = FastAPI()
@@ -19,6 +22,7 @@ app.include_router(gps_router, prefix="/gps", tags=["gps"])
 app.include_router(trip_router, prefix="/trips", tags=["trips"])
 app.include_router(statistics_router, prefix="/statistics", tags=["statistics"])
 app.include_router(reminders_router, prefix="/reminders", tags=["reminders"])
+app.include_router(monitoring_router, tags=["monitoring"])
 
 async def create_cron_task():
     """Tworzenie zadania cron do wysyłania powiadomień FCM."""
@@ -35,7 +39,12 @@ scheduler.add_job(
 
 app.add_event_handler("startup", scheduler.start)
 
+# Kolejność zamykania: zgłoszenie niegotowości, dokończenie wysyłanych powiadomień, zapis zakolejkowanych punktów GPS, zamknięcie pul
+app.add_event_handler("shutdown", ApplicationState.start_draining)
 app.add_event_handler("shutdown", scheduler.shutdown)
+app.add_event_handler("shutdown", push_dispatcher.shutdown)
+app.add_event_handler("shutdown", gps_db.close)
+app.add_event_handler("shutdown", pg_db.close)
 
 app.add_middleware(
     CORSMiddleware,
@@ -44,6 +53,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/")
 async def root():
@@ -1,20 +1,30 @@
 from fitapp_api.postgres.db import pg_db
 from fitapp_api.gps.db import gps_db
-from fitapp_api.gps.models import GPSPoint
-import asyncio
+from fitapp_api.gps.models import GPSPoint, ResolutionMode, RESOLUTION_PATTERN
+from fitapp_api.gps.geohash import encode_many, POINT_GEOHASH_PRECISION
+from fitapp_api.gps.thinning import thin_points, KeptPoint, INGEST_THINNING_DISTANCE
+from fitapp_api.monitoring.metrics import GPS_POINTS_INGESTED
+import re
 from sqlmodel import select
 from fitapp_api.trips.models import TripSummary, Trip
-from fitapp_api.trips.utils import add_trip_and_trip_summary_to_db
+from fitapp_api.trips.utils import register_trips, strip_timezone, GPSTrack
+from fitapp_api.trips.accumulators import TripAccumulator, trip_accumulators
+from fitapp_api.trips.cache import trip_responses, known_trip_sessions
+from fitapp_api.gps.simplify import simplified_tracks
 from fastapi import Depends, HTTPException
 from fitapp_api.trips.enums import TripActivity
 from datetime import timezone
+import numpy as np
 
 
+ACTIVITIES_BY_VALUE = {activity.value: activity for activity in TripActivity}
+GPS_POINT_FIELDS = set(GPSPoint.model_fields)
+
 # Wspólne funkcje pomocnicze - dodane by uniknąć 'circular import'
 
-async def check_if_trip_exists(session_id: str) -> bool:
+async def check_if_user_owns_trip(session_id: str, user_id: int) -> bool:
     async for session in pg_db.get_session():
-        statement = select(1).where(Trip.session_id == session_id).limit(1)
+        statement = select(1).where(Trip.session_id == session_id, Trip.user_id == user_id).limit(1)
         result = await session.execute(statement)
         return result.first() is not None
 
@@ -22,53 +32,140 @@ async def insert_gps_points_to_db(points: list[GPSPoint]) -> bool:
     unique_user_ids = set(point.user_id for point in points)
     if len(unique_user_ids) != 1:
         raise ValueError("Wszystkie punkty GPS muszą mieć tego samego użytkownika.")
-    unique_session_ids = set(point.session_id for point in points)
 
-    # Dodanie punktów GPS do bazy danych
+    # Grupowanie po sesjach i opcjonalne przerzedzanie względem ostatniego punktu akumulatora (ostatni zachowany punkt poprzedniej paczki)
+    points_by_session: dict[str, list[GPSPoint]] = {}
+    for point in points:
+        points_by_session.setdefault(point.session_id, []).append(point)
+    if INGEST_THINNING_DISTANCE > 0:
+        for session_id, session_points in points_by_session.items():
+            accumulator = trip_accumulators.get(session_id)
+            points_by_session[session_id] = thin_points(
+                sorted(session_points, key=lambda point: point.timestamp),
+                last_kept=KeptPoint(accumulator.last_time, accumulator.last_latitude, accumulator.last_longitude) if accumulator else None,
+            )
+        kept_points = [point for session_points in points_by_session.values() for point in session_points]
+        GPS_POINTS_INGESTED.labels("dropped").inc(len(points) - len(kept_points))
+        points = kept_points
+    GPS_POINTS_INGESTED.labels("kept").inc(len(points))
+
+    # Dodanie punktów GPS do bazy danych (pula senderów ILP, powrót po potwierdzonym flushu)
+    geohashes = encode_many(
+        np.fromiter((point.latitude for point in points), dtype=np.float64, count=len(points)),
+        np.fromiter((point.longitude for point in points), dtype=np.float64, count=len(points)),
+        POINT_GEOHASH_PRECISION,
+    )
+    rows = [
+        {
+            "table_name": "gps_points",
+            "symbols": {
+                "user_id": str(point.user_id),
+                "session_id": str(point.session_id),
+                "last_entry": str(point.last_entry).lower() if point.last_entry is not None else "false",
+                "geohash": point_geohash,
+            },
+            "columns": {
+                "latitude": float(point.latitude),
+                "longitude": float(point.longitude),
+                "activity": point.activity.value,
+                "acceleration": float(point.acceleration) if point.acceleration is not None else 0.0
+            },
+            "at": strip_timezone(point.timestamp),
+        }
+        for point, point_geohash in zip(points, geohashes)
+    ]
     try:
-        with gps_db.get_new_sender() as sender:
-            for point in points:
-                utc_timestamp = point.timestamp.replace(tzinfo=None)
-                sender.row(
-                    table_name="gps_points",
-                    symbols={
-                        "user_id": str(point.user_id),
-                        "session_id": str(point.session_id),
-                        "last_entry": str(point.last_entry).lower() if point.last_entry is not None else "false"
-                    },
-                    columns={
-                        "latitude": float(point.latitude),
-                        "longitude": float(point.longitude),
-                        "activity": point.activity.value,
-                        "acceleration": float(point.acceleration) if point.acceleration is not None else 0.0
-                    },
-                    at=utc_timestamp,
-                )
-            sender.flush()
+        await gps_db.write_rows(rows)
     except Exception as e:
         raise RuntimeError(f"Nie udało się dodać do bazy punktów GPS: {str(e)}")
 
-    # Sprawdzanie czy wszystkie session_id istnieją w bazie
-    tasks = [asyncio.create_task(check_if_trip_exists(session_id)) for session_id in unique_session_ids]
-    checked_session_ids = await asyncio.gather(*tasks)
+    # Rejestracja nowych tras - sesje znane z poprzednich paczek pomijają bazę
+    unknown_session_ids = [session_id for session_id in points_by_session if session_id not in known_trip_sessions]
+    created_session_ids = await register_trips(
+        user_id=next(iter(unique_user_ids)),
+        started_at_by_session_id={
+            session_id: strip_timezone(min(point.timestamp for point in points_by_session[session_id]))
+            for session_id in unknown_session_ids
+        },
+    )
+    known_trip_sessions.add(unknown_session_ids)
 
-    # Dodanie tras i ich podsumowań do bazy jeżeli nie istnieją
-    input_session_ids_tasks = [asyncio.create_task(add_trip_and_trip_summary_to_db(session_id=session_id, user_id=unique_user_ids.pop())) for session_id, exists in zip(unique_session_ids, checked_session_ids) if not exists]
-    await asyncio.gather(*input_session_ids_tasks)
+    # Przyrostowa aktualizacja podsumowań tras
+    for session_id, session_points in points_by_session.items():
+        trip_responses.invalidate(session_id)
+        simplified_tracks.invalidate(session_id)
+        trip_accumulators.add_points(session_id=session_id, track=GPSTrack.from_points(session_points), new_session=session_id in created_session_ids)
     return True
 
-async def get_gps_points_by_trip_id(session_id: str) -> list[GPSPoint]:
-    async for session in gps_db.get_connection():
+async def get_gps_points_by_trip_id(session_id: str, resolution: str | None = None, resolution_mode: ResolutionMode = ResolutionMode.AVG) -> list[GPSPoint]:
+    """Punkty GPS sesji; z `resolution` (np. "10s", "1m") uśrednione lub ostatnie w przedziale - agregacja po stronie QuestDB."""
+    if resolution is None:
         query = """
                 SELECT timestamp, user_id, session_id, last_entry, latitude, longitude, activity
                 FROM gps_points
                 WHERE session_id = $1
                 ORDER BY timestamp
             """
+    else:
+        if not re.fullmatch(RESOLUTION_PATTERN, resolution):
+            raise ValueError(f"Nieprawidłowa rozdzielczość: {resolution}")
+        coordinates = "avg" if resolution_mode == ResolutionMode.AVG else "last"
+        query = f"""
+                SELECT timestamp, first(user_id) user_id, first(session_id) session_id, last(last_entry) last_entry,
+                       {coordinates}(latitude) latitude, {coordinates}(longitude) longitude, last(activity) activity
+                FROM gps_points
+                WHERE session_id = $1
+                SAMPLE BY {resolution} ALIGN TO FIRST OBSERVATION
+            """
+    async for session in gps_db.get_connection():
             # Wykonanie zapytania z parametrem
         result = await session.fetch(query, session_id)
-        if not result:
-            raise HTTPException(status_code=404, detail="Brak punktów GPS dla tej sesji")
-        points = [GPSPoint(**row) for row in result]
+    if not result:
+        raise HTTPException(status_code=404, detail="Brak punktów GPS dla tej sesji")
+    # Budowa punktów po zwolnieniu połączenia
+    return gps_points_from_rows(result)
+
+def gps_points_from_rows(rows) -> list[GPSPoint]:
+    """Punkty z wierszy QuestDB bez ponownej walidacji - dane zostały zwalidowane przy zapisie.
 
+    Kolejność kolumn: timestamp, user_id, session_id, last_entry, latitude, longitude, activity.
+    Atrybuty ustawiane jak w GPSPoint.model_construct, z pominięciem jego narzutu - model_construct jest tu ~5x
+    wolniejszy, a nawet wolniejszy od walidacji GPSPoint(**row). Zgodność z GPSPoint(**row) sprawdza test_gps_points_from_rows.
+    """
+    new_point = GPSPoint.__new__
+    set_attribute = object.__setattr__
+    points = []
+    for timestamp, user_id, session_id, last_entry, latitude, longitude, activity in rows:
+        point = new_point(GPSPoint)
+        set_attribute(point, "__dict__", {
+            "session_id": session_id,
+            "timestamp": timestamp,
+            "user_id": int(user_id),
+            "latitude": latitude,
+            "longitude": longitude,
+            "acceleration": 0.0,
+            "last_entry": last_entry == "true",
+            "activity": ACTIVITIES_BY_VALUE.get(activity),
+        })
+        set_attribute(point, "__pydantic_fields_set__", GPS_POINT_FIELDS.copy())
+        set_attribute(point, "__pydantic_extra__", None)
+        set_attribute(point, "__pydantic_private__", None)
+        points.append(point)
     return points
+
+async def get_trip_accumulator(session_id: str, points: list[GPSPoint] | None = None) -> TripAccumulator:
+    """Akumulator trasy z pamięci; w razie braku odbudowywany z punktów (podanych lub pobranych z QuestDB)."""
+    accumulator = trip_accumulators.get(session_id)
+    if accumulator is not None:
+        return accumulator
+
+    trip_accumulators.begin_rebuild(session_id)
+    try:
+        if points is None:
+            points = await get_gps_points_by_trip_id(session_id=session_id)
+        accumulator = TripAccumulator.from_track(session_id=session_id, track=GPSTrack.from_points(points))
+    except Exception:
+        trip_accumulators.cancel_rebuild(session_id)
+        raise
+    trip_accumulators.finish_rebuild(accumulator)
+    return accumulator
@@ -0,0 +1,146 @@
+"""Metryki Prometheus: czasy żądań HTTP, zapytań do baz, zapisu ILP, obliczeń tras i wysyłki przypominajek.
+
+Na ścieżkach gorących wyłącznie obserwacje histogramów; stan pul i statystyki zapisu odczytywane dopiero przy scrapowaniu.
+"""
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional
+import time
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH"}
+
+HTTP_REQUEST_DURATION = Histogram(
+    "fitapp_http_request_duration_seconds", "Czas obsługi żądania HTTP", ["method", "route"], buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS = Counter("fitapp_http_requests_total", "Liczba obsłużonych żądań HTTP", ["method", "route", "status"])
+HTTP_REQUESTS_IN_PROGRESS = Gauge("fitapp_http_requests_in_progress", "Liczba obsługiwanych żądań HTTP", ["method"])
+
+POSTGRES_QUERY_DURATION = Histogram(
+    "fitapp_postgres_query_duration_seconds", "Czas wykonania zapytania do PostgreSQL", ["operation"], buckets=LATENCY_BUCKETS
+)
+QUESTDB_POOL_ACQUIRE_DURATION = Histogram(
+    "fitapp_questdb_pool_acquire_seconds", "Czas oczekiwania na połączenie z puli QuestDB (PGWire)", buckets=LATENCY_BUCKETS
+)
+ILP_FLUSH_DURATION = Histogram("fitapp_ilp_flush_duration_seconds", "Czas flushu paczki ILP do QuestDB", buckets=LATENCY_BUCKETS)
+GPS_POINTS_INGESTED = Counter("fitapp_gps_points_ingested_total", "Punkty GPS przyjęte do zapisu", ["result"])
+
+TRIP_METRICS_DURATION = Histogram(
+    "fitapp_trip_metrics_duration_seconds", "Czas obliczania metryk trasy", ["mode"], buckets=LATENCY_BUCKETS
+)
+REMINDER_JOB_DURATION = Histogram(
+    "fitapp_reminder_job_duration_seconds", "Czas zadania wysyłki przypominajek", buckets=(1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+)
+REMINDER_NOTIFICATIONS = Counter("fitapp_reminder_notifications_total", "Wynik wysyłki powiadomień przypominajek", ["result"])
+
+
+class RequestTimings:
+    """Łączny czas oczekiwania na bazy danych w obrębie jednego (profilowanego) żądania."""
+
+    def __init__(self) -> None:
+        self.seconds: dict[str, float] = {"postgres": 0.0, "questdb": 0.0}
+
+    def add(self, database: str, seconds: float) -> None:
+        self.seconds[database] = self.seconds.get(database, 0.0) + seconds
+
+
+# Ustawiane tylko dla profilowanych żądań - w pozostałych pomiar kończy się na odczycie ContextVar
+request_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+def record_request_timing(database: str, seconds: float) -> None:
+    timings = request_timings.get()
+    if timings is not None:
+        timings.add(database, seconds)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI mierzący żądania HTTP; trasa jako szablon ścieżki (scope["route"] ustawiany przez FastAPI)."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - started
+            in_progress.dec()
+            route = scope.get("route")
+            # Niedopasowane ścieżki pod jedną etykietą - ograniczenie liczby serii
+            route_path = getattr(route, "path", "unmatched")
+            HTTP_REQUEST_DURATION.labels(method, route_path).observe(duration)
+            HTTP_REQUESTS.labels(method, route_path, str(status_code)).inc()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    duration = time.perf_counter() - conn.info["query_started"].pop()
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ""
+    POSTGRES_QUERY_DURATION.labels(operation if operation in QUERY_OPERATIONS else "OTHER").observe(duration)
+    record_request_timing("postgres", duration)
+
+def _handle_error(exception_context) -> None:
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+def instrument_engine(engine: Engine) -> None:
+    """Pomiar czasu zapytań przez zdarzenia silnika SQLAlchemy (dla AsyncEngine - jego `sync_engine`)."""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class DatabaseCollector(Collector):
+    """Stan pul połączeń i statystyki zapisu ILP, odczytywane przy scrapowaniu (bez kosztu na ścieżce żądania)."""
+
+    def __init__(self, postgres_pool_status: Callable[[], dict], questdb_pool_status: Callable[[], dict], ingest_stats: Callable) -> None:
+        self._postgres_pool_status = postgres_pool_status
+        self._questdb_pool_status = questdb_pool_status
+        self._ingest_stats = ingest_stats
+
+    def collect(self) -> Iterable:
+        for database, pool_status in (("postgres", self._postgres_pool_status()), ("questdb", self._questdb_pool_status())):
+            for name, value in pool_status.items():
+                gauge = GaugeMetricFamily(f"fitapp_{database}_pool_{name}", f"Pula połączeń {database}: {name}")
+                gauge.add_metric([], value)
+                yield gauge
+
+        stats = self._ingest_stats()
+        for name, description in (
+            ("flushes", "Liczba flushy ILP"),
+            ("rows_flushed", "Liczba wierszy zapisanych przez ILP"),
+            ("bytes_flushed", "Liczba bajtów wysłanych przez ILP"),
+            ("failed_requests", "Liczba zleceń zapisu ILP zakończonych błędem"),
+        ):
+            counter = CounterMetricFamily(f"fitapp_ilp_{name}", description)
+            counter.add_metric([], getattr(stats, name))
+            yield counter
+        queue_depth = GaugeMetricFamily("fitapp_ilp_queue_depth", "Liczba zleceń zapisu ILP oczekujących w kolejce")
+        queue_depth.add_metric([], stats.queue_depth)
+        yield queue_depth
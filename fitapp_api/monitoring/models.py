@@ -0,0 +1,39 @@
+"""Modele monitoringu dla FitApp."""
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Optional
+from enum import Enum
+
+
+class ProfileReportFormat(str, Enum):
+    HTML = "html"
+    SPEEDSCOPE = "speedscope"
+
+
+class ProfileReport(BaseModel):
+    id: str
+    created_at: datetime
+    method: str
+    path: str
+    status_code: int
+    sampled: bool = Field(description="Żądanie wybrane losowo (PROFILING_SAMPLE_RATE), a nie na prośbę administratora")
+    duration_ms: float = Field(description="Całkowity czas obsługi żądania")
+    postgres_ms: float = Field(description="Czas zapytań do PostgreSQL")
+    questdb_ms: float = Field(description="Czas zapytań i zapisu do QuestDB")
+    other_ms: float = Field(description="Pozostały czas: CPU i inne oczekiwania")
+
+
+class DatabaseHealth(BaseModel):
+    connected: bool
+    latency_ms: Optional[float] = Field(default=None, description="Czas zapytania kontrolnego")
+    error: Optional[str] = None
+    pool: dict[str, int] = Field(default_factory=dict, description="Stan puli połączeń")
+    saturation: Optional[float] = Field(default=None, description="Udział zajętych połączeń w maksymalnym rozmiarze puli (0-1)")
+
+
+class ReadinessResponse(BaseModel):
+    ready: bool
+    draining: bool = Field(description="Aplikacja jest zamykana - nowe żądania powinny trafić do innej instancji")
+    postgres: DatabaseHealth
+    questdb: DatabaseHealth
+    ingest_queue_depth: int = Field(description="Liczba zleceń zapisu ILP oczekujących w kolejce")
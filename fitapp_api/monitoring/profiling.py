@@ -0,0 +1,150 @@
+"""Profilowanie pojedynczych żądań (pyinstrument) - na prośbę administratora lub dla losowej części ruchu.
+
+Żądanie administratora z nagłówkiem `X-Profile` lub parametrem `profile` jest wykonywane pod profilerem próbkującym;
+odpowiedź wskazuje raport w nagłówku `X-Profile-Report`. Bez tych znaczników (i przy PROFILING_SAMPLE_RATE=0)
+middleware jedynie przekazuje żądanie dalej.
+"""
+from collections import OrderedDict
+from datetime import datetime
+from starlette.datastructures import Headers, QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from fastapi import HTTPException
+from typing import Any, Optional
+from dotenv import load_dotenv
+import os
+import random
+import time
+import uuid
+from fitapp_api.monitoring.metrics import RequestTimings, request_timings
+from fitapp_api.monitoring.models import ProfileReport
+from fitapp_api.postgres.db import pg_db
+from fitapp_api.users.router import get_current_user
+
+load_dotenv()
+
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", 0.0))
+PROFILING_INTERVAL_SECONDS = float(os.getenv("PROFILING_INTERVAL_SECONDS", 0.001))
+PROFILING_MAX_REPORTS = int(os.getenv("PROFILING_MAX_REPORTS", 50))
+PROFILE_HEADER = b"x-profile"
+PROFILE_QUERY_FLAG = b"profile"
+
+
+class ProfileReportStore:
+    """Ostatnie raporty profilowania (LRU) - sesje pyinstrument renderowane dopiero przy pobraniu."""
+
+    def __init__(self, max_reports: int = PROFILING_MAX_REPORTS) -> None:
+        self.max_reports = max_reports
+        self._reports: OrderedDict[str, tuple[ProfileReport, Any]] = OrderedDict()
+
+    def put(self, report: ProfileReport, session: Any) -> None:
+        self._reports[report.id] = (report, session)
+        while len(self._reports) > self.max_reports:
+            self._reports.popitem(last=False)
+
+    def get(self, report_id: str) -> Optional[tuple[ProfileReport, Any]]:
+        return self._reports.get(report_id)
+
+    def list(self) -> list[ProfileReport]:
+        return [report for report, _ in reversed(self._reports.values())]
+
+
+profile_reports = ProfileReportStore()
+
+
+def is_profiling_requested(scope: Scope) -> bool:
+    if PROFILE_QUERY_FLAG in scope.get("query_string", b"") and PROFILE_QUERY_FLAG.decode() in QueryParams(scope["query_string"]):
+        return True
+    return any(name == PROFILE_HEADER for name, _ in scope["headers"])
+
+async def is_admin_request(scope: Scope) -> bool:
+    """Weryfikacja tokenu jak w get_current_admin_user (użytkownik zwykle z pamięci podręcznej)."""
+    scheme, _, token = Headers(scope=scope).get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    async for session in pg_db.get_session():
+        try:
+            user = await get_current_user(token=token, db=session)
+        except HTTPException:
+            return False
+        return user.is_admin
+    return False
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI profilujący wybrane żądania; naraz profilowane jest co najwyżej jedno."""
+
+    def __init__(self, app: ASGIApp, sample_rate: float = PROFILING_SAMPLE_RATE) -> None:
+        self.app = app
+        self.sample_rate = sample_rate
+        # Flaga zamiast asyncio.Lock - sprawdzenie i ustawienie bez await pomiędzy, więc drugie żądanie nigdy nie czeka
+        self._profiling = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requested = is_profiling_requested(scope)
+        sampled = not requested and self.sample_rate > 0 and random.random() < self.sample_rate
+        if not (requested or sampled) or self._profiling or (requested and not await is_admin_request(scope)):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            print("Profilowanie niedostępne - brak pakietu pyinstrument.")
+            await self.app(scope, receive, send)
+            return
+
+        # Ponowne sprawdzenie - w trakcie weryfikacji administratora inne żądanie mogło rozpocząć profilowanie
+        if self._profiling:
+            await self.app(scope, receive, send)
+            return
+        self._profiling = True
+        try:
+            await self._profile(Profiler, scope, receive, send, sampled=sampled)
+        finally:
+            self._profiling = False
+
+    async def _profile(self, profiler_class, scope: Scope, receive: Receive, send: Send, sampled: bool) -> None:
+        report_id = uuid.uuid4().hex
+        status_code = 500
+
+        async def send_with_report(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Raport losowo profilowanych żądań widoczny tylko dla administratorów (/profiling/reports)
+                if not sampled:
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (b"x-profile-id", report_id.encode()),
+                        (b"x-profile-report", f"/profiling/reports/{report_id}".encode()),
+                    ]
+            await send(message)
+
+        timings = RequestTimings()
+        timings_token = request_timings.set(timings)
+        profiler = profiler_class(interval=PROFILING_INTERVAL_SECONDS, async_mode="enabled")
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_report)
+        finally:
+            session = profiler.stop()
+            duration = time.perf_counter() - started
+            request_timings.reset(timings_token)
+            postgres, questdb = timings.seconds["postgres"], timings.seconds["questdb"]
+            profile_reports.put(ProfileReport(
+                id=report_id,
+                created_at=datetime.now(),
+                method=scope["method"],
+                path=scope["path"],
+                status_code=status_code,
+                sampled=sampled,
+                duration_ms=duration * 1000,
+                postgres_ms=postgres * 1000,
+                questdb_ms=questdb * 1000,
+                other_ms=max(duration - postgres - questdb, 0.0) * 1000,
+            ), session)
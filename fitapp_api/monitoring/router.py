@@ -0,0 +1,95 @@
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.responses import HTMLResponse, JSONResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from fitapp_api.postgres.db import pg_db
+from fitapp_api.gps.db import gps_db
+from fitapp_api.users.models import User
+from fitapp_api.users.router import get_current_admin_user
+from fitapp_api.monitoring.metrics import DatabaseCollector
+from fitapp_api.monitoring.models import ProfileReport, ProfileReportFormat, DatabaseHealth, ReadinessResponse
+from fitapp_api.monitoring.profiling import profile_reports
+from typing import Awaitable, Callable
+from dotenv import load_dotenv
+import asyncio
+import os
+
+load_dotenv()
+
+HEALTH_CHECK_TIMEOUT_SECONDS = float(os.getenv("HEALTH_CHECK_TIMEOUT_SECONDS", 2))
+
+
+monitoring_router = APIRouter()
+
+REGISTRY.register(DatabaseCollector(
+    postgres_pool_status=pg_db.pool_status,
+    questdb_pool_status=gps_db.pool_status,
+    ingest_stats=gps_db.get_ingest_stats,
+))
+
+
+class ApplicationState:
+    draining = False
+
+    @classmethod
+    async def start_draining(cls) -> None:
+        """Pierwszy krok zamykania - /health/ready zgłasza niegotowość, zanim pule zostaną zamknięte."""
+        cls.draining = True
+
+
+async def check_database(ping: Callable[[float], Awaitable[float]], pool_status: dict[str, int], in_use: int) -> DatabaseHealth:
+    saturation = in_use / pool_status["max_size"] if pool_status.get("max_size") else None
+    try:
+        latency = await ping(HEALTH_CHECK_TIMEOUT_SECONDS)
+    except Exception as e:
+        return DatabaseHealth(connected=False, error=str(e) or type(e).__name__, pool=pool_status, saturation=saturation)
+    return DatabaseHealth(connected=True, latency_ms=latency * 1000, pool=pool_status, saturation=saturation)
+
+# Endpointy
+@monitoring_router.get("/health/ready")
+async def get_readiness() -> ReadinessResponse:
+    """Gotowość do przyjmowania ruchu: łączność z PostgreSQL i QuestDB oraz nasycenie pul (503, gdy niegotowa)."""
+    postgres_pool = pg_db.pool_status()
+    questdb_pool = gps_db.pool_status()
+    postgres, questdb = await asyncio.gather(
+        check_database(pg_db.ping, postgres_pool, in_use=postgres_pool.get("checked_out", 0)),
+        check_database(gps_db.ping, questdb_pool, in_use=questdb_pool.get("size", 0) - questdb_pool.get("idle", 0)),
+    )
+    readiness = ReadinessResponse(
+        ready=postgres.connected and questdb.connected and not ApplicationState.draining,
+        draining=ApplicationState.draining,
+        postgres=postgres,
+        questdb=questdb,
+        ingest_queue_depth=gps_db.get_ingest_stats().queue_depth,
+    )
+    return JSONResponse(content=readiness.model_dump(mode="json"), status_code=200 if readiness.ready else 503)
+
+@monitoring_router.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    """Metryki w formacie tekstowym Prometheus (endpoint przeznaczony dla scrapera - dostęp ograniczany na poziomie sieci)."""
+    return Response(content=generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
+@monitoring_router.get("/profiling/reports")
+async def get_profile_reports(current_user: User = Depends(get_current_admin_user)) -> list[ProfileReport]:
+    """Ostatnie raporty profilowania, od najnowszego - z podziałem czasu na PostgreSQL, QuestDB i resztę."""
+    return profile_reports.list()
+
+@monitoring_router.get("/profiling/reports/{report_id}")
+async def get_profile_report(
+    report_id: str,
+    format: ProfileReportFormat = ProfileReportFormat.HTML,
+    current_user: User = Depends(get_current_admin_user),
+) -> Response:
+    """Raport profilowania jako interaktywny HTML pyinstrument lub plik speedscope (flame graph)."""
+    entry = profile_reports.get(report_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Nie znaleziono raportu profilowania!")
+    _report, session = entry
+
+    from pyinstrument.renderers import HTMLRenderer, SpeedscopeRenderer
+    if format == ProfileReportFormat.SPEEDSCOPE:
+        return Response(
+            content=SpeedscopeRenderer().render(session),
+            media_type="application/json",
+            headers={"Content-Disposition": f'attachment; filename="{report_id}.speedscope.json"'},
+        )
+    return HTMLResponse(content=HTMLRenderer().render(session))
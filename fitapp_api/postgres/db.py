@@ -1,12 +1,85 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlmodel import SQLModel
+from sqlalchemy import text
 from dotenv import load_dotenv
+import asyncio
 import os
+import time
 from typing import AsyncGenerator
+from fitapp_api.monitoring.metrics import instrument_engine
 
 load_dotenv()
 
+POSTGRES_ECHO = os.getenv("POSTGRES_ECHO", "false").lower() == "true"
+POSTGRES_POOL_SIZE = int(os.getenv("POSTGRES_POOL_SIZE", 5))
+POSTGRES_MAX_OVERFLOW = int(os.getenv("POSTGRES_MAX_OVERFLOW", 10))
+POSTGRES_POOL_TIMEOUT = float(os.getenv("POSTGRES_POOL_TIMEOUT", 30))
+POSTGRES_POOL_RECYCLE = int(os.getenv("POSTGRES_POOL_RECYCLE", 1800))
+POSTGRES_POOL_PRE_PING = os.getenv("POSTGRES_POOL_PRE_PING", "true").lower() == "true"
+POSTGRES_POOL_PREWARM = int(os.getenv("POSTGRES_POOL_PREWARM", POSTGRES_POOL_SIZE))
+# 0 wyłącza cache przygotowanych zapytań (wymagane przy PgBouncer w trybie transakcyjnym)
+POSTGRES_STATEMENT_CACHE_SIZE = int(os.getenv("POSTGRES_STATEMENT_CACHE_SIZE", 100))
+
+# Trasy powtarzające session_id poza zachowywaną: z podsumowaniem przed bez podsumowania, potem najmniejsze id
+DUPLICATE_TRIP_IDS = """
+    SELECT id FROM (
+        SELECT trip.id, ROW_NUMBER() OVER (PARTITION BY trip.session_id ORDER BY tripsummary.trip_id IS NULL, trip.id) AS position
+        FROM trip LEFT JOIN tripsummary ON tripsummary.trip_id = trip.id
+    ) ranked WHERE position > 1
+"""
+
+# Zmiany schematu istniejących baz - create_all tworzy jedynie brakujące tabele (polecenia muszą być idempotentne)
+SCHEMA_UPGRADES = [
+    "ALTER TABLE trip ADD COLUMN IF NOT EXISTS started_at TIMESTAMP WITHOUT TIME ZONE",
+    "CREATE INDEX IF NOT EXISTS ix_trip_session_id ON trip (session_id)",
+    "CREATE INDEX IF NOT EXISTS ix_trip_user_id_started_at ON trip (user_id, started_at DESC NULLS LAST, id DESC)",
+    "UPDATE trip SET started_at = tripsummary.start_time FROM tripsummary WHERE tripsummary.trip_id = trip.id AND trip.started_at IS NULL",
+    # Duplikaty tras z równoległych paczek (jednorazowo, przed utworzeniem unikalnego indeksu): w każdej sesji zostaje
+    # trasa z podsumowaniem o najmniejszym id (lub najstarsza, gdy żadna nie ma podsumowania), pozostałe usuwane
+    # wraz z podsumowaniami i odcinkami - podsumowanie i tak można odtworzyć z punktów GPS sesji
+    f"""
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE tablename = 'trip' AND indexname = 'ix_trip_session_id' AND indexdef LIKE 'CREATE UNIQUE%') THEN
+            DELETE FROM tripsplit WHERE trip_id IN ({DUPLICATE_TRIP_IDS});
+            DELETE FROM tripsummary WHERE trip_id IN ({DUPLICATE_TRIP_IDS});
+            DELETE FROM trip WHERE id IN ({DUPLICATE_TRIP_IDS});
+            DROP INDEX IF EXISTS ix_trip_session_id;
+            CREATE UNIQUE INDEX ix_trip_session_id ON trip (session_id);
+        END IF;
+    END $$
+    """,
+    *(
+        f"ALTER TABLE tripsummary ADD COLUMN IF NOT EXISTS {column} {column_type}"
+        for column, column_type in (
+            ("start_geohash", "VARCHAR"),
+            ("end_geohash", "VARCHAR"),
+            ("min_latitude", "FLOAT"),
+            ("min_longitude", "FLOAT"),
+            ("max_latitude", "FLOAT"),
+            ("max_longitude", "FLOAT"),
+            ("max_speed", "FLOAT"),
+            ("average_speed", "FLOAT"),
+            ("moving_time", "FLOAT"),
+        )
+    ),
+    'CREATE INDEX IF NOT EXISTS ix_tripsummary_start_geohash ON tripsummary ((start_geohash COLLATE "C"))',
+    'CREATE INDEX IF NOT EXISTS ix_tripsummary_end_geohash ON tripsummary ((end_geohash COLLATE "C"))',
+    # Dzienne sumy nowo utworzonej (pustej) tabeli - odpowiednik rebuild_daily_rollups, inaczej historia sprzed wdrożenia
+    # w statystykach wynosiłaby zero. Nowa tabela nie jest widoczna dla innych procesów do commita tej transakcji.
+    """
+    INSERT INTO dailyactivityrollup (user_id, day, activity, distance, duration, calories_burned, count)
+    SELECT trip.user_id, CAST(tripsummary.start_time AS DATE), tripsummary.activity,
+        COALESCE(SUM(tripsummary.distance), 0.0), COALESCE(SUM(tripsummary.duration), 0.0),
+        COALESCE(SUM(tripsummary.calories_burned), 0.0), CAST(COUNT(*) AS INTEGER)
+    FROM tripsummary JOIN trip ON trip.id = tripsummary.trip_id
+    WHERE tripsummary.end_time IS NOT NULL AND NOT EXISTS (SELECT 1 FROM dailyactivityrollup)
+    GROUP BY trip.user_id, CAST(tripsummary.start_time AS DATE), tripsummary.activity
+    ON CONFLICT DO NOTHING
+    """,
+]
+
 class PostgresDB:
     """Singleton do zarządzania połączeniami z bazą PostgreSQL."""
     _instance = None
@@ -27,12 +100,52 @@ class PostgresDB:
             port = os.getenv("POSTGRES_PORT", "5432")
             db = os.getenv("POSTGRES_DB", "fitapp_db")
 
-            postgres_url = f"postgresql+asyncpg://{user}:{password}@{host}:{port}/{db}"
-            self._engine = create_async_engine(postgres_url, echo=True)
+            postgres_url = f"postgresql+asyncpg://{user}:{password}@{host}:{port}/{db}?prepared_statement_cache_size={POSTGRES_STATEMENT_CACHE_SIZE}"
+            self._engine = create_async_engine(
+                postgres_url,
+                echo=POSTGRES_ECHO,
+                pool_size=POSTGRES_POOL_SIZE,
+                max_overflow=POSTGRES_MAX_OVERFLOW,
+                pool_timeout=POSTGRES_POOL_TIMEOUT,
+                pool_recycle=POSTGRES_POOL_RECYCLE,
+                pool_pre_ping=POSTGRES_POOL_PRE_PING,
+                connect_args={"statement_cache_size": POSTGRES_STATEMENT_CACHE_SIZE},
+            )
+            instrument_engine(self._engine.sync_engine)
             self._session_factory = sessionmaker(
                 self._engine, class_=AsyncSession, expire_on_commit=False
             )
             await self.create_tables()
+            await self.prewarm()
+
+    async def prewarm(self, connections: int = POSTGRES_POOL_PREWARM) -> None:
+        """Otwiera połączenia z wyprzedzeniem, by pierwsze żądania nie czekały na ich zestawienie."""
+        opened = await asyncio.gather(
+            *(self._engine.connect().start() for _ in range(min(connections, POSTGRES_POOL_SIZE))),
+            return_exceptions=True,
+        )
+        for connection in opened:
+            if isinstance(connection, BaseException):
+                print(f"Nie udało się otworzyć połączenia z PostgreSQL: {str(connection)}")
+            else:
+                await connection.close()
+
+    async def close(self) -> None:
+        """Zamyka wszystkie połączenia puli (wywoływane przy zamykaniu aplikacji)."""
+        if self._engine is not None:
+            await self._engine.dispose()
+            self._engine = None
+            self._session_factory = None
+
+    async def ping(self, timeout: float) -> float:
+        """Czas (w sekundach) prostego zapytania - sprawdzenie łączności dla /health/ready."""
+        if self._engine is None:
+            raise RuntimeError("Pula PostgreSQL nie została zainicjalizowana")
+        started = time.perf_counter()
+        async with asyncio.timeout(timeout):
+            async with self._engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
+        return time.perf_counter() - started
 
     async def get_session(self) -> AsyncGenerator[AsyncSession, None]:
         """Metoda do pobierania sesji bazy."""
@@ -41,6 +154,12 @@ class PostgresDB:
         async with self._session_factory() as session:
             yield session
 
+    def pool_status(self) -> dict[str, int]:
+        if self._engine is None:
+            return {}
+        pool = self._engine.sync_engine.pool
+        return {"size": pool.size(), "checked_out": pool.checkedout(), "max_size": pool.size() + POSTGRES_MAX_OVERFLOW}
+
     async def create_tables(self):
         """Stworzenie tabeli w bazie (w przypadku ich braku)."""
         if self._engine is None:
@@ -48,5 +167,7 @@ class PostgresDB:
 
         async with self._engine.begin() as conn:
             await conn.run_sync(SQLModel.metadata.create_all)
+            for statement in SCHEMA_UPGRADES:
+                await conn.execute(text(statement))
 
 pg_db = PostgresDB()
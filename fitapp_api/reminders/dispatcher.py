@@ -0,0 +1,118 @@
+"""Współbieżna wysyłka powiadomień FCM: pula wątków, limit wysyłek na sekundę i ponowienia z wykładniczym opóźnieniem."""
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import BaseModel, Field
+from pyfcm.errors import FCMNotRegisteredError, FCMServerError
+from requests.exceptions import ConnectionError, Timeout
+from typing import Any, Callable, Iterable, NamedTuple
+from dotenv import load_dotenv
+import asyncio
+import os
+import random
+import time
+
+load_dotenv()
+
+FCM_DISPATCH_CONCURRENCY = int(os.getenv("FCM_DISPATCH_CONCURRENCY", 8))
+FCM_DISPATCH_RATE_PER_SECOND = float(os.getenv("FCM_DISPATCH_RATE_PER_SECOND", 100))
+FCM_DISPATCH_MAX_RETRIES = int(os.getenv("FCM_DISPATCH_MAX_RETRIES", 3))
+FCM_DISPATCH_BACKOFF_SECONDS = float(os.getenv("FCM_DISPATCH_BACKOFF_SECONDS", 0.5))
+
+RETRYABLE_ERRORS = (FCMServerError, ConnectionError, Timeout)
+
+
+class PushMessage(NamedTuple):
+    token: str
+    title: str
+    body: str
+
+
+class DispatchReport(BaseModel):
+    sent: int = Field(default=0, description="Liczba wysłanych powiadomień")
+    failed: int = Field(default=0, description="Liczba nieudanych wysyłek")
+    retries: int = Field(default=0, description="Liczba ponowień")
+    invalid_tokens: list[str] = Field(default_factory=list, description="Tokeny odrzucone przez FCM jako niezarejestrowane")
+    duration_seconds: float = Field(default=0.0, description="Czas wysyłki w sekundach")
+
+    @property
+    def throughput_per_second(self) -> float:
+        return self.sent / self.duration_seconds if self.duration_seconds > 0 else 0.0
+
+    def merge(self, other: "DispatchReport") -> None:
+        self.sent += other.sent
+        self.failed += other.failed
+        self.retries += other.retries
+        self.invalid_tokens.extend(other.invalid_tokens)
+        self.duration_seconds += other.duration_seconds
+
+
+class RateLimiter:
+    """Równomierne rozłożenie wysyłek - co najwyżej `rate_per_second` startów na sekundę."""
+
+    def __init__(self, rate_per_second: float) -> None:
+        self._interval = 1 / rate_per_second if rate_per_second > 0 else 0.0
+        self._next_slot = 0.0
+
+    async def acquire(self) -> None:
+        if not self._interval:
+            return
+        now = asyncio.get_running_loop().time()
+        wait = self._next_slot - now
+        self._next_slot = max(now, self._next_slot) + self._interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class FCMDispatcher:
+    """Wysyła powiadomienia przez blokującą funkcję `send(token, title, body)` w ograniczonej puli wątków."""
+
+    def __init__(
+        self,
+        send: Callable[[str, str, str], Any],
+        concurrency: int = FCM_DISPATCH_CONCURRENCY,
+        rate_per_second: float = FCM_DISPATCH_RATE_PER_SECOND,
+        max_retries: int = FCM_DISPATCH_MAX_RETRIES,
+        backoff_seconds: float = FCM_DISPATCH_BACKOFF_SECONDS,
+    ) -> None:
+        self._send = send
+        self.concurrency = concurrency
+        self.rate_per_second = rate_per_second
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="fcm-dispatch")
+
+    async def dispatch(self, messages: Iterable[PushMessage]) -> DispatchReport:
+        report = DispatchReport()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        rate_limiter = RateLimiter(self.rate_per_second)
+        started = time.perf_counter()
+        await asyncio.gather(*(self._send_with_retries(message, semaphore, rate_limiter, report) for message in messages))
+        report.duration_seconds = time.perf_counter() - started
+        return report
+
+    async def _send_with_retries(self, message: PushMessage, semaphore: asyncio.Semaphore, rate_limiter: RateLimiter, report: DispatchReport) -> None:
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.max_retries + 1):
+            async with semaphore:
+                await rate_limiter.acquire()
+                try:
+                    await loop.run_in_executor(self._executor, self._send, message.token, message.title, message.body)
+                    report.sent += 1
+                    return
+                except FCMNotRegisteredError:
+                    report.invalid_tokens.append(message.token)
+                    report.failed += 1
+                    return
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        print(f"Nie udało się wysłać powiadomienia FCM po {attempt + 1} próbach: {str(e)}")
+                        report.failed += 1
+                        return
+                except Exception as e:
+                    print(f"Błąd wysyłania powiadomienia FCM: {str(e)}")
+                    report.failed += 1
+                    return
+            report.retries += 1
+            await asyncio.sleep(self.backoff_seconds * 2 ** attempt * (0.5 + random.random()))
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
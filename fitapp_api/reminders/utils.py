@@ -1,96 +1,147 @@
 from fitapp_api.postgres.db import pg_db
 from fitapp_api.reminders.models import Reminder
-from fitapp_api.users.models import User, UserFcmID
-from fitapp_api.statistics.router import get_statistics_for_user_in_time_range
-from sqlalchemy import select, or_
+from fitapp_api.users.models import UserFcmID
+from fitapp_api.trips.models import Trip, TripSummary
+from fitapp_api.reminders.dispatcher import FCMDispatcher, PushMessage, DispatchReport
+from fitapp_api.monitoring.metrics import REMINDER_JOB_DURATION, REMINDER_NOTIFICATIONS
+from sqlalchemy import select, or_, and_, func, true, update
+from sqlalchemy.engine import Row
+from typing import AsyncIterator
 from pyfcm import FCMNotification
 from dotenv import load_dotenv
 import os
 load_dotenv()
-import asyncio
 from datetime import datetime, date
 
 
 FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID")
 FIREBASE_API_KEY_FILENAME = os.getenv("FIREBASE_API_KEY_FILENAME")
+FCM_ENDPOINT_URL = os.getenv("FCM_ENDPOINT_URL")
+REMINDERS_BATCH_SIZE = int(os.getenv("REMINDERS_BATCH_SIZE", 1000))
 
 class FCMNotifier:
     """Klasa do wysyłania powiadomień FCM."""
 
-    def __init__(self, api_key_filename: str = FIREBASE_API_KEY_FILENAME, project_id: str = FIREBASE_PROJECT_ID) -> None:
+    def __init__(self, api_key_filename: str = FIREBASE_API_KEY_FILENAME, project_id: str = FIREBASE_PROJECT_ID, endpoint_url: str | None = FCM_ENDPOINT_URL) -> None:
         self.push_notifier = FCMNotification(api_key_filename, project_id)
+        # Np. lokalny, testowy serwer FCM
+        if endpoint_url:
+            self.push_notifier.fcm_end_point = endpoint_url
 
-    async def send_notification(self, title: str, body: str, device_token: str) -> None:
-        """Wysyłanie powiadomienia FCM."""
-        print(f"Wysyłanie powiadomienia FCM do {device_token}")
-        result = self.push_notifier.notify(fcm_token=device_token, notification_title=title, notification_body=body)
-        print(f"Wynik wysyłania powiadomienia: {result} dla tokenu {device_token}")
+    def notify(self, device_token: str, title: str, body: str) -> dict:
+        """Blokujące wysłanie powiadomienia FCM (wywoływane w puli wątków dispatchera)."""
+        return self.push_notifier.notify(fcm_token=device_token, notification_title=title, notification_body=body)
 
 push_notifier = FCMNotifier()
+push_dispatcher = FCMDispatcher(send=push_notifier.notify)
 
-async def create_fcm_push_reminders() -> None:
-    """Asynchroniczne tworzenie przypominajek w postaci powiadomień Push (Firebase Cloud Messaging)."""
+def select_daily_goal_progress(start_time: datetime, end_time: datetime, after_user_id: int, limit: int):
+    """Przypominajki z tokenami FCM, dzisiejsze sumy użytkowników i ocena celów - zbiorczo, w jednym zapytaniu."""
+    totals = (
+        select(
+            func.coalesce(func.sum(TripSummary.distance), 0.0).label("distance"),
+            func.coalesce(func.sum(TripSummary.duration), 0.0).label("time"),
+            func.coalesce(func.sum(TripSummary.calories_burned), 0.0).label("calories_burned"),
+        )
+        .join(Trip, Trip.id == TripSummary.trip_id)
+        .where(
+            Trip.user_id == Reminder.user_id,
+            TripSummary.start_time >= start_time,
+            TripSummary.end_time <= end_time
+        )
+        .correlate(Reminder)
+        .lateral()
+    )
+    # Brak progu (NULL) oznacza cel spełniony
+    met_conditions = and_(
+        or_(Reminder.min_calories == None, totals.c.calories_burned >= Reminder.min_calories),
+        or_(Reminder.min_distance == None, totals.c.distance >= Reminder.min_distance),
+        or_(Reminder.min_time == None, totals.c.time >= Reminder.min_time),
+    )
+    return (
+        select(
+            Reminder.user_id,
+            UserFcmID.fcm_push_token,
+            met_conditions.label("met_conditions"),
+        )
+        .join(UserFcmID, UserFcmID.user_id == Reminder.user_id)
+        .join(totals, true())
+        .where(
+            or_(
+                Reminder.min_calories != None,
+                Reminder.min_distance != None,
+                Reminder.min_time != None
+            ),
+            UserFcmID.fcm_push_token != None,
+            Reminder.user_id > after_user_id
+        )
+        .order_by(Reminder.user_id)
+        .limit(limit)
+    )
 
-    user_ids = {}
+async def iter_daily_goal_progress(start_time: datetime, end_time: datetime, batch_size: int = REMINDERS_BATCH_SIZE) -> AsyncIterator[list[Row]]:
+    """Paczki wyników (keyset po user_id) - stała liczba zapytań na paczkę i ograniczona pamięć."""
+    after_user_id = -1
+    while True:
+        async for session in pg_db.get_session():
+            result = await session.execute(select_daily_goal_progress(start_time, end_time, after_user_id, batch_size))
+            rows = result.all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        after_user_id = rows[-1].user_id
 
+async def prune_invalid_fcm_tokens(tokens: list[str]) -> None:
+    """Usunięcie tokenów, które FCM zgłosił jako niezarejestrowane."""
+    if not tokens:
+        return
     async for session in pg_db.get_session():
-        try:
-            select_statement = select(
-                User.id,
-                UserFcmID.fcm_push_token,
-                Reminder
-            ).join(
-                UserFcmID, UserFcmID.user_id == User.id
-            ).join(
-                Reminder, Reminder.user_id == User.id
-            ).where(
-                or_(
-                    Reminder.min_calories != None,
-                    Reminder.min_distance != None,
-                    Reminder.min_time != None
-                ),
-                UserFcmID.fcm_push_token != None
-            )
+        await session.execute(update(UserFcmID).where(UserFcmID.fcm_push_token.in_(tokens)).values(fcm_push_token=None))
+        await session.commit()
 
-            result = await session.execute(select_statement)
-            for row in result.all():
-                user_id, fcm_token, reminder = row
-                if user_id not in user_ids:
-                    user_ids[user_id] = {
-                        "token": fcm_token,
-                        "reminder": reminder
-                    }
+async def create_fcm_push_reminders() -> DispatchReport:
+    """Asynchroniczne tworzenie przypominajek w postaci powiadomień Push (Firebase Cloud Messaging)."""
+    with REMINDER_JOB_DURATION.time():
+        report = await dispatch_fcm_push_reminders()
+    REMINDER_NOTIFICATIONS.labels("sent").inc(report.sent)
+    REMINDER_NOTIFICATIONS.labels("failed").inc(report.failed - len(report.invalid_tokens))
+    REMINDER_NOTIFICATIONS.labels("invalid_token").inc(len(report.invalid_tokens))
+    return report
 
-        except Exception as e:
-            print(f"Błąd: {e}")
+async def dispatch_fcm_push_reminders() -> DispatchReport:
+    start_time = datetime.combine(date.today(), datetime.min.time())
+    end_time = datetime.now()
+    report = DispatchReport()
 
-        if user_ids:
-            print(f"Użytkownicy z przypominajkami i tokenami FCM: {user_ids}")
-            tasks = []
-            start_time = datetime.combine(date.today(), datetime.min.time())
-            end_time = datetime.now()
-            for user_id in user_ids:
-                tasks.append(asyncio.create_task(get_statistics_for_user_in_time_range(user_id, start_time, end_time)))
-            results = await asyncio.gather(*tasks)
-            notification_tasks = []
-            for user_id, statistics in zip(user_ids, results):
-                print(f"Statystyki dla użytkownika {user_id}: {statistics} {user_ids[user_id]}")
-                reminder = user_ids[user_id]["reminder"]
-                token = user_ids[user_id]["token"]
-                met_conditions = all((
-                    (statistics.total_calories_burned >= reminder.min_calories),
-                    (statistics.total_distance >= reminder.min_distance),
-                    (statistics.total_time >= reminder.min_time)
-                ))
-                if met_conditions:
+    try:
+        async for rows in iter_daily_goal_progress(start_time, end_time):
+            messages: list[PushMessage] = []
+            user_ids = set()
+            for row in rows:
+                # Jeden token na użytkownika (pierwszy zwrócony)
+                if row.user_id in user_ids:
+                    continue
+                user_ids.add(row.user_id)
+                if row.met_conditions:
                     title = "Gratulacje!"
                     body = "Wszystko jest ok! Osiągnąłeś swoje cele na dziś!"
-                    notification_tasks.append(push_notifier.send_notification(title, body, token))
                 else:
                     title = "Nie osiągnięto celów"
                     body = "Nie osiągnąłeś jeszcze swoich celów na dziś. Nie poddawaj się!"
-                    notification_tasks.append(push_notifier.send_notification(title, body, token))
-            await asyncio.gather(*notification_tasks)
-            print("Powiadomienia FCM zostały wysłane.")
-        else:
-            print("Brak użytkowników z przypominajkami i tokenami FCM.")
+                messages.append(PushMessage(token=row.fcm_push_token, title=title, body=body))
+            batch_report = await push_dispatcher.dispatch(messages)
+            await prune_invalid_fcm_tokens(batch_report.invalid_tokens)
+            report.merge(batch_report)
+    except Exception as e:
+        print(f"Błąd: {e}")
+
+    if report.sent or report.failed:
+        print(
+            f"Powiadomienia FCM: wysłane {report.sent}, nieudane {report.failed}, ponowienia {report.retries}, "
+            f"usunięte tokeny {len(report.invalid_tokens)}, {report.throughput_per_second:.1f}/s w {report.duration_seconds:.2f} s."
+        )
+    else:
+        print("Brak użytkowników z przypominajkami i tokenami FCM.")
+    return report
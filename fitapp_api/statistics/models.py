@@ -1,6 +1,7 @@
 """Modele Statystyk dla FitApp API."""
 from pydantic import BaseModel, Field
-from datetime import datetime
+from sqlmodel import SQLModel, Field as SQLField
+from datetime import datetime, date
 from fitapp_api.trips.enums import TripActivity
 from typing import Optional
 
@@ -26,3 +27,18 @@ class StatisticsResponse(BaseModel):
 	total_calories_burned: float = Field(ge=0, description="Całkowita liczba spalonych kalorii")
 	activities: list[StatisticActivity] = Field(description="Lista aktywności")
 	most_liked_activity: Optional[TripActivity] = Field(description="Najbardziej lubiana aktywność")
+
+
+class DailyActivityRollup(SQLModel, table=True):
+	"""Dzienne sumy zakończonych tras użytkownika dla danej aktywności (wg dnia rozpoczęcia)."""
+	user_id: int = SQLField(primary_key=True)
+	day: date = SQLField(primary_key=True)
+	activity: TripActivity = SQLField(primary_key=True)
+	distance: float = SQLField(default=0.0)
+	duration: float = SQLField(default=0.0)
+	calories_burned: float = SQLField(default=0.0)
+	count: int = SQLField(default=0)
+
+
+class RollupRebuildResponse(BaseModel):
+	rows: int = Field(ge=0, description="Liczba odtworzonych wierszy dziennych sum")
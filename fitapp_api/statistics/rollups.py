@@ -0,0 +1,67 @@
+"""Dzienne sumy aktywności (user_id, dzień, aktywność) utrzymywane przy zapisie podsumowań tras."""
+from fitapp_api.postgres.db import pg_db
+from fitapp_api.statistics.models import DailyActivityRollup
+from fitapp_api.trips.models import Trip, TripSummary
+from sqlalchemy import Date, Integer, cast, delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+
+
+async def add_summary_to_daily_rollups(session: AsyncSession, user_id: int, summary: TripSummary) -> None:
+    """Dolicza zakończoną trasę do dziennych sum (w transakcji zapisu podsumowania, bez commita)."""
+    if summary.end_time is None:
+        return
+    statement = insert(DailyActivityRollup).values(
+        user_id=user_id,
+        day=summary.start_time.date(),
+        activity=summary.activity,
+        distance=summary.distance or 0.0,
+        duration=summary.duration or 0.0,
+        calories_burned=summary.calories_burned or 0.0,
+        count=1,
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[DailyActivityRollup.user_id, DailyActivityRollup.day, DailyActivityRollup.activity],
+        set_={
+            "distance": DailyActivityRollup.distance + statement.excluded.distance,
+            "duration": DailyActivityRollup.duration + statement.excluded.duration,
+            "calories_burned": DailyActivityRollup.calories_burned + statement.excluded.calories_burned,
+            "count": DailyActivityRollup.count + statement.excluded.count,
+        },
+    )
+    await session.execute(statement)
+
+async def rebuild_daily_rollups() -> int:
+    """Odtwarza wszystkie dzienne sumy z istniejących podsumowań tras."""
+    async for session in pg_db.get_session():
+        try:
+            await session.execute(delete(DailyActivityRollup))
+            aggregated = insert(DailyActivityRollup).from_select(
+                ["user_id", "day", "activity", "distance", "duration", "calories_burned", "count"],
+                select(
+                    Trip.user_id,
+                    cast(TripSummary.start_time, Date),
+                    TripSummary.activity,
+                    func.coalesce(func.sum(TripSummary.distance), 0.0),
+                    func.coalesce(func.sum(TripSummary.duration), 0.0),
+                    func.coalesce(func.sum(TripSummary.calories_burned), 0.0),
+                    cast(func.count(), Integer),
+                )
+                .select_from(TripSummary)
+                .join(Trip, Trip.id == TripSummary.trip_id)
+                .where(TripSummary.end_time.is_not(None))
+                .group_by(Trip.user_id, cast(TripSummary.start_time, Date), TripSummary.activity)
+            )
+            result = await session.execute(aggregated)
+            await session.commit()
+            return result.rowcount
+        except Exception:
+            await session.rollback()
+            raise
+
+
+if __name__ == "__main__":
+    # python -m fitapp_api.statistics.rollups
+    rows = asyncio.run(rebuild_daily_rollups())
+    print(f"Odtworzono {rows} wierszy dziennych sum aktywności.")
@@ -1,13 +1,15 @@
 from fitapp_api.postgres.db import pg_db
 from fastapi import APIRouter, Depends, HTTPException, status
-from fitapp_api.users.router import get_current_user
+from fitapp_api.users.router import get_current_user, get_current_admin_user
 from fitapp_api.users.models import User
-from fitapp_api.statistics.models import StatisticsRequest, StatisticsResponse, StatisticActivity
-from sqlalchemy.orm import selectinload
+from fitapp_api.statistics.models import StatisticsRequest, StatisticsResponse, StatisticActivity, DailyActivityRollup, RollupRebuildResponse
+from fitapp_api.statistics.rollups import rebuild_daily_rollups
 from fitapp_api.trips.models import Trip, TripSummary
 from sqlmodel import select
+from sqlalchemy import Integer, cast, func, or_, union_all
+from sqlalchemy.engine import Row
 from fitapp_api.trips.enums import TripActivity
-from datetime import datetime
+from datetime import datetime, timedelta
 
 statistics_router = APIRouter()
 
@@ -52,6 +54,99 @@ def generate_statistics_for_trips(trips: list[Trip]) -> StatisticsResponse:
         most_liked_activity=most_liked_activity.activity if most_liked_activity else None
     )
 
+def generate_statistics_from_activity_totals(user_id: int, rows: list[Row]) -> StatisticsResponse:
+    """Statystyki z wierszy zagregowanych w bazie: (activity, distance, time, calories_burned, count)."""
+    activity_order = list(TripActivity)
+    activities: list[StatisticActivity] = [
+        StatisticActivity(
+            activity=row.activity,
+            distance=row.distance or 0.0,
+            time=row.time or 0.0,
+            calories_burned=row.calories_burned or 0.0,
+            count=row.count
+        )
+        for row in sorted(rows, key=lambda row: activity_order.index(row.activity))
+        if row.count
+    ]
+    total_distance = sum(activity.distance for activity in activities)
+    total_time = sum(activity.time for activity in activities)
+    total_calories_burned = sum(activity.calories_burned for activity in activities)
+    average_speed = (total_distance / 1000)/ (total_time / 3600) if total_time > 0 else 0.0
+
+    most_liked_activity = max(activities, key=lambda x: x.count) if activities else None
+
+    return StatisticsResponse(
+        user_id=user_id,
+        average_speed=average_speed,
+        total_distance=total_distance,
+        total_time=total_time,
+        total_calories_burned=total_calories_burned,
+        activities=activities,
+        most_liked_activity=most_liked_activity.activity if most_liked_activity else None
+    )
+
+def select_activity_totals(user_id: int, start_time: datetime, end_time: datetime):
+    """Agregacja po stronie bazy - jeden wiersz na aktywność."""
+    return (
+        select(
+            TripSummary.activity,
+            func.sum(TripSummary.distance).label("distance"),
+            func.sum(TripSummary.duration).label("time"),
+            func.sum(TripSummary.calories_burned).label("calories_burned"),
+            func.count().label("count"),
+        )
+        .join(Trip, Trip.id == TripSummary.trip_id)
+        .where(
+            Trip.user_id == user_id,
+            TripSummary.start_time >= start_time,
+            TripSummary.end_time <= end_time
+        )
+        .group_by(TripSummary.activity)
+    )
+
+def select_activity_totals_with_rollups(user_id: int, start_time: datetime, end_time: datetime):
+    """Sumy per aktywność: pełne dni z dziennych sum, a niepełne dni brzegowe i ostatni pełny dzień z surowych podsumowań tras.
+
+    Dzienne sumy nie znają końca trasy - trasa z ostatniego pełnego dnia może kończyć się już po `end_time`, więc ten dzień
+    liczony jest z filtrem surowym. Wynik różni się od select_activity_totals tylko dla tras dłuższych niż doba.
+    """
+    first_full_day = start_time.date() if start_time.time() == datetime.min.time() else start_time.date() + timedelta(days=1)
+    end_rollup_days = end_time.date() - timedelta(days=1)
+    if first_full_day >= end_rollup_days:
+        return select_activity_totals(user_id=user_id, start_time=start_time, end_time=end_time)
+
+    first_full_day_start = datetime.combine(first_full_day, datetime.min.time())
+    end_rollup_days_start = datetime.combine(end_rollup_days, datetime.min.time())
+    edge_totals = select_activity_totals(user_id=user_id, start_time=start_time, end_time=end_time).where(
+        or_(TripSummary.start_time < first_full_day_start, TripSummary.start_time >= end_rollup_days_start)
+    )
+    rollup_totals = (
+        select(
+            DailyActivityRollup.activity,
+            func.sum(DailyActivityRollup.distance).label("distance"),
+            func.sum(DailyActivityRollup.duration).label("time"),
+            func.sum(DailyActivityRollup.calories_burned).label("calories_burned"),
+            cast(func.sum(DailyActivityRollup.count), Integer).label("count"),
+        )
+        .where(
+            DailyActivityRollup.user_id == user_id,
+            DailyActivityRollup.day >= first_full_day,
+            DailyActivityRollup.day < end_rollup_days,
+        )
+        .group_by(DailyActivityRollup.activity)
+    )
+    totals = union_all(edge_totals, rollup_totals).subquery()
+    return (
+        select(
+            totals.c.activity,
+            func.sum(totals.c.distance).label("distance"),
+            func.sum(totals.c.time).label("time"),
+            func.sum(totals.c.calories_burned).label("calories_burned"),
+            cast(func.sum(totals.c.count), Integer).label("count"),
+        )
+        .group_by(totals.c.activity)
+    )
+
 async def get_statistics_for_user_in_time_range(
     user_id: int,
     start_time: datetime,
@@ -62,32 +157,9 @@ async def get_statistics_for_user_in_time_range(
 
     async for session in pg_db.get_session():
         try:
-            statement = (
-                select(Trip)
-                .join(TripSummary, Trip.id == TripSummary.trip_id)
-                .where(
-                    Trip.user_id == user_id,
-                    TripSummary.start_time >= start_time_naive,
-                    TripSummary.end_time <= end_time_naive
-                )
-                .options(selectinload(Trip.summary))
-            )
-
+            statement = select_activity_totals_with_rollups(user_id=user_id, start_time=start_time_naive, end_time=end_time_naive)
             results = await session.execute(statement)
-            trips = results.scalars().all()
-
-            if not trips:
-                return StatisticsResponse(
-                    user_id=user_id,
-                    average_speed=0.0,
-                    total_distance=0.0,
-                    total_time=0,
-                    total_calories_burned=0.0,
-                    activities=[],
-                    most_liked_activity=None,
-                )
-
-            return generate_statistics_for_trips(trips=trips)
+            return generate_statistics_from_activity_totals(user_id=user_id, rows=results.all())
 
         except Exception as e:
              raise HTTPException(status_code=500, detail=f"Błąd podczas pobierania statystyk: {str(e)} dla użytkownika {user_id}")
@@ -95,6 +167,7 @@ async def get_statistics_for_user_in_time_range(
 # Endpointy
 @statistics_router.post("/statistics")
 async def get_statistics(request: StatisticsRequest, current_user: User = Depends(get_current_user)) -> StatisticsResponse | None:
+    """Statystyki tras rozpoczętych od `start_time` i zakończonych do `end_time` (trasa dłuższa niż doba może kończyć się po `end_time`)."""
     if request.user_id != current_user.id and not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Brak uprawnień do przeglądania statystyk tego użytkownika.")
 
@@ -102,4 +175,12 @@ async def get_statistics(request: StatisticsRequest, current_user: User = Depend
         user_id=request.user_id,
         start_time=request.start_time,
         end_time=request.end_time
-    )
\ No newline at end of file
+    )
+
+@statistics_router.post("/rollups/rebuild")
+async def rebuild_statistics_rollups(current_user: User = Depends(get_current_admin_user)) -> RollupRebuildResponse:
+    """Odtworzenie dziennych sum aktywności z istniejących podsumowań tras."""
+    try:
+        return RollupRebuildResponse(rows=await rebuild_daily_rollups())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Błąd podczas odtwarzania dziennych sum: {str(e)}")
@@ -0,0 +1,235 @@
+"""Przyrostowe podsumowania tras aktualizowane w trakcie zapisu punktów GPS."""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+import numpy as np
+import os
+from fitapp_api.gps.models import GPSPoint
+from fitapp_api.trips.enums import TripActivity
+from fitapp_api.trips.models import TripSummary, TripSplit
+from fitapp_api.trips.utils import (
+    GPSTrack,
+    TRIP_SPLIT_DISTANCES,
+    build_splits,
+    calculate_calories,
+    calculate_location_fields,
+    calculate_moving_time,
+    calculate_segment_metrics,
+    calculate_speed_fields,
+    find_split_boundaries,
+    to_datetime,
+    track_bounding_box,
+)
+from fitapp_api.gps.geohash import BoundingBox
+from fitapp_api.monitoring.metrics import TRIP_METRICS_DURATION
+
+load_dotenv()
+
+TRIP_ACCUMULATOR_MAX_SESSIONS = int(os.getenv("TRIP_ACCUMULATOR_MAX_SESSIONS", 10000))
+
+
+@dataclass
+class TripAccumulator:
+    """Stan bieżący trasy: pierwszy i ostatni punkt, obszar trasy, skumulowany dystans, czas, prędkości i granice odcinków."""
+    session_id: str
+    activity: TripActivity
+    start_time: datetime
+    last_time: datetime
+    start_latitude: float
+    start_longitude: float
+    last_latitude: float
+    last_longitude: float
+    bbox: BoundingBox
+    last_entry: bool = False
+    distance: float = 0.0
+    point_count: int = 0
+    moving_time: float = 0.0
+    max_speed: float = 0.0
+    # Długość odcinka -> (czas od startu, czas ruchu) w chwilach przekroczenia kolejnych granic
+    split_boundaries: dict[float, tuple[list[float], list[float]]] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return (self.last_time - self.start_time).total_seconds()
+
+    @classmethod
+    @TRIP_METRICS_DURATION.labels("rebuild").time()
+    def from_track(cls, session_id: str, track: GPSTrack) -> "TripAccumulator":
+        track = track.sorted_by_time()
+        distances, durations, speeds = calculate_segment_metrics(track.timestamps, track.latitudes, track.longitudes)
+        return cls(
+            session_id=session_id,
+            activity=track.activity,
+            start_time=to_datetime(track.timestamps[0]),
+            last_time=to_datetime(track.timestamps[-1]),
+            start_latitude=float(track.latitudes[0]),
+            start_longitude=float(track.longitudes[0]),
+            last_latitude=float(track.latitudes[-1]),
+            last_longitude=float(track.longitudes[-1]),
+            bbox=track_bounding_box(track.latitudes, track.longitudes),
+            last_entry=bool(track.last_entries[-1]),
+            distance=float(distances.sum()),
+            point_count=len(track.timestamps),
+            moving_time=calculate_moving_time(durations, speeds),
+            max_speed=float(speeds.max(initial=0.0)),
+            split_boundaries={
+                split_distance: find_split_boundaries(distances, durations, speeds, split_distance)
+                for split_distance in TRIP_SPLIT_DISTANCES
+            },
+        )
+
+    @TRIP_METRICS_DURATION.labels("incremental").time()
+    def update(self, track: GPSTrack) -> bool:
+        """Dołącza paczkę punktów; zwraca False, gdy paczka sięga wcześniej niż ostatni punkt (wymagana przebudowa)."""
+        track = track.sorted_by_time()
+        if to_datetime(track.timestamps[0]) < self.last_time:
+            return False
+        distances, durations, speeds = calculate_segment_metrics(
+            np.concatenate(([np.datetime64(self.last_time, "us")], track.timestamps)),
+            np.concatenate(([self.last_latitude], track.latitudes)),
+            np.concatenate(([self.last_longitude], track.longitudes)),
+        )
+        for split_distance, (boundary_elapsed, boundary_moving_time) in self.split_boundaries.items():
+            new_elapsed, new_moving_time = find_split_boundaries(
+                distances, durations, speeds, split_distance,
+                start_distance=self.distance, start_elapsed=self.duration, start_moving_time=self.moving_time,
+            )
+            boundary_elapsed.extend(new_elapsed)
+            boundary_moving_time.extend(new_moving_time)
+        self.distance += float(distances.sum())
+        self.moving_time += calculate_moving_time(durations, speeds)
+        self.max_speed = max(self.max_speed, float(speeds.max(initial=0.0)))
+        self.point_count += len(track.timestamps)
+        self.last_time = to_datetime(track.timestamps[-1])
+        self.last_latitude = float(track.latitudes[-1])
+        self.last_longitude = float(track.longitudes[-1])
+        self.last_entry = bool(track.last_entries[-1])
+        batch_bbox = track_bounding_box(track.latitudes, track.longitudes)
+        self.bbox = BoundingBox(
+            min_latitude=min(self.bbox.min_latitude, batch_bbox.min_latitude),
+            min_longitude=min(self.bbox.min_longitude, batch_bbox.min_longitude),
+            max_latitude=max(self.bbox.max_latitude, batch_bbox.max_latitude),
+            max_longitude=max(self.bbox.max_longitude, batch_bbox.max_longitude),
+        )
+        return True
+
+    def to_summary(self, trip_id: int, weight: float = 50.0) -> Tuple[TripSummary, bool]:
+        """Podsumowanie trasy w czasie O(1)."""
+        if self.point_count < 2:
+            return TripSummary(
+                trip_id=trip_id,
+                session_id=self.session_id,
+                start_time=self.start_time,
+                end_time=None,
+                duration=None,
+                distance=None,
+                calories_burned=None
+            ), False
+
+        return (TripSummary(
+                trip_id=trip_id,
+                session_id=self.session_id,
+                start_time=self.start_time,
+                end_time=self.last_time if self.last_entry else None,
+                duration=self.duration,
+                distance=self.distance,
+                calories_burned=calculate_calories(distance=self.distance, activity=self.activity, weight=weight),
+                activity=self.activity,
+                **self.location_fields(),
+                **calculate_speed_fields(distance=self.distance, moving_time=self.moving_time, max_speed=self.max_speed),
+                splits=[
+                    split
+                    for split_distance in self.split_boundaries
+                    for split in self.to_splits(trip_id=trip_id, split_distance=split_distance)
+                ] if self.last_entry else [],
+            ), self.last_entry)
+
+    def location_fields(self) -> dict:
+        return calculate_location_fields(
+            start=(self.start_latitude, self.start_longitude),
+            end=(self.last_latitude, self.last_longitude),
+            bbox=self.bbox,
+        )
+
+    def to_splits(self, trip_id: int, split_distance: float) -> list[TripSplit]:
+        """Odcinki trasy dla jednej z długości TRIP_SPLIT_DISTANCES - bez ponownego odczytu punktów."""
+        return build_splits(
+            trip_id=trip_id,
+            split_distance=split_distance,
+            boundaries=self.split_boundaries[split_distance],
+            distance=self.distance,
+            elapsed=self.duration,
+            moving_time=self.moving_time,
+        )
+
+
+def calculate_trip_metrics(trip_id: int, session_id: str, points: list[GPSPoint], weight: float = 50.0) -> Tuple[TripSummary, bool]:
+    """Podsumowanie trasy z kompletu punktów GPS - ten sam akumulator, który aktualizuje zapis punktów."""
+    if not points:
+        return TripSummary(trip_id=trip_id, session_id=session_id, start_time=None, end_time=None, duration=None, distance=None, calories_burned=None), False
+    return TripAccumulator.from_track(session_id=session_id, track=GPSTrack.from_points(points)).to_summary(trip_id=trip_id, weight=weight)
+
+
+class TripAccumulatorStore:
+    """Ograniczony (LRU) magazyn akumulatorów tras w pamięci procesu, kluczowany session_id."""
+
+    def __init__(self, max_sessions: int = TRIP_ACCUMULATOR_MAX_SESSIONS) -> None:
+        self.max_sessions = max_sessions
+        self._accumulators: OrderedDict[str, TripAccumulator] = OrderedDict()
+        # Sesje w trakcie przebudowy -> czy w międzyczasie dotarły nowe punkty
+        self._rebuilding: dict[str, bool] = {}
+        # Sesje, których paczka została pominięta z braku akumulatora - akumulator z samej paczki tworzącej trasę
+        # (przetworzonej później) byłby niepełny, więc nie trafia do pamięci, a odczyt odbuduje go z QuestDB
+        self._skipped: OrderedDict[str, None] = OrderedDict()
+
+    def get(self, session_id: str) -> Optional[TripAccumulator]:
+        accumulator = self._accumulators.get(session_id)
+        if accumulator is not None:
+            self._accumulators.move_to_end(session_id)
+        return accumulator
+
+    def put(self, accumulator: TripAccumulator) -> None:
+        self._accumulators[accumulator.session_id] = accumulator
+        self._accumulators.move_to_end(accumulator.session_id)
+        while len(self._accumulators) > self.max_sessions:
+            self._accumulators.popitem(last=False)
+
+    def discard(self, session_id: str) -> None:
+        self._accumulators.pop(session_id, None)
+
+    def add_points(self, session_id: str, track: GPSTrack, new_session: bool) -> None:
+        """Aktualizacja przy zapisie punktów. Brakujący akumulator istniejącej trasy zostanie odbudowany przy odczycie."""
+        if session_id in self._rebuilding:
+            self._rebuilding[session_id] = True
+        accumulator = self.get(session_id)
+        if accumulator is None:
+            if not new_session:
+                self._skipped[session_id] = None
+                self._skipped.move_to_end(session_id)
+                while len(self._skipped) > self.max_sessions:
+                    self._skipped.popitem(last=False)
+            elif session_id in self._skipped:
+                del self._skipped[session_id]
+            else:
+                self.put(TripAccumulator.from_track(session_id=session_id, track=track))
+            return
+        if not accumulator.update(track):
+            self.discard(session_id)
+
+    def begin_rebuild(self, session_id: str) -> None:
+        # Punkty pominiętych paczek są już w QuestDB - odbudowa je uwzględni
+        self._skipped.pop(session_id, None)
+        self._rebuilding[session_id] = False
+
+    def cancel_rebuild(self, session_id: str) -> None:
+        self._rebuilding.pop(session_id, None)
+
+    def finish_rebuild(self, accumulator: TripAccumulator) -> None:
+        """Zapisuje odbudowany akumulator, o ile w trakcie odczytu nie dotarły nowe punkty tej sesji."""
+        if not self._rebuilding.pop(accumulator.session_id, True):
+            self.put(accumulator)
+
+
+trip_accumulators = TripAccumulatorStore()
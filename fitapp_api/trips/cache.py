@@ -0,0 +1,117 @@
+"""Pamięci podręczne tras: zserializowane odpowiedzi zakończonych tras (budżet bajtów, LRU, silne ETagi)
+oraz session_id tras zarejestrowanych w bazie (zapis punktów GPS bez zapytań do PostgreSQL)."""
+from collections import OrderedDict
+from fastapi import Response
+from typing import Hashable, Iterable, NamedTuple, Optional
+from dotenv import load_dotenv
+import hashlib
+import os
+
+load_dotenv()
+
+TRIP_RESPONSE_CACHE_MAX_BYTES = int(os.getenv("TRIP_RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Odpowiedź zależy od użytkownika i nagłówka Accept - przeglądarka musi ją za każdym razem rewalidować
+TRIP_RESPONSE_HEADERS = {"Vary": "Accept", "Cache-Control": "private, no-cache"}
+KNOWN_TRIP_SESSIONS_MAX_SIZE = int(os.getenv("KNOWN_TRIP_SESSIONS_MAX_SIZE", 100000))
+
+
+class CachedTripResponse(NamedTuple):
+    user_id: int
+    body: bytes
+    media_type: str
+    etag: str
+
+    @classmethod
+    def from_body(cls, user_id: int, body: bytes, media_type: str) -> "CachedTripResponse":
+        return cls(user_id=user_id, body=body, media_type=media_type, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+    def to_response(self, if_none_match: Optional[str] = None) -> Response:
+        headers = {"ETag": self.etag, **TRIP_RESPONSE_HEADERS}
+        if etag_matches(if_none_match, self.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type=self.media_type, headers=headers)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Porównanie If-None-Match z ETagiem (słabe porównanie zgodnie z RFC 9110)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class TripResponseCache:
+    """LRU odpowiedzi tras ograniczony łącznym rozmiarem treści; klucz zaczyna się od session_id."""
+
+    def __init__(self, max_bytes: int = TRIP_RESPONSE_CACHE_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries: OrderedDict[tuple, CachedTripResponse] = OrderedDict()
+        self._keys_by_session_id: dict[str, set[tuple]] = {}
+
+    def get(self, key: tuple[Hashable, ...]) -> Optional[CachedTripResponse]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: tuple[Hashable, ...], entry: CachedTripResponse) -> None:
+        if len(entry.body) > self.max_bytes:
+            return
+        self._remove(key)
+        self._entries[key] = entry
+        self._keys_by_session_id.setdefault(key[0], set()).add(key)
+        self.size_bytes += len(entry.body)
+        while self.size_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, session_id: str) -> None:
+        for key in self._keys_by_session_id.pop(session_id, set()):
+            self._remove(key)
+
+    def _remove(self, key: tuple[Hashable, ...]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.size_bytes -= len(entry.body)
+        keys = self._keys_by_session_id.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_session_id[key[0]]
+
+
+trip_responses = TripResponseCache()
+
+
+class KnownTripSessions:
+    """Ostatnio widziane session_id tras istniejących w bazie (LRU ograniczony liczbą wpisów)."""
+
+    def __init__(self, max_size: int = KNOWN_TRIP_SESSIONS_MAX_SIZE) -> None:
+        self.max_size = max_size
+        self._session_ids: OrderedDict[str, None] = OrderedDict()
+
+    def __contains__(self, session_id: str) -> bool:
+        if session_id not in self._session_ids:
+            return False
+        self._session_ids.move_to_end(session_id)
+        return True
+
+    def __len__(self) -> int:
+        return len(self._session_ids)
+
+    def add(self, session_ids: Iterable[str]) -> None:
+        if self.max_size <= 0:
+            return
+        for session_id in session_ids:
+            self._session_ids[session_id] = None
+            self._session_ids.move_to_end(session_id)
+        while len(self._session_ids) > self.max_size:
+            self._session_ids.popitem(last=False)
+
+    def discard(self, session_id: str) -> None:
+        self._session_ids.pop(session_id, None)
+
+
+known_trip_sessions = KnownTripSessions()
@@ -0,0 +1,65 @@
+"""Uzupełnianie pól lokalizacji (geohash, prostokąt trasy) podsumowań zapisanych przed ich wprowadzeniem."""
+from fastapi import HTTPException
+from fitapp_api.misc import get_gps_points_by_trip_id
+from fitapp_api.postgres.db import pg_db
+from fitapp_api.trips.accumulators import TripAccumulator
+from fitapp_api.trips.cache import trip_responses
+from fitapp_api.trips.models import TripSummary
+from fitapp_api.trips.utils import GPSTrack
+from sqlalchemy import select, update
+from dotenv import load_dotenv
+import asyncio
+import os
+
+load_dotenv()
+
+TRIP_LOCATIONS_BACKFILL_BATCH = int(os.getenv("TRIP_LOCATIONS_BACKFILL_BATCH", 100))
+TRIP_LOCATIONS_BACKFILL_CONCURRENCY = int(os.getenv("TRIP_LOCATIONS_BACKFILL_CONCURRENCY", 8))
+
+
+async def calculate_trip_location_fields(session_id: str, semaphore: asyncio.Semaphore) -> dict | None:
+    """Pola lokalizacji z punktów sesji w QuestDB; None, gdy sesja nie ma punktów."""
+    async with semaphore:
+        try:
+            points = await get_gps_points_by_trip_id(session_id)
+        except HTTPException:
+            return None
+    return TripAccumulator.from_track(session_id=session_id, track=GPSTrack.from_points(points)).location_fields()
+
+async def backfill_trip_locations(batch_size: int = TRIP_LOCATIONS_BACKFILL_BATCH) -> int:
+    """Uzupełnia geohash i prostokąt zakończonych tras bez pól lokalizacji; zwraca liczbę uzupełnionych podsumowań."""
+    semaphore = asyncio.Semaphore(TRIP_LOCATIONS_BACKFILL_CONCURRENCY)
+    updated = 0
+    last_trip_id = 0
+    async for session in pg_db.get_session():
+        try:
+            while True:
+                result = await session.execute(
+                    select(TripSummary.trip_id, TripSummary.session_id)
+                    .where(TripSummary.end_time.is_not(None), TripSummary.start_geohash.is_(None), TripSummary.trip_id > last_trip_id)
+                    .order_by(TripSummary.trip_id)
+                    .limit(batch_size)
+                )
+                rows = result.all()
+                if not rows:
+                    break
+                fields = await asyncio.gather(*(calculate_trip_location_fields(session_id, semaphore) for _, session_id in rows))
+                for (trip_id, session_id), location in zip(rows, fields):
+                    # Sesje bez punktów pozostają bez lokalizacji (nie trafią do /trips_nearby/)
+                    if location is None:
+                        continue
+                    await session.execute(update(TripSummary).where(TripSummary.trip_id == trip_id).values(**location))
+                    trip_responses.invalidate(session_id)
+                    updated += 1
+                await session.commit()
+                last_trip_id = rows[-1][0]
+        except Exception:
+            await session.rollback()
+            raise
+    return updated
+
+
+if __name__ == "__main__":
+    # python -m fitapp_api.trips.locations
+    rows = asyncio.run(backfill_trip_locations())
+    print(f"Uzupełniono lokalizację {rows} podsumowań tras.")
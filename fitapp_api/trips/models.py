@@ -1,7 +1,8 @@
 """Modele Tripów dla FitApp."""
-from fitapp_api.gps.models import GPSPoint
+from fitapp_api.gps.models import GPSPoint, ColumnarGPSPoints, PolylineGPSPoints
 from sqlmodel import SQLModel, Field, Relationship
 from pydantic import BaseModel
+from sqlalchemy import Index
 from typing import Optional
 from datetime import datetime
 from fitapp_api.trips.enums import TripActivity
@@ -15,14 +16,43 @@ class TripSummary(SQLModel, table=True):
     distance: Optional[float] = None
     calories_burned: Optional[float] = None
     activity: TripActivity = TripActivity.RUNNING
+    start_geohash: Optional[str] = None
+    end_geohash: Optional[str] = None
+    min_latitude: Optional[float] = None
+    min_longitude: Optional[float] = None
+    max_latitude: Optional[float] = None
+    max_longitude: Optional[float] = None
+    max_speed: Optional[float] = None
+    average_speed: Optional[float] = None
+    moving_time: Optional[float] = None
     trip: "Trip" = Relationship(back_populates="summary")
+    splits: list["TripSplit"] = Relationship(back_populates="summary")
+
+class TripSplit(SQLModel, table=True):
+    """Odcinek trasy o długości `split_distance` metrów (ostatni może być krótszy)."""
+    trip_id: int = Field(foreign_key="tripsummary.trip_id", primary_key=True)
+    split_distance: float = Field(primary_key=True)
+    index: int = Field(primary_key=True)
+    distance: float
+    duration: float
+    moving_time: float
+    average_speed: Optional[float] = None
+    pace: Optional[float] = Field(default=None, description="Tempo w sekundach na kilometr (czas ruchu)")
+    summary: TripSummary = Relationship(back_populates="splits")
 
 class Trip(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    session_id: str
+    session_id: str = Field(index=True, unique=True)
     user_id: int
+    started_at: Optional[datetime] = None
     summary: TripSummary = Relationship(back_populates="trip")
 
+# Listowanie tras użytkownika od najnowszych (paginacja keyset po (started_at, id))
+Index("ix_trip_user_id_started_at", Trip.user_id, Trip.started_at.desc().nulls_last(), Trip.id.desc())
+# Wyszukiwanie tras po prefiksie geohasha początku/końca (zakres w porządku "C", niezależnie od kolacji bazy)
+Index("ix_tripsummary_start_geohash", TripSummary.start_geohash.collate("C"))
+Index("ix_tripsummary_end_geohash", TripSummary.end_geohash.collate("C"))
+
 class TripResponse(BaseModel):
     session_id: str
     summary: TripSummary
@@ -35,3 +65,13 @@ class TripResponse(BaseModel):
             summary=trip.summary,
             points=points,
         )
+
+
+class TripCompactResponse(BaseModel):
+    session_id: str
+    summary: TripSummary
+    points: ColumnarGPSPoints | PolylineGPSPoints
+
+
+class TripLocationBackfillResponse(BaseModel):
+    rows: int = Field(ge=0, description="Liczba podsumowań z uzupełnioną lokalizacją")
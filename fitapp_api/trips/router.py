@@ -1,62 +1,300 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from fitapp_api.trips.models import Trip, TripResponse
-from fitapp_api.trips.utils import calculate_trip_metrics
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Query, Response
+from fitapp_api.trips.models import Trip, TripSummary, TripSplit, TripResponse, TripCompactResponse, TripLocationBackfillResponse
 from fitapp_api.trips.enums import TripActivity
 from fitapp_api.postgres.db import pg_db
 from fitapp_api.gps.db import gps_db
-from fitapp_api.users.router import get_current_user
+from fitapp_api.users.router import get_current_user, get_current_admin_user
 from fitapp_api.users.models import User
-from fitapp_api.gps.router import get_session_ids_by_user_id
+from fitapp_api.trips.utils import select_trip_session_ids, select_trip_summaries_in_area, calculate_splits, GPSTrack, TRIP_SPLIT_DISTANCES
+from fitapp_api.gps.geohash import BoundingBox
 from sqlmodel import select
-from sqlalchemy.orm import selectinload
-from fitapp_api.misc import get_gps_points_by_trip_id
+from sqlalchemy.orm import selectinload, joinedload
+from fitapp_api.misc import get_gps_points_by_trip_id, get_trip_accumulator
+from fitapp_api.trips.accumulators import TripAccumulator, trip_accumulators
+from fitapp_api.statistics.rollups import add_summary_to_daily_rollups
+from fitapp_api.gps.models import GPSPoint, PointsFormat, ResolutionMode, RESOLUTION_PATTERN
+from fitapp_api.gps.encoding import resolve_points_format, encode_points, encode_trip_json, MEDIA_TYPES
+from fitapp_api.trips.cache import CachedTripResponse, trip_responses
+from fitapp_api.trips.locations import backfill_trip_locations
+from fitapp_api.gps.simplify import simplify_points, simplified_tracks
+from typing import Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from dotenv import load_dotenv
+import asyncio
+import os
+
+load_dotenv()
+
+TRIP_SUMMARIES_MAX_BATCH = int(os.getenv("TRIP_SUMMARIES_MAX_BATCH", 100))
+TRIP_SUMMARIES_CONCURRENCY = int(os.getenv("TRIP_SUMMARIES_CONCURRENCY", 8))
+TRIPS_NEARBY_MAX_RADIUS = float(os.getenv("TRIPS_NEARBY_MAX_RADIUS", 50000))
 
 
 trip_router = APIRouter()
 
 # Endpointy
 @trip_router.get("/trips_list/")
-async def get_trips_by_user_id(current_user: User = Depends(get_current_user)) -> list[str]:
-    trips_ids: list[str] = await get_session_ids_by_user_id(current_user.id)
-    sorted_trips_ids: list[str] = sorted(trips_ids, key=lambda x: int(x.split('_')[0]), reverse=True)
-    return sorted_trips_ids
+async def get_trips_by_user_id(
+    response: Response,
+    limit: Optional[int] = Query(default=None, ge=1, le=1000, description="Liczba tras na stronie (domyślnie wszystkie)"),
+    cursor: Optional[str] = Query(default=None, description="Kursor z nagłówka X-Next-Cursor poprzedniej strony"),
+    current_user: User = Depends(get_current_user),
+) -> list[str]:
+    """Identyfikatory sesji użytkownika od najnowszej; kolejna strona wskazywana nagłówkiem X-Next-Cursor."""
+    try:
+        trips_ids, next_cursor = await select_trip_session_ids(user_id=current_user.id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return trips_ids
 
 @trip_router.get("/activity_types")
 async def get_activity_types(current_user: User = Depends(get_current_user)) -> dict[str, int]:
     return {activity.name: activity.value for activity in TripActivity}
 
-@trip_router.get("/trips/{session_id}")
-async def get_trip_summary(session_id: str, current_user: User = Depends(get_current_user)) -> TripResponse:
+async def get_trip_for_user(session: AsyncSession, session_id: str, current_user: User) -> Trip:
+    """Pobranie trasy wraz z podsumowaniem i sprawdzenie uprawnień użytkownika."""
+    statement = select(Trip).options(selectinload(Trip.summary)).where(Trip.session_id == session_id)
+    result = await session.execute(statement)
+    trip = result.scalars().first()
+
+    # Sprawdzanie, czy podróż/trasa istnieje
+    if not trip:
+        raise HTTPException(status_code=404, detail="Nie znaleziono podróży!")
+
+    # Sprawdzanie uprawnień
+    if trip.user_id != current_user.id and not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Brak autoryzacji do przeglądania tej podróży!")
+
+    return trip
+
+def attach_accumulated_summary(trip: Trip, accumulator: TripAccumulator, current_user: User) -> Tuple[TripSummary, bool]:
+    """Podsumowanie trasy z akumulatora; do trasy (a więc do sesji) dołączane tylko podsumowanie zakończonej trasy.
+
+    Podsumowanie trasy w toku zwracane jako obiekt spoza sesji - commit innych tras nie zapisze go z end_time=None.
+    """
+    trip_summary, add_to_db = accumulator.to_summary(trip_id=trip.id, weight=current_user.details.weight if current_user.details else None)
+    if add_to_db:
+        trip.summary = trip_summary
+        if trip.started_at is None:
+            trip.started_at = trip_summary.start_time
+    return trip_summary, add_to_db
+
+async def ensure_trip_summary(session: AsyncSession, trip: Trip, current_user: User, points: list[GPSPoint] | None = None) -> TripSummary:
+    """Podsumowanie trasy - zapisane w bazie lub z akumulatora (O(1)); podsumowanie zakończonej trasy zapisuje w bazie."""
+    if trip.summary:
+        return trip.summary
+
+    accumulator = await get_trip_accumulator(session_id=trip.session_id, points=points)
+    trip_summary, add_to_db = attach_accumulated_summary(trip=trip, accumulator=accumulator, current_user=current_user)
+    if add_to_db:
+        await save_finished_trips(session=session, trips=[trip])
+        return trip.summary
+    return trip_summary
+
+async def ensure_trip_summaries(session: AsyncSession, trips: list[Trip], current_user: User) -> dict[str, TripSummary]:
+    """Podsumowania wielu tras (session_id -> podsumowanie) - akumulatory odbudowywane współbieżnie, zapis zakończonych jednym commitem."""
+    semaphore = asyncio.Semaphore(TRIP_SUMMARIES_CONCURRENCY)
+
+    async def load_accumulator(trip: Trip) -> TripAccumulator:
+        async with semaphore:
+            return await get_trip_accumulator(session_id=trip.session_id)
+
+    summaries = {trip.session_id: trip.summary for trip in trips if trip.summary}
+    missing = [trip for trip in trips if not trip.summary]
+    accumulators = await asyncio.gather(*(load_accumulator(trip) for trip in missing), return_exceptions=True)
+
+    finished: list[Trip] = []
+    for trip, accumulator in zip(missing, accumulators):
+        if isinstance(accumulator, HTTPException) and accumulator.status_code == 404:
+            # Trasa bez punktów GPS - brak danych do podsumowania
+            continue
+        if isinstance(accumulator, BaseException):
+            raise accumulator
+        trip_summary, add_to_db = attach_accumulated_summary(trip=trip, accumulator=accumulator, current_user=current_user)
+        summaries[trip.session_id] = trip_summary
+        if add_to_db:
+            finished.append(trip)
+    if finished:
+        await save_finished_trips(session=session, trips=finished)
+        summaries.update({trip.session_id: trip.summary for trip in finished})
+    return summaries
+
+async def save_finished_trips(session: AsyncSession, trips: list[Trip]) -> None:
+    try:
+        for trip in trips:
+            session.add(trip)
+            await add_summary_to_daily_rollups(session=session, user_id=trip.user_id, summary=trip.summary)
+        await session.commit()
+        for trip in trips:
+            await session.refresh(trip, attribute_names=["summary"])
+    except Exception as e:
+        await session.rollback()
+        raise HTTPException(status_code=500, detail=f"Błąd zapisu do bazy danych: {str(e)}")
+    for trip in trips:
+        trip_accumulators.discard(trip.session_id)
+
+async def finalize_trip_summary(session_id: str, current_user: User) -> Trip:
+    """Zamknięcie trasy po otrzymaniu punktu `last_entry` - bez ponownego odczytu punktów GPS."""
     async for session in pg_db.get_session():
-        statement = select(Trip).options(selectinload(Trip.summary)).where(Trip.session_id == session_id)
-        result = await session.execute(statement)
-        trip = result.scalars().first()
+        trip = await get_trip_for_user(session=session, session_id=session_id, current_user=current_user)
+        await ensure_trip_summary(session=session, trip=trip, current_user=current_user)
+        return trip
+
+@trip_router.get("/trips_summaries/")
+async def get_trip_summaries(
+    response: Response,
+    session_ids: Optional[list[str]] = Query(default=None, description="Identyfikatory sesji (kolejność zachowana w odpowiedzi)"),
+    limit: int = Query(default=20, ge=1, le=TRIP_SUMMARIES_MAX_BATCH, description="Liczba tras na stronie, gdy nie podano session_ids"),
+    cursor: Optional[str] = Query(default=None, description="Kursor z nagłówka X-Next-Cursor poprzedniej strony"),
+    current_user: User = Depends(get_current_user),
+) -> list[TripSummary]:
+    """Podsumowania wielu tras (bez punktów GPS) - wskazanych session_ids lub kolejnej strony listy tras użytkownika."""
+    if session_ids is None:
+        try:
+            session_ids, next_cursor = await select_trip_session_ids(user_id=current_user.id, limit=limit, cursor=cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+    elif len(session_ids) > TRIP_SUMMARIES_MAX_BATCH:
+        raise HTTPException(status_code=422, detail=f"Maksymalnie {TRIP_SUMMARIES_MAX_BATCH} tras w jednym zapytaniu!")
+    if not session_ids:
+        return []
 
-        # Sprawdzanie, czy podróż/trasa istnieje
-        if not trip:
-            raise HTTPException(status_code=404, detail="Nie znaleziono podróży!")
+    async for session in pg_db.get_session():
+        statement = select(Trip).options(joinedload(Trip.summary)).where(Trip.session_id.in_(session_ids))
+        result = await session.execute(statement)
+        trips_by_session_id = {trip.session_id: trip for trip in result.scalars()}
 
-        # Sprawdzanie uprawnień
-        if trip.user_id != current_user.id and not current_user.isAdmin:
+        missing_session_ids = [session_id for session_id in session_ids if session_id not in trips_by_session_id]
+        if missing_session_ids:
+            raise HTTPException(status_code=404, detail=f"Nie znaleziono podróży: {', '.join(missing_session_ids)}")
+        if not current_user.is_admin and any(trip.user_id != current_user.id for trip in trips_by_session_id.values()):
             raise HTTPException(status_code=403, detail="Brak autoryzacji do przeglądania tej podróży!")
 
-        # Pobieranie punktów GPS
-        points = await get_gps_points_by_trip_id(session_id=session_id)
+        trips = [trips_by_session_id[session_id] for session_id in dict.fromkeys(session_ids)]
+        summaries = await ensure_trip_summaries(session=session, trips=trips, current_user=current_user)
+        return [summaries[trip.session_id] for trip in trips if trip.session_id in summaries]
+
+@trip_router.get("/trips_nearby/")
+async def get_trips_nearby(
+    latitude: Optional[float] = Query(default=None, ge=-90, le=90, description="Środek obszaru wyszukiwania"),
+    longitude: Optional[float] = Query(default=None, ge=-180, le=180, description="Środek obszaru wyszukiwania"),
+    radius: Optional[float] = Query(default=None, gt=0, le=TRIPS_NEARBY_MAX_RADIUS, description="Promień w metrach"),
+    min_latitude: Optional[float] = Query(default=None, ge=-90, le=90),
+    min_longitude: Optional[float] = Query(default=None, ge=-180, le=180),
+    max_latitude: Optional[float] = Query(default=None, ge=-90, le=90),
+    max_longitude: Optional[float] = Query(default=None, ge=-180, le=180),
+    limit: int = Query(default=20, ge=1, le=TRIP_SUMMARIES_MAX_BATCH, description="Maksymalna liczba tras"),
+    current_user: User = Depends(get_current_user),
+) -> list[TripSummary]:
+    """Zakończone trasy użytkownika zaczynające lub kończące się w okręgu (latitude, longitude, radius) lub prostokącie (min_*, max_*)."""
+    circle = (latitude, longitude, radius)
+    rectangle = (min_latitude, min_longitude, max_latitude, max_longitude)
+    if all(value is not None for value in circle) and all(value is None for value in rectangle):
+        return await select_trip_summaries_in_area(
+            user_id=current_user.id,
+            bbox=BoundingBox.around(latitude=latitude, longitude=longitude, radius=radius),
+            limit=limit,
+            center=(latitude, longitude),
+            radius=radius,
+        )
+    if all(value is not None for value in rectangle) and all(value is None for value in circle):
+        if min_latitude > max_latitude or min_longitude > max_longitude:
+            raise HTTPException(status_code=422, detail="Minimalne współrzędne obszaru nie mogą być większe od maksymalnych!")
+        return await select_trip_summaries_in_area(user_id=current_user.id, bbox=BoundingBox(*rectangle), limit=limit)
+    raise HTTPException(status_code=422, detail="Podaj latitude, longitude i radius albo min_latitude, min_longitude, max_latitude i max_longitude!")
+
+@trip_router.post("/trips_nearby/backfill")
+async def backfill_trips_nearby(current_user: User = Depends(get_current_admin_user)) -> TripLocationBackfillResponse:
+    """Uzupełnienie lokalizacji podsumowań zapisanych przed jej wprowadzeniem - bez niej trasy nie trafiają do /trips_nearby/."""
+    try:
+        return TripLocationBackfillResponse(rows=await backfill_trip_locations())
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Błąd podczas uzupełniania lokalizacji tras: {str(e)}")
+
+@trip_router.get("/trips/{session_id}/splits")
+async def get_trip_splits(
+    session_id: str,
+    split_distance: float = Query(default=1000.0, ge=100, le=100000, description="Długość odcinka w metrach"),
+    current_user: User = Depends(get_current_user),
+) -> list[TripSplit]:
+    """Odcinki trasy (czas, czas ruchu, tempo) bez punktów GPS - zapisane przy zakończeniu trasy lub z akumulatora."""
+    async for session in pg_db.get_session():
+        trip = await get_trip_for_user(session=session, session_id=session_id, current_user=current_user)
+        if trip.summary and trip.summary.end_time and split_distance in TRIP_SPLIT_DISTANCES:
+            statement = (
+                select(TripSplit)
+                .where(TripSplit.trip_id == trip.id, TripSplit.split_distance == split_distance)
+                .order_by(TripSplit.index)
+            )
+            splits = (await session.execute(statement)).scalars().all()
+            if splits:
+                return splits
+
+    # Trasa w toku - odcinki z akumulatora; inna długość lub trasa sprzed zapisu odcinków - z punktów GPS
+    if not (trip.summary and trip.summary.end_time) and split_distance in TRIP_SPLIT_DISTANCES:
+        accumulator = await get_trip_accumulator(session_id=session_id)
+        return accumulator.to_splits(trip_id=trip.id, split_distance=split_distance)
+    points = await get_gps_points_by_trip_id(session_id=session_id)
+    return calculate_splits(trip_id=trip.id, track=GPSTrack.from_points(points), split_distance=split_distance)
+
+@trip_router.get("/trips/{session_id}")
+async def get_trip_summary(
+    session_id: str,
+    format: Optional[PointsFormat] = None,
+    tolerance: Optional[float] = Query(default=None, gt=0, description="Tolerancja uproszczenia przebiegu w metrach"),
+    max_points: Optional[int] = Query(default=None, ge=2, description="Maksymalna liczba zwracanych punktów"),
+    resolution: Optional[str] = Query(default=None, pattern=RESOLUTION_PATTERN, description="Przedział próbkowania punktów, np. 10s, 1m"),
+    resolution_mode: ResolutionMode = Query(default=ResolutionMode.AVG, description="Współrzędne uśrednione lub ostatnie w przedziale"),
+    accept: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+    current_user: User = Depends(get_current_user),
+) -> TripResponse:
+    simplify = tolerance is not None or max_points is not None
+    sampling = f"{resolution}:{resolution_mode.value}" if resolution else None
+    points_format = resolve_points_format(format=format, accept=accept)
+
+    # Odpowiedź zakończonej trasy jest niezmienna - bez zapytań do Postgresa i QuestDB
+    cache_key = (session_id, points_format, tolerance, max_points, sampling)
+    cached_response = trip_responses.get(cache_key)
+    if cached_response is not None and (cached_response.user_id == current_user.id or current_user.is_admin):
+        return cached_response.to_response(if_none_match=if_none_match)
+
+    async for session in pg_db.get_session():
+        trip = await get_trip_for_user(session=session, session_id=session_id, current_user=current_user)
+
+        points = None
+        trip_summary = trip.summary
+        if (simplify or sampling) and trip_summary and trip_summary.end_time:
+            points = simplified_tracks.get(session_id, tolerance, max_points, sampling)
+
+        if points is None:
+            # Pobieranie punktów GPS (próbkowanych w QuestDB, gdy podano resolution)
+            points = await get_gps_points_by_trip_id(session_id=session_id, resolution=resolution, resolution_mode=resolution_mode)
 
-        # Sprawdzanie czy istnieje podsumowanie
-        if not trip.summary:
-            trip_summary, add_to_db = calculate_trip_metrics(trip_id=trip.id, session_id=session_id, points=points, weight=current_user.details.weight)
+            # Sprawdzanie czy istnieje podsumowanie (metryki zawsze z pełnej rozdzielczości)
+            trip_summary = await ensure_trip_summary(session=session, trip=trip, current_user=current_user, points=None if sampling else points)
 
-            trip.summary = trip_summary
+            if simplify:
+                points = simplify_points(points, tolerance=tolerance, max_points=max_points)
+            if (simplify or sampling) and trip_summary.end_time:
+                simplified_tracks.put(session_id, tolerance, max_points, points, sampling)
 
-            if add_to_db:
-                try:
-                    session.add(trip)
-                    await session.commit()
-                    await session.refresh(trip, attribute_names=["summary"])
-                except Exception as e:
-                    await session.rollback()
-                    raise HTTPException(status_code=500, detail=f"Błąd zapisu do bazy danych: {str(e)}")
+        if points_format != PointsFormat.JSON:
+            body = TripCompactResponse(
+                session_id=trip.session_id,
+                summary=trip_summary,
+                points=encode_points(points_format, session_id=session_id, user_id=trip.user_id, points=points),
+            ).model_dump_json().encode()
+        else:
+            body = encode_trip_json(session_id=trip.session_id, summary=trip_summary, points=points)
+        media_type = MEDIA_TYPES.get(points_format, "application/json")
 
-        return TripResponse.from_trip(trip=trip,
-                                      points=points)
+        if trip_summary.end_time:
+            cached_response = CachedTripResponse.from_body(user_id=trip.user_id, body=body, media_type=media_type)
+            trip_responses.put(cache_key, cached_response)
+            return cached_response.to_response(if_none_match=if_none_match)
+        return Response(content=body, media_type=media_type, headers={"Vary": "Accept"})
@@ -1,88 +1,277 @@
 from fitapp_api.gps.models import GPSPoint
+from fitapp_api.gps import geohash
 from fitapp_api.postgres.db import pg_db
-from fitapp_api.trips.models import TripSummary, Trip
+from fitapp_api.trips.models import TripSummary, TripSplit, Trip
 from fitapp_api.trips.enums import TripActivity, BurnedCaloriesRatio
-from typing import Tuple
-from haversine import haversine, Unit
+from typing import NamedTuple, Optional, Tuple
+from datetime import datetime, timedelta
+from haversine import haversine, haversine_vector, Unit
+from sqlmodel import select
+from sqlalchemy import and_, or_
+from sqlalchemy.dialects.postgresql import insert
+from dotenv import load_dotenv
+import base64
+import json
+import numpy as np
+import os
+
+load_dotenv()
 
 
 # Funkcje pomocnicze
 
 EARTH_RADIUS = 6371.0
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+# Odcinki wolniejsze niż próg [m/s] nie wliczają się do czasu ruchu
+MOVING_SPEED_THRESHOLD = float(os.getenv("MOVING_SPEED_THRESHOLD", 0.5))
+# Długości odcinków [m] zapisywanych przy zakończeniu trasy, np. "1000,1609.344"
+TRIP_SPLIT_DISTANCES = tuple(float(value) for value in os.getenv("TRIP_SPLIT_DISTANCES", "1000").split(","))
+# Krótsza końcówka trasy nie tworzy osobnego odcinka
+MIN_SPLIT_REMAINDER = 1.0
 
 
-async def add_trip_and_trip_summary_to_db(
-    session_id: str,
-    user_id: int,
-    summary_data: dict = {},
-):
-    """Funkcja do dodawania trasy i podsumowania do bazy danych"""
+async def register_trips(user_id: int, started_at_by_session_id: dict[str, datetime]) -> set[str]:
+    """Rejestracja tras jednym INSERT ... ON CONFLICT DO NOTHING; zwraca session_id tras faktycznie utworzonych.
+
+    Unikalny session_id rozstrzyga wyścig równoległych paczek tej samej sesji - trasę tworzy tylko jedna z nich.
+    """
+    if not started_at_by_session_id:
+        return set()
+    statement = (
+        insert(Trip)
+        .values([
+            {"session_id": session_id, "user_id": user_id, "started_at": started_at}
+            for session_id, started_at in started_at_by_session_id.items()
+        ])
+        .on_conflict_do_nothing(index_elements=[Trip.session_id])
+        .returning(Trip.session_id)
+    )
     async for session in pg_db.get_session():
-        trip = Trip(session_id=session_id, user_id=user_id)
-        session.add(trip)
+        result = await session.execute(statement)
         await session.commit()
-        await session.refresh(trip)
+        return set(result.scalars().all())
 
-        if summary_data:
-            trip_summary = TripSummary(
-                trip_id=trip.id,
-                session_id=session_id,
-                **summary_data
-            )
-            session.add(trip_summary)
-            await session.commit()
-            await session.refresh(trip)
+def encode_trip_cursor(started_at: Optional[datetime], trip_id: int) -> str:
+    """Kursor paginacji listy tras - pozycja ostatniej zwróconej trasy w kolejności (started_at, id)."""
+    payload = json.dumps([started_at.isoformat() if started_at else None, trip_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
 
-        return trip
+def decode_trip_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    try:
+        started_at, trip_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return (datetime.fromisoformat(started_at) if started_at else None), int(trip_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Nieprawidłowy kursor: {cursor}") from e
 
-def calculate_trip_metrics(trip_id: int, session_id: str, points: list[GPSPoint], weight: float = 50.0) -> Tuple[TripSummary, bool]:
-    """Funkcja do obliczania podsumowania trasy na podstawie punktów GPS."""
+async def select_trip_session_ids(user_id: int, limit: Optional[int] = None, cursor: Optional[str] = None) -> Tuple[list[str], Optional[str]]:
+    """Strona identyfikatorów sesji użytkownika od najnowszej (indeks ix_trip_user_id_started_at) i kursor następnej strony."""
+    statement = (
+        select(Trip.id, Trip.session_id, Trip.started_at)
+        .where(Trip.user_id == user_id)
+        .order_by(Trip.started_at.desc().nulls_last(), Trip.id.desc())
+    )
+    if cursor:
+        started_at, trip_id = decode_trip_cursor(cursor)
+        if started_at is None:
+            statement = statement.where(Trip.started_at.is_(None), Trip.id < trip_id)
+        else:
+            statement = statement.where(or_(
+                Trip.started_at < started_at,
+                and_(Trip.started_at == started_at, Trip.id < trip_id),
+                Trip.started_at.is_(None),
+            ))
+    if limit is not None:
+        statement = statement.limit(limit + 1)
 
-    if len(points) < 2:
-        return TripSummary(
-            trip_id=trip_id,
-            session_id=session_id,
-            start_time=points[0].timestamp if points else None,
-            end_time=None,
-            duration=None,
-            distance=None,
-            calories_burned=None
-        ), False
-
-    activity: TripActivity = points[0].activity
-
-    # Sortowanie punktów GPS według czasu
-    sorted_points = sorted(points, key=lambda p: p.timestamp)
-    start_time = sorted_points[0].timestamp
-    end_time = sorted_points[-1].timestamp if len(sorted_points) > 1 else None
-    duration = (end_time - start_time).total_seconds() if end_time else None
-
-    end_trip = sorted_points[-1].last_entry
-
-    distance = 0.0
-    for i in range(1, len(sorted_points)):
-        distance += haversine(
-            (sorted_points[i-1].latitude, sorted_points[i-1].longitude),
-            (sorted_points[i].latitude, sorted_points[i].longitude),
-            unit=Unit.METERS
+    async for session in pg_db.get_session():
+        rows = (await session.execute(statement)).all()
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_trip_cursor(rows[-1].started_at, rows[-1].id)
+    return [row.session_id for row in rows], next_cursor
+
+async def select_trip_summaries_in_area(
+    user_id: int,
+    bbox: geohash.BoundingBox,
+    limit: int,
+    center: Optional[Tuple[float, float]] = None,
+    radius: Optional[float] = None,
+) -> list[TripSummary]:
+    """Zakończone trasy użytkownika zaczynające lub kończące się w prostokącie (i w promieniu od `center`), od najnowszej.
+
+    Kandydaci z indeksów po prefiksach geohasha (zakresy [prefiks, prefiks~)), dokładny warunek sprawdzany na środku komórki.
+    """
+    conditions = [
+        and_(column.collate("C") >= prefix, column.collate("C") < prefix + "~")
+        for column in (TripSummary.start_geohash, TripSummary.end_geohash)
+        for prefix in geohash.covering_prefixes(bbox)
+    ]
+    statement = (
+        select(TripSummary)
+        .join(Trip, Trip.id == TripSummary.trip_id)
+        .where(Trip.user_id == user_id, or_(*conditions))
+        .order_by(TripSummary.start_time.desc())
+    )
+    async for session in pg_db.get_session():
+        candidates = (await session.execute(statement)).scalars().all()
+
+    def in_area(cell: Optional[str]) -> bool:
+        if cell is None:
+            return False
+        point = geohash.decode(cell)
+        if not bbox.contains(*point):
+            return False
+        return center is None or haversine(center, point, unit=Unit.METERS) <= radius
+
+    return [summary for summary in candidates if in_area(summary.start_geohash) or in_area(summary.end_geohash)][:limit]
+
+class GPSTrack(NamedTuple):
+    """Kolumnowa (NumPy) reprezentacja punktów GPS jednej trasy."""
+    timestamps: np.ndarray
+    latitudes: np.ndarray
+    longitudes: np.ndarray
+    last_entries: np.ndarray
+    activity: TripActivity
+
+    @classmethod
+    def from_points(cls, points: list[GPSPoint]) -> "GPSTrack":
+        """Kolumny budowane osobno przez np.fromiter (bez pośrednich krotek); znaczniki czasu jako mikrosekundy od epoki.
+
+        Strefa czasowa pomijana (strip_timezone) - jak w wierszach QuestDB, z których akumulator jest odbudowywany.
+        """
+        count = len(points)
+        timestamps = [point.timestamp for point in points]
+        if any(timestamp.tzinfo is not None for timestamp in timestamps):
+            timestamps = [strip_timezone(timestamp) for timestamp in timestamps]
+        return cls(
+            timestamps=np.fromiter(((timestamp - EPOCH) // MICROSECOND for timestamp in timestamps), dtype=np.int64, count=count).astype("datetime64[us]"),
+            latitudes=np.fromiter((point.latitude for point in points), dtype=np.float64, count=count),
+            longitudes=np.fromiter((point.longitude for point in points), dtype=np.float64, count=count),
+            last_entries=np.fromiter((bool(point.last_entry) for point in points), dtype=np.bool_, count=count),
+            activity=points[0].activity if points else TripActivity.RUNNING,
         )
 
-    user_weight: float = weight if weight else 50.0
-    calories_burned = distance * BurnedCaloriesRatio.get_ratio(activity=activity) * user_weight / 1000.0 if distance > 0 else 0
+    def sorted_by_time(self) -> "GPSTrack":
+        order = np.argsort(self.timestamps, kind="stable")
+        return self._replace(
+            timestamps=self.timestamps[order],
+            latitudes=self.latitudes[order],
+            longitudes=self.longitudes[order],
+            last_entries=self.last_entries[order],
+        )
+
+
+def strip_timezone(timestamp: datetime) -> datetime:
+    """Czas zegarowy urządzenia bez strefy - konwencja kolumny `at` w QuestDB, Trip.started_at i podsumowań tras."""
+    return timestamp.replace(tzinfo=None)
+
+def to_datetime(timestamp: np.datetime64) -> datetime:
+    """Konwersja znacznika czasu NumPy na (naiwny) datetime."""
+    return timestamp.astype("datetime64[us]").item()
+
+def calculate_segment_metrics(timestamps: np.ndarray, latitudes: np.ndarray, longitudes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Dystans [m], czas [s] i prędkość [m/s] kolejnych odcinków trasy - jedno przejście wektorowe."""
+    coordinates = np.column_stack((latitudes, longitudes))
+    distances = haversine_vector(coordinates[:-1], coordinates[1:], unit=Unit.METERS, check=False)
+    durations = np.diff(timestamps).astype("timedelta64[us]").astype(np.float64) / 1e6
+    speeds = np.divide(distances, durations, out=np.zeros_like(distances), where=durations > 0)
+    return distances, durations, speeds
+
+def calculate_location_fields(start: Tuple[float, float], end: Tuple[float, float], bbox: geohash.BoundingBox) -> dict:
+    """Pola lokalizacji podsumowania: geohash początku i końca oraz prostokąt obejmujący trasę."""
+    return {
+        "start_geohash": geohash.encode(*start),
+        "end_geohash": geohash.encode(*end),
+        **bbox._asdict(),
+    }
+
+def track_bounding_box(latitudes: np.ndarray, longitudes: np.ndarray) -> geohash.BoundingBox:
+    return geohash.BoundingBox(float(latitudes.min()), float(longitudes.min()), float(latitudes.max()), float(longitudes.max()))
 
-    # Jeżeli trasa nie zakończyła sie, to podsumowanie nie ma pola end_time
-    if end_trip:
-        final_end_time = sorted_points[-1].timestamp
-    else:
-        final_end_time = None
+def calculate_moving_time(durations: np.ndarray, speeds: np.ndarray) -> float:
+    return float(durations[speeds >= MOVING_SPEED_THRESHOLD].sum())
 
-    return (TripSummary(
+def calculate_speed_fields(distance: float, moving_time: float, max_speed: float) -> dict:
+    """Pola prędkości podsumowania; średnia prędkość liczona względem czasu ruchu."""
+    return {
+        "max_speed": max_speed,
+        "average_speed": distance / moving_time if moving_time > 0 else None,
+        "moving_time": moving_time,
+    }
+
+def find_split_boundaries(
+    distances: np.ndarray,
+    durations: np.ndarray,
+    speeds: np.ndarray,
+    split_distance: float,
+    start_distance: float = 0.0,
+    start_elapsed: float = 0.0,
+    start_moving_time: float = 0.0,
+) -> Tuple[list[float], list[float]]:
+    """Czas od startu i czas ruchu w chwilach przekroczenia kolejnych wielokrotności `split_distance`.
+
+    Jedno przejście po skumulowanym dystansie z interpolacją liniową wewnątrz odcinków; wartości `start_*`
+    pozwalają kontynuować obliczenia dla kolejnej paczki punktów.
+    """
+    cumulative_distance = start_distance + np.concatenate(([0.0], np.cumsum(distances)))
+    elapsed = start_elapsed + np.concatenate(([0.0], np.cumsum(durations)))
+    moving_time = start_moving_time + np.concatenate(([0.0], np.cumsum(np.where(speeds >= MOVING_SPEED_THRESHOLD, durations, 0.0))))
+    boundaries = np.arange(np.floor(start_distance / split_distance) + 1, np.floor(cumulative_distance[-1] / split_distance) + 1) * split_distance
+    return np.interp(boundaries, cumulative_distance, elapsed).tolist(), np.interp(boundaries, cumulative_distance, moving_time).tolist()
+
+def build_splits(
+    trip_id: int,
+    split_distance: float,
+    boundaries: Tuple[list[float], list[float]],
+    distance: float,
+    elapsed: float,
+    moving_time: float,
+) -> list[TripSplit]:
+    """Odcinki trasy z granic z find_split_boundaries oraz łącznego dystansu, czasu i czasu ruchu."""
+    boundary_elapsed, boundary_moving_time = boundaries
+    edges_elapsed = [0.0, *boundary_elapsed]
+    edges_moving_time = [0.0, *boundary_moving_time]
+    lengths = [split_distance] * len(boundary_elapsed)
+    remainder = distance - len(lengths) * split_distance
+    if remainder >= MIN_SPLIT_REMAINDER:
+        edges_elapsed.append(elapsed)
+        edges_moving_time.append(moving_time)
+        lengths.append(remainder)
+
+    splits = []
+    for index, length in enumerate(lengths):
+        split_moving_time = edges_moving_time[index + 1] - edges_moving_time[index]
+        average_speed = length / split_moving_time if split_moving_time > 0 else None
+        splits.append(TripSplit(
             trip_id=trip_id,
-            session_id=session_id,
-            start_time=start_time,
-            end_time=final_end_time,
-            duration=duration,
-            distance=distance,
-            calories_burned=calories_burned,
-            activity=activity,
-        ), end_trip)
+            split_distance=split_distance,
+            index=index,
+            distance=length,
+            duration=edges_elapsed[index + 1] - edges_elapsed[index],
+            moving_time=split_moving_time,
+            average_speed=average_speed,
+            pace=1000.0 / average_speed if average_speed else None,
+        ))
+    return splits
+
+def calculate_splits(trip_id: int, track: GPSTrack, split_distance: float) -> list[TripSplit]:
+    """Odcinki trasy o zadanej długości na podstawie punktów GPS."""
+    if len(track.timestamps) < 2:
+        return []
+    track = track.sorted_by_time()
+    distances, durations, speeds = calculate_segment_metrics(track.timestamps, track.latitudes, track.longitudes)
+    return build_splits(
+        trip_id=trip_id,
+        split_distance=split_distance,
+        boundaries=find_split_boundaries(distances, durations, speeds, split_distance),
+        distance=float(distances.sum()),
+        elapsed=float(durations.sum()),
+        moving_time=calculate_moving_time(durations, speeds),
+    )
+
+def calculate_calories(distance: float, activity: TripActivity, weight: float | None) -> float:
+    user_weight: float = weight if weight else 50.0
+    return distance * BurnedCaloriesRatio.get_ratio(activity=activity) * user_weight / 1000.0 if distance > 0 else 0
@@ -0,0 +1,66 @@
+"""Pamięć podręczna uwierzytelnionych użytkowników (TTL + limit rozmiaru LRU), kluczowana podmiotem tokenu."""
+from collections import OrderedDict
+from typing import Optional
+from dotenv import load_dotenv
+import os
+import time
+from fitapp_api.users.models import User, UserCacheStats
+
+load_dotenv()
+
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", 60))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", 10000))
+
+
+class UserCache:
+    def __init__(self, ttl_seconds: float = USER_CACHE_TTL_SECONDS, max_size: int = USER_CACHE_MAX_SIZE) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[float, User]] = OrderedDict()
+        self._subjects_by_user_id: dict[int, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, subject: str) -> Optional[User]:
+        entry = self._entries.get(subject)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(subject)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(subject)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, subject: str, user: User) -> None:
+        if self.ttl_seconds <= 0 or self.max_size <= 0:
+            return
+        self._entries[subject] = (time.monotonic() + self.ttl_seconds, user)
+        self._entries.move_to_end(subject)
+        self._subjects_by_user_id[user.id] = subject
+        while len(self._entries) > self.max_size:
+            oldest_subject = next(iter(self._entries))
+            self._remove(oldest_subject)
+            self.evictions += 1
+
+    def invalidate(self, subject: Optional[str] = None, user_id: Optional[int] = None) -> None:
+        if user_id is not None:
+            subject = self._subjects_by_user_id.get(user_id, subject)
+        if subject is not None:
+            self._remove(subject)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._subjects_by_user_id.clear()
+
+    def stats(self) -> UserCacheStats:
+        return UserCacheStats(size=len(self._entries), hits=self.hits, misses=self.misses, evictions=self.evictions)
+
+    def _remove(self, subject: str) -> None:
+        entry = self._entries.pop(subject, None)
+        if entry is not None and self._subjects_by_user_id.get(entry[1].id) == subject:
+            del self._subjects_by_user_id[entry[1].id]
+
+
+user_cache = UserCache()
@@ -83,3 +83,9 @@ class UserResponse(BaseModel):
     class Config:
         from_attributes = True
 
+
+class UserCacheStats(BaseModel):
+    size: int
+    hits: int
+    misses: int
+    evictions: int
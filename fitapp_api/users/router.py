@@ -7,7 +7,10 @@ from passlib.context import CryptContext
 from jose import JWTError, jwt
 from datetime import datetime, timedelta, timezone
 from typing import Optional
-from fitapp_api.users.models import User, UserDetails, UserCreate, UserResponse, Gender, UserFcmID
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+from fitapp_api.users.models import User, UserDetails, UserCreate, UserResponse, Gender, UserFcmID, UserCacheStats
+from fitapp_api.users.cache import user_cache
 from fitapp_api.postgres.db import PostgresDB
 import os
 from dotenv import load_dotenv
@@ -19,8 +22,13 @@ user_router = APIRouter()
 SECRET_KEY = os.getenv("SECRET_KEY", "secret-key")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 300))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASHING_WORKERS = int(os.getenv("PASSWORD_HASHING_WORKERS", 2))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hasze o innym koszcie niż BCRYPT_ROUNDS są oznaczane do aktualizacji (rehash przy logowaniu)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+# Dedykowana, ograniczona pula - bcrypt nie blokuje pętli zdarzeń ani domyślnego executora
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASHING_WORKERS, thread_name_prefix="password-hashing")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login")
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -29,6 +37,15 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """Weryfikacja hasła w puli haszującej; zwraca nowy hasz, jeśli zapisany ma nieaktualny koszt."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(password_executor, get_password_hash, password)
+
 async def get_user_by_email(email: str, db: AsyncSession) -> Optional[User]:
     statement = select(User).where(User.email == email)
     result = await db.execute(statement)
@@ -36,8 +53,15 @@ async def get_user_by_email(email: str, db: AsyncSession) -> Optional[User]:
 
 async def authenticate_user(email: str, password: str, db: AsyncSession) -> Optional[User]:
     user = await get_user_by_email(email, db)
-    if not user or not verify_password(password, user.hashed_password):
+    if not user:
         return None
+    verified, new_hash = await verify_and_update_password(password, user.hashed_password)
+    if not verified:
+        return None
+    if new_hash:
+        user.hashed_password = new_hash
+        db.add(user)
+        await db.commit()
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -59,11 +83,15 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+    user = user_cache.get(email)
+    if user is not None:
+        return user
     statement = select(User).where(User.email == email).options(selectinload(User.details))
     result = await db.execute(statement)
     user = result.scalar_one_or_none()
     if user is None:
         raise credentials_exception
+    user_cache.put(email, user)
     return user
 
 async def get_current_admin_user(current_user: User = Depends(get_current_user)) -> User:
@@ -77,7 +105,7 @@ async def register(user_data: UserCreate, db: AsyncSession = Depends(PostgresDB(
     if await get_user_by_email(user_data.email, db):
         raise HTTPException(status_code=400, detail="Konto z tym adresem emailem już istnieje!")
     
-    hashed_password = get_password_hash(user_data.password.get_secret_value())
+    hashed_password = await hash_password(user_data.password.get_secret_value())
     
     new_user = User(
         name=user_data.name,
@@ -98,6 +126,7 @@ async def register(user_data: UserCreate, db: AsyncSession = Depends(PostgresDB(
     )
     db.add(user_details)
     await db.commit()
+    user_cache.invalidate(subject=new_user.email)
 
     statement = select(User).where(User.id == new_user.id).options(selectinload(User.details))
     result = await db.execute(statement)
@@ -123,6 +152,7 @@ async def update_user_details(user_details_data: UserDetails, current_user: User
     db.add(user_details)
     await db.commit()
     await db.refresh(user_details)
+    user_cache.invalidate(subject=current_user.email, user_id=current_user.id)
 
     statement = select(User).where(User.id == current_user.id).options(selectinload(User.details))
     result = await db.execute(statement)
@@ -190,8 +220,13 @@ async def delete_user(user_id: int, current_user: User = Depends(get_current_adm
         raise HTTPException(status_code=404, detail="Podany użytkownik nie istnieje!")
     await db.delete(user)
     await db.commit()
+    user_cache.invalidate(subject=user.email, user_id=user_id)
     return {"message": "Pomyślnie usunięto użytkownika!"}
 
+@user_router.get("/cache/stats")
+async def get_user_cache_stats(current_user: User = Depends(get_current_admin_user)) -> UserCacheStats:
+    return user_cache.stats()
+
 @user_router.get("/protected")
 async def protected_route(current_user: User = Depends(get_current_user)):
     return {"message": f"Witaj, {current_user.name}! To chroniony endpoint."}
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+from typing import Optional
+import random
+import pytest
+from sqlalchemy import MetaData, create_engine
+from sqlmodel import Session
+from fitapp_api.gps.models import GPSPoint
+from fitapp_api.postgres.db import pg_db
+from fitapp_api.statistics.models import DailyActivityRollup
+from fitapp_api.trips.enums import TripActivity
+from fitapp_api.trips.models import Trip, TripSplit, TripSummary
+
+START_TIME = datetime(2025, 5, 1, 8, 0, 0)
+
+
+def make_points(
+    count: int,
+    session_id: str = "session",
+    start_time: datetime = START_TIME,
+    first_second: int = 0,
+    finished: bool = True,
+    activity: TripActivity = TripActivity.RUNNING,
+    seed: Optional[int] = None,
+    user_id: int = 1,
+) -> list[GPSPoint]:
+    """Punkty co sekundę od `start_time + first_second`; z `seed` - losowe przesunięcia współrzędnych i mikrosekund.
+
+    Bez `seed` trasa jest prostą na północ (~11 m na punkt), więc kolejne paczki (`first_second`) ją kontynuują.
+    `finished` - ostatni punkt ma last_entry.
+    """
+    rng = random.Random(seed) if seed is not None else None
+    latitude, longitude = 52.2297, 21.0122
+    points = []
+    for second in range(first_second, first_second + count):
+        timestamp = start_time + timedelta(seconds=second)
+        if rng is not None:
+            latitude += rng.uniform(-0.0001, 0.0001)
+            longitude += rng.uniform(-0.0001, 0.0001)
+            timestamp += timedelta(microseconds=rng.randrange(1000))
+        else:
+            latitude = 52.2297 + second * 0.0001
+        points.append(GPSPoint(
+            session_id=session_id,
+            timestamp=timestamp,
+            user_id=user_id,
+            latitude=latitude,
+            longitude=longitude,
+            last_entry=finished and second == first_second + count - 1,
+            activity=activity,
+        ))
+    return points
+
+
+class SessionAdapter:
+    """Synchroniczna sesja SQLite z interfejsem AsyncSession używanym przez router."""
+
+    def __init__(self, session: Session) -> None:
+        self.session = session
+
+    def add(self, instance) -> None:
+        self.session.add(instance)
+
+    async def execute(self, statement):
+        # Wynik w pamięci jak w asyncpg - commit przed odczytem RETURNING
+        result = self.session.execute(statement)
+        return result.freeze()() if getattr(result, "returns_rows", True) else result
+
+    async def commit(self) -> None:
+        self.session.commit()
+
+    async def rollback(self) -> None:
+        self.session.rollback()
+
+    async def refresh(self, instance, attribute_names=None) -> None:
+        self.session.refresh(instance, attribute_names=attribute_names)
+
+
+@pytest.fixture
+def sqlite_engine():
+    """SQLite w pamięci z kopiami tabel tras - bez indeksów specyficznych dla PostgreSQL (COLLATE "C", NULLS LAST).
+
+    Indeksy unikalne zostają - na nich opiera się INSERT ... ON CONFLICT.
+    """
+    metadata = MetaData()
+    for model in (Trip, TripSummary, TripSplit, DailyActivityRollup):
+        table = model.__table__.to_metadata(metadata)
+        table.indexes.difference_update([index for index in table.indexes if not index.unique])
+    engine = create_engine("sqlite://")
+    metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def pg_session(monkeypatch, sqlite_engine):
+    """pg_db.get_session zwracające sesje SQLite z `sqlite_engine`."""
+    async def get_session():
+        with Session(sqlite_engine, expire_on_commit=False) as session:
+            yield SessionAdapter(session)
+
+    monkeypatch.setattr(pg_db, "get_session", get_session)
+    return sqlite_engine
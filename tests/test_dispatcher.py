@@ -0,0 +1,72 @@
+"""Wysyłka powiadomień FCM przez FCMDispatcher z podstawioną funkcją `send`."""
+import asyncio
+import threading
+import time
+from collections import Counter
+from pyfcm.errors import FCMNotRegisteredError, FCMServerError
+from fitapp_api.reminders.dispatcher import FCMDispatcher, PushMessage
+
+
+class FakeSend:
+    """Blokujące `send(token, title, body)`: wyjątki z kolejki danego tokenu, potem sukces; liczy wywołania i współbieżność."""
+
+    def __init__(self, errors: dict[str, list[Exception]] | None = None, delay: float = 0.0) -> None:
+        self.errors = {token: list(token_errors) for token, token_errors in (errors or {}).items()}
+        self.delay = delay
+        self.calls = Counter()
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, token: str, title: str, body: str) -> dict:
+        with self._lock:
+            self.calls[token] += 1
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            error = self.errors[token].pop(0) if self.errors.get(token) else None
+        try:
+            time.sleep(self.delay)
+            if error is not None:
+                raise error
+            return {"name": token}
+        finally:
+            with self._lock:
+                self.active -= 1
+
+def dispatch(send: FakeSend, tokens: list[str], **kwargs):
+    dispatcher = FCMDispatcher(send=send, rate_per_second=0, backoff_seconds=0, **kwargs)
+    try:
+        return asyncio.run(dispatcher.dispatch(PushMessage(token=token, title="Tytuł", body="Treść") for token in tokens))
+    finally:
+        dispatcher.shutdown()
+
+
+def test_retries_server_errors():
+    send = FakeSend(errors={
+        "flaky": [FCMServerError("503"), FCMServerError("503")],
+        "down": [FCMServerError("503")] * 10,
+    })
+
+    report = dispatch(send, ["ok", "flaky", "down"], max_retries=3)
+
+    assert send.calls == {"ok": 1, "flaky": 3, "down": 4}
+    assert (report.sent, report.failed, report.retries) == (2, 1, 5)
+    assert report.invalid_tokens == []
+
+def test_not_registered_token_is_reported_without_retry():
+    send = FakeSend(errors={"stale": [FCMNotRegisteredError("UNREGISTERED")], "broken": [ValueError("bad payload")]})
+
+    report = dispatch(send, ["stale", "ok", "broken"])
+
+    assert send.calls == {"stale": 1, "ok": 1, "broken": 1}
+    assert (report.sent, report.failed, report.retries) == (1, 2, 0)
+    assert report.invalid_tokens == ["stale"]
+
+def test_concurrency_cap():
+    send = FakeSend(delay=0.02)
+
+    report = dispatch(send, [f"token-{index}" for index in range(12)], concurrency=3)
+
+    assert report.sent == 12
+    assert send.max_active == 3
+    assert report.duration_seconds > 0 and report.throughput_per_second > 0
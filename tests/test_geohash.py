@@ -0,0 +1,23 @@
+"""Geohash pojedynczego punktu względem wersji wektorowej."""
+import random
+import numpy as np
+import pytest
+from fitapp_api.gps.geohash import MAX_GEOHASH_PRECISION, decode_bbox, encode, encode_many
+
+
+@pytest.mark.parametrize("precision", range(1, MAX_GEOHASH_PRECISION + 1))
+def test_encode_matches_encode_many(precision):
+    rng = random.Random(precision)
+    points = [(rng.uniform(-90, 90), rng.uniform(-180, 180)) for _ in range(500)]
+    points += [(90.0, 180.0), (-90.0, -180.0), (0.0, 0.0), (52.2297, 21.0122)]
+    latitudes = np.array([latitude for latitude, _ in points])
+    longitudes = np.array([longitude for _, longitude in points])
+    assert [encode(latitude, longitude, precision) for latitude, longitude in points] == encode_many(latitudes, longitudes, precision)
+
+def test_encoded_cell_contains_point():
+    assert encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert decode_bbox(encode(52.2297, 21.0122, 9)).contains(52.2297, 21.0122)
+
+def test_invalid_precision():
+    with pytest.raises(ValueError):
+        encode(52.0, 21.0, 0)
@@ -0,0 +1,120 @@
+"""Workery zapisu ILP - zamykanie połączeń po błędach i odporność na nieoczekiwane wyjątki."""
+import asyncio
+import threading
+import pytest
+from fitapp_api.gps import db as gps_db_module
+from fitapp_api.gps.db import GPSDB
+
+
+class FakeBuffer:
+    def __init__(self) -> None:
+        self.rows = []
+
+    def row(self, **row) -> None:
+        self.rows.append(row)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+
+class FakeSender:
+    def __init__(self, senders: list["FakeSender"]) -> None:
+        self.closed = False
+        senders.append(self)
+
+    def establish(self) -> None:
+        pass
+
+    def new_buffer(self) -> FakeBuffer:
+        return FakeBuffer()
+
+    def flush(self, buffer: FakeBuffer, transactional: bool = False) -> None:
+        if any(row.get("fail") for row in buffer.rows):
+            raise RuntimeError("flush failed")
+
+    def close(self) -> None:
+        self.closed = True
+
+
+@pytest.fixture
+def gps_db(monkeypatch):
+    db = GPSDB()
+    senders: list[FakeSender] = []
+    monkeypatch.setattr(db, "get_new_sender", lambda: FakeSender(senders))
+    yield db, senders
+
+def test_failed_sender_is_closed(gps_db):
+    db, senders = gps_db
+
+    async def scenario():
+        await db.start_ingest_workers()
+        with pytest.raises(RuntimeError):
+            await db.write_rows([{"fail": True}])
+        await db.write_rows([{"fail": False}])
+        await db.close()
+
+    asyncio.run(scenario())
+    # Każde połączenie zamknięte - również to, na którym flush się nie powiódł
+    assert senders and all(sender.closed for sender in senders)
+    assert db.get_ingest_stats().failed_requests >= 1
+
+def test_stats_error_does_not_fail_flushed_rows(gps_db, monkeypatch):
+    db, _ = gps_db
+
+    def record_flush(**kwargs):
+        raise ValueError("unexpected")
+
+    monkeypatch.setattr(db, "_record_flush", record_flush)
+
+    async def scenario():
+        await db.start_ingest_workers()
+        # Wiersze zapisane - błąd statystyk nie może skłonić klienta do ponowienia (duplikaty punktów)
+        for _ in range(3):
+            await db.write_rows([{"fail": False}])
+        await asyncio.wait_for(db.close(), 5)
+
+    asyncio.run(scenario())
+
+def test_unexpected_error_does_not_stop_worker(gps_db, monkeypatch):
+    db, _ = gps_db
+
+    def flush_rows(sender, rows):
+        raise ValueError("flush failed")
+
+    def close_sender(sender):
+        raise TypeError("unexpected")
+
+    monkeypatch.setattr(db, "_flush_rows", flush_rows)
+    monkeypatch.setattr(db, "_close_sender", close_sender)
+
+    async def scenario():
+        await db.start_ingest_workers()
+        for _ in range(3):
+            with pytest.raises(TypeError):
+                await db.write_rows([{"fail": False}])
+        await asyncio.wait_for(db.close(), 5)
+
+    asyncio.run(scenario())
+
+def test_close_fails_batch_in_flight(gps_db, monkeypatch):
+    db, _ = gps_db
+    release = threading.Event()
+
+    def flush_rows(sender, rows):
+        release.wait(5)
+        return 0
+
+    monkeypatch.setattr(db, "_flush_rows", flush_rows)
+    monkeypatch.setattr(gps_db_module, "QDB_SHUTDOWN_TIMEOUT", 0.05)
+
+    async def scenario():
+        await db.start_ingest_workers()
+        write = asyncio.create_task(db.write_rows([{"fail": False}]))
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(db.close(), 5)
+        release.set()
+        # Worker anulowany w trakcie flushu - zlecenie nie może czekać w nieskończoność
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(write, 1)
+
+    asyncio.run(scenario())
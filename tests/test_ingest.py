@@ -0,0 +1,115 @@
+"""Zapis punktów GPS (insert_gps_points_to_db) - spójność akumulatora z wierszami QuestDB i rejestracja tras."""
+import asyncio
+from datetime import timedelta, timezone
+import pytest
+from sqlalchemy import select
+from sqlmodel import Session
+from fitapp_api import misc
+from fitapp_api.trips.accumulators import TripAccumulator, trip_accumulators
+from fitapp_api.trips.models import Trip
+from fitapp_api.trips.cache import known_trip_sessions
+from fitapp_api.trips.utils import GPSTrack
+from tests.conftest import START_TIME, make_points
+
+
+@pytest.fixture
+def questdb_rows(monkeypatch):
+    """Wiersze ILP zapisane przez insert_gps_points_to_db (zamiast QuestDB)."""
+    rows = []
+
+    async def write_rows(batch):
+        await asyncio.sleep(0)
+        rows.extend(batch)
+
+    monkeypatch.setattr(misc.gps_db, "write_rows", write_rows)
+    yield rows
+    for session_id in {row["symbols"]["session_id"] for row in rows}:
+        trip_accumulators.discard(session_id)
+        known_trip_sessions.discard(session_id)
+
+def rebuild_from_rows(rows: list[dict]) -> TripAccumulator:
+    """Odbudowa akumulatora jak get_trip_accumulator - z wierszy odczytanych z QuestDB."""
+    points = misc.gps_points_from_rows([
+        (row["at"], row["symbols"]["user_id"], row["symbols"]["session_id"], row["symbols"]["last_entry"],
+         row["columns"]["latitude"], row["columns"]["longitude"], row["columns"]["activity"])
+        for row in sorted(rows, key=lambda row: row["at"])
+    ])
+    return TripAccumulator.from_track(session_id=points[0].session_id, track=GPSTrack.from_points(points))
+
+
+@pytest.mark.parametrize("offset", [timedelta(hours=2), timedelta(hours=-5, minutes=-30), timedelta(0)])
+def test_ingest_summary_matches_rebuilt_summary(questdb_rows, monkeypatch, offset):
+    started_at = {}
+
+    async def register_trips(user_id, started_at_by_session_id):
+        started_at.update(started_at_by_session_id)
+        return set(started_at_by_session_id)
+
+    monkeypatch.setattr(misc, "register_trips", register_trips)
+    session_id = f"offset-{offset}"
+    points = make_points(120, session_id=session_id, start_time=START_TIME.replace(tzinfo=timezone(offset)), seed=5)
+
+    async def ingest():
+        for index in range(0, len(points), 40):
+            await misc.insert_gps_points_to_db(points[index:index + 40])
+
+    asyncio.run(ingest())
+    ingest_summary, finished = trip_accumulators.get(session_id).to_summary(trip_id=1)
+    rebuilt_summary, _ = rebuild_from_rows(questdb_rows).to_summary(trip_id=1)
+
+    assert finished
+    assert ingest_summary.start_time == rebuilt_summary.start_time == START_TIME.replace(microsecond=ingest_summary.start_time.microsecond)
+    assert ingest_summary.end_time == rebuilt_summary.end_time
+    assert started_at[session_id] == ingest_summary.start_time
+    for field in ("duration", "distance", "moving_time", "max_speed"):
+        assert getattr(ingest_summary, field) == pytest.approx(getattr(rebuilt_summary, field))
+
+@pytest.mark.parametrize("delayed_batch", [None, 0, 1])
+@pytest.mark.parametrize("reverse", [False, True])
+def test_concurrent_batches_of_new_session(questdb_rows, monkeypatch, pg_session, delayed_batch, reverse):
+    session_id = f"concurrent-{delayed_batch}-{reverse}"
+    points = make_points(80, session_id=session_id, seed=3)
+    batches = [points[:40], points[40:]]
+    if reverse:
+        batches.reverse()
+    register_trips = misc.register_trips
+
+    async def delayed_register_trips(user_id, started_at_by_session_id):
+        # Wstrzymanie jednej z paczek po rejestracji - druga aktualizuje akumulator pierwsza
+        created = await register_trips(user_id=user_id, started_at_by_session_id=started_at_by_session_id)
+        if delayed_batch is not None and started_at_by_session_id.get(session_id) == batches[delayed_batch][0].timestamp:
+            await asyncio.sleep(0.01)
+        return created
+
+    monkeypatch.setattr(misc, "register_trips", delayed_register_trips)
+
+    async def ingest():
+        await asyncio.gather(*(misc.insert_gps_points_to_db(batch) for batch in batches))
+
+    asyncio.run(ingest())
+
+    with Session(pg_session) as session:
+        trips = session.execute(select(Trip.session_id, Trip.started_at)).all()
+    assert len(trips) == 1
+    assert trips[0].session_id == session_id
+    assert len(questdb_rows) == len(points)
+    # Akumulator w pamięci tylko kompletny - inaczej brak i odbudowa z QuestDB przy odczycie
+    accumulator = trip_accumulators.get(session_id)
+    if accumulator is not None:
+        assert accumulator.to_summary(trip_id=1) == rebuild_from_rows(questdb_rows).to_summary(trip_id=1)
+
+def test_gps_points_from_rows():
+    rows = [
+        (START_TIME, "7", "session", "false", 52.2297, 21.0122, 2),
+        (START_TIME + timedelta(seconds=1), "7", "session", "true", 52.2298, 21.0123, 1),
+    ]
+
+    for point, (timestamp, user_id, session_id, last_entry, latitude, longitude, activity) in zip(misc.gps_points_from_rows(rows), rows):
+        validated = misc.GPSPoint(
+            session_id=session_id, timestamp=timestamp, user_id=user_id, latitude=latitude, longitude=longitude,
+            acceleration=0.0, last_entry=last_entry == "true", activity=activity,
+        )
+        assert point == validated
+        assert point.model_dump() == validated.model_dump()
+        assert point.model_fields_set == validated.model_fields_set
+        assert point.model_copy(update={"latitude": 0.0}).latitude == 0.0
@@ -0,0 +1,45 @@
+"""Middleware profilowania - naraz profilowane jest jedno żądanie, pozostałe nie czekają."""
+import asyncio
+from fitapp_api.monitoring import profiling
+from fitapp_api.monitoring.profiling import ProfilingMiddleware
+
+
+def make_scope(path: str) -> dict:
+    return {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": [(b"x-profile", b"1")]}
+
+def test_concurrent_profiled_requests_do_not_wait(monkeypatch):
+    admin_checks = 0
+
+    async def is_admin_request(scope):
+        nonlocal admin_checks
+        admin_checks += 1
+        await asyncio.sleep(0)
+        return True
+
+    monkeypatch.setattr(profiling, "is_admin_request", is_admin_request)
+    release = asyncio.Event()
+    completed = []
+
+    async def app(scope, receive, send):
+        if scope["path"] == "/slow":
+            await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+        completed.append(scope["path"])
+
+    async def send(message):
+        pass
+
+    async def scenario():
+        middleware = ProfilingMiddleware(app)
+        # Oba żądania przechodzą weryfikację administratora, zanim którekolwiek zacznie profilowanie
+        slow = asyncio.create_task(middleware(make_scope("/slow"), None, send))
+        fast = asyncio.create_task(middleware(make_scope("/fast"), None, send))
+        await asyncio.wait_for(fast, 1)
+        assert completed == ["/fast"]
+        release.set()
+        await slow
+
+    asyncio.run(scenario())
+    assert admin_checks == 2
+    assert len(profiling.profile_reports.list()) == 1
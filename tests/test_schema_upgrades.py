@@ -0,0 +1,31 @@
+"""Wybór duplikatów tras usuwanych przed utworzeniem unikalnego indeksu session_id."""
+from datetime import datetime
+from sqlalchemy import text
+from sqlmodel import Session
+from fitapp_api.postgres.db import DUPLICATE_TRIP_IDS
+from fitapp_api.trips.models import Trip, TripSummary
+
+
+def test_duplicate_trip_ids(sqlite_engine):
+    trips = [
+        Trip(id=1, session_id="no-summaries", user_id=1),
+        Trip(id=2, session_id="no-summaries", user_id=1),
+        Trip(id=3, session_id="later-summary", user_id=1),
+        Trip(id=4, session_id="later-summary", user_id=1),
+        Trip(id=5, session_id="both-summaries", user_id=1),
+        Trip(id=6, session_id="both-summaries", user_id=1),
+        Trip(id=7, session_id="unique", user_id=1),
+    ]
+    summaries = [
+        TripSummary(trip_id=trip_id, session_id=session_id, start_time=datetime(2025, 5, 1), end_time=datetime(2025, 5, 1, 1))
+        for trip_id, session_id in ((4, "later-summary"), (5, "both-summaries"), (6, "both-summaries"), (7, "unique"))
+    ]
+    with Session(sqlite_engine) as session:
+        # Baza sprzed unikalnego indeksu session_id
+        session.execute(text("DROP INDEX ix_trip_session_id"))
+        session.add_all(trips)
+        session.add_all(summaries)
+        session.commit()
+        duplicate_ids = sorted(session.execute(text(DUPLICATE_TRIP_IDS)).scalars())
+    # Zostaje najstarsza trasa sesji, chyba że podsumowanie ma tylko nowsza; z kilku podsumowań - najmniejsze id
+    assert duplicate_ids == [2, 3, 6]
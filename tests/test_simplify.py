@@ -0,0 +1,31 @@
+"""Pamięć podręczna uproszczonych przebiegów - budżet punktów i unieważnianie sesji."""
+from fitapp_api.gps.simplify import SimplifiedTracksCache
+from tests.conftest import make_points
+
+
+def test_point_budget_evicts_least_recently_used():
+    cache = SimplifiedTracksCache(max_points=10)
+    cache.put("a", 5.0, None, make_points(4))
+    cache.put("b", 5.0, None, make_points(4))
+    assert cache.get("a", 5.0, None) is not None
+    cache.put("c", None, 100, make_points(4))
+    assert cache.get("b", 5.0, None) is None
+    assert cache.get("a", 5.0, None) is not None and cache.get("c", None, 100) is not None
+    assert cache.size_points == 8
+
+def test_track_larger_than_budget_is_not_cached():
+    cache = SimplifiedTracksCache(max_points=10)
+    cache.put("a", 5.0, None, make_points(4))
+    cache.put("b", 5.0, None, make_points(11))
+    assert cache.get("b", 5.0, None) is None
+    assert cache.get("a", 5.0, None) is not None
+
+def test_invalidate_removes_all_variants_of_session():
+    cache = SimplifiedTracksCache(max_points=100)
+    cache.put("a", 5.0, None, make_points(4))
+    cache.put("a", None, 50, make_points(4), "10s:avg")
+    cache.put("b", 5.0, None, make_points(4))
+    cache.invalidate("a")
+    assert cache.get("a", 5.0, None) is None and cache.get("a", None, 50, "10s:avg") is None
+    assert cache.get("b", 5.0, None) is not None
+    assert cache.size_points == 4
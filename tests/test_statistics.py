@@ -0,0 +1,142 @@
+"""Statystyki z agregacji w bazie (i dziennych sum) względem sumowania tras w Pythonie."""
+from collections import namedtuple
+from datetime import datetime, timedelta
+import random
+import pytest
+from sqlmodel import Session
+from fitapp_api.statistics.models import DailyActivityRollup
+from fitapp_api.statistics.router import (
+    generate_statistics_for_trips,
+    generate_statistics_from_activity_totals,
+    select_activity_totals,
+    select_activity_totals_with_rollups,
+)
+from fitapp_api.trips.enums import TripActivity
+from fitapp_api.trips.models import Trip, TripSummary
+
+ActivityTotals = namedtuple("ActivityTotals", ["activity", "distance", "time", "calories_burned", "count"])
+USER_ID = 7
+
+
+def make_trips(count: int, seed: int = 1, user_id: int = USER_ID) -> list[Trip]:
+    rng = random.Random(seed)
+    activities = [TripActivity.RUNNING, TripActivity.CYCLING, TripActivity.WALKING, TripActivity.SWIMMING]
+    trips = []
+    for index in range(count):
+        start_time = datetime(2025, 4, 1) + timedelta(minutes=rng.randrange(30 * 24 * 60))
+        duration = rng.uniform(600, 7200)
+        trip = Trip(id=index + 1, session_id=f"{user_id}-{index}", user_id=user_id, started_at=start_time)
+        trip.summary = TripSummary(
+            trip_id=trip.id,
+            session_id=trip.session_id,
+            start_time=start_time,
+            # Część tras kończy się po północy (dzienne sumy liczą trasę w dniu rozpoczęcia)
+            end_time=start_time + timedelta(seconds=duration),
+            duration=duration,
+            distance=rng.uniform(0, 20000) if index % 9 else None,
+            calories_burned=rng.uniform(0, 900) if index % 11 else None,
+            activity=rng.choice(activities),
+        )
+        trips.append(trip)
+    return trips
+
+def python_totals(trips: list[Trip]) -> list[ActivityTotals]:
+    """Sumy per aktywność jak z SQL (SUM pomija NULL, brak wiersza dla aktywności bez tras)."""
+    rows = []
+    for activity in TripActivity:
+        summaries = [trip.summary for trip in trips if trip.summary.activity == activity]
+        if summaries:
+            rows.append(ActivityTotals(
+                activity=activity,
+                distance=sum(summary.distance for summary in summaries if summary.distance is not None),
+                time=sum(summary.duration for summary in summaries if summary.duration is not None),
+                calories_burned=sum(summary.calories_burned for summary in summaries if summary.calories_burned is not None),
+                count=len(summaries),
+            ))
+    return rows
+
+def assert_same_statistics(actual, expected) -> None:
+    assert actual.user_id == expected.user_id
+    assert actual.most_liked_activity == expected.most_liked_activity
+    for field in ("average_speed", "total_distance", "total_time", "total_calories_burned"):
+        assert getattr(actual, field) == pytest.approx(getattr(expected, field), rel=1e-9)
+    assert [activity.activity for activity in actual.activities] == [activity.activity for activity in expected.activities]
+    for actual_activity, expected_activity in zip(actual.activities, expected.activities):
+        assert actual_activity.count == expected_activity.count
+        for field in ("distance", "time", "calories_burned"):
+            assert getattr(actual_activity, field) == pytest.approx(getattr(expected_activity, field), rel=1e-9)
+
+def store_trips(engine, trips: list[Trip]) -> None:
+    """Zapis tras wraz z dziennymi sumami (odpowiednik rebuild_daily_rollups)."""
+    rollups: dict[tuple, DailyActivityRollup] = {}
+    for trip in trips:
+        summary = trip.summary
+        key = (trip.user_id, summary.start_time.date(), summary.activity)
+        rollup = rollups.setdefault(key, DailyActivityRollup(user_id=key[0], day=key[1], activity=key[2]))
+        rollup.distance += summary.distance or 0.0
+        rollup.duration += summary.duration or 0.0
+        rollup.calories_burned += summary.calories_burned or 0.0
+        rollup.count += 1
+    with Session(engine, expire_on_commit=False) as session:
+        session.add_all(trips)
+        session.add_all(rollups.values())
+        session.commit()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_activity_totals_match_trips(seed):
+    trips = make_trips(40, seed=seed)
+    rows = python_totals(trips)
+    random.Random(seed).shuffle(rows)
+    assert_same_statistics(generate_statistics_from_activity_totals(user_id=USER_ID, rows=rows), generate_statistics_for_trips(trips))
+
+def test_single_activity_and_empty_totals():
+    trips = make_trips(1)
+    assert_same_statistics(generate_statistics_from_activity_totals(user_id=USER_ID, rows=python_totals(trips)), generate_statistics_for_trips(trips))
+
+    empty = generate_statistics_from_activity_totals(user_id=USER_ID, rows=[])
+    assert empty.activities == [] and empty.most_liked_activity is None
+    assert empty.total_distance == empty.total_time == empty.average_speed == 0.0
+
+def test_most_liked_activity_tie_uses_activity_order():
+    trips = make_trips(2)
+    trips[0].summary.activity = TripActivity.WALKING
+    trips[1].summary.activity = TripActivity.CYCLING
+    rows = python_totals(trips)[::-1]
+    statistics = generate_statistics_from_activity_totals(user_id=USER_ID, rows=rows)
+    assert statistics.most_liked_activity == generate_statistics_for_trips(trips).most_liked_activity == TripActivity.CYCLING
+
+@pytest.mark.parametrize("start_time, end_time", [
+    (datetime(2025, 3, 1), datetime(2025, 6, 1)),
+    (datetime(2025, 4, 5, 13, 30), datetime(2025, 4, 20, 8, 15)),
+    (datetime(2025, 4, 10, 6), datetime(2025, 4, 10, 22)),
+    (datetime(2025, 4, 2), datetime(2025, 4, 25, 0, 30)),
+    (datetime(2025, 4, 2), datetime(2025, 4, 4)),
+])
+@pytest.mark.parametrize("select_totals", [select_activity_totals, select_activity_totals_with_rollups])
+def test_database_totals_match_trips(sqlite_engine, start_time, end_time, select_totals):
+    trips = make_trips(200) + make_trips(20, seed=2, user_id=USER_ID + 1)
+    for index, trip in enumerate(trips):
+        trip.id = index + 1
+        trip.summary.trip_id = trip.id
+    store_trips(sqlite_engine, trips)
+    selected = [
+        trip for trip in trips
+        if trip.user_id == USER_ID and trip.summary.start_time >= start_time and trip.summary.end_time <= end_time
+    ]
+
+    with Session(sqlite_engine) as session:
+        rows = session.execute(select_totals(user_id=USER_ID, start_time=start_time, end_time=end_time)).all()
+    assert_same_statistics(generate_statistics_from_activity_totals(user_id=USER_ID, rows=rows), generate_statistics_for_trips(selected))
+
+def test_rollup_totals_skip_trips_ending_after_end_time(sqlite_engine):
+    trips = make_trips(3)
+    for trip, (start_time, hours) in zip(trips, [(datetime(2025, 4, 20, 10), 1), (datetime(2025, 4, 24, 10), 1), (datetime(2025, 4, 24, 23), 2)]):
+        trip.summary.start_time = start_time
+        trip.summary.end_time = start_time + timedelta(hours=hours)
+    store_trips(sqlite_engine, trips)
+
+    # Trasa z ostatniego pełnego dnia kończy się po end_time (tuż po północy)
+    with Session(sqlite_engine) as session:
+        rows = session.execute(select_activity_totals_with_rollups(user_id=USER_ID, start_time=datetime(2025, 4, 2), end_time=datetime(2025, 4, 25, 0, 30))).all()
+    assert_same_statistics(generate_statistics_from_activity_totals(user_id=USER_ID, rows=rows), generate_statistics_for_trips(trips[:2]))
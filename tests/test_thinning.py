@@ -0,0 +1,77 @@
+"""Przerzedzanie punktów GPS przy zapisie: punkty zawsze zachowywane, ciągłość między paczkami i ubytek dystansu."""
+import random
+import pytest
+from benchmarks.synthetic import generate_track_points
+from fitapp_api.gps.thinning import KeptPoint, thin_points
+from fitapp_api.trips.enums import TripActivity
+from fitapp_api.trips.utils import GPSTrack, calculate_segment_metrics
+from tests.conftest import make_points
+
+THINNING_DISTANCE = 3.0
+
+
+def stationary_points(count: int, **kwargs):
+    """Punkty co sekundę w jednym miejscu (postój)."""
+    return [point.model_copy(update={"latitude": 52.2297}) for point in make_points(count, **kwargs)]
+
+def kept_point(point) -> KeptPoint:
+    return KeptPoint(point.timestamp, point.latitude, point.longitude)
+
+def track_distance(points) -> float:
+    track = GPSTrack.from_points(points)
+    return float(calculate_segment_metrics(track.timestamps, track.latitudes, track.longitudes)[0].sum())
+
+
+def test_keeps_first_last_and_last_entry_points():
+    points = stationary_points(10, finished=False)
+    points[4] = points[4].model_copy(update={"last_entry": True})
+
+    assert thin_points(points, distance=THINNING_DISTANCE) == [points[0], points[4], points[9]]
+
+def test_disabled_or_moving_points_are_kept():
+    points = make_points(10)
+
+    assert thin_points(stationary_points(10), distance=0) == stationary_points(10)
+    assert thin_points(points, distance=THINNING_DISTANCE) == points
+
+def test_keeps_point_after_max_interval():
+    points = stationary_points(10, finished=False)
+
+    assert thin_points(points, distance=THINNING_DISTANCE, max_interval=4) == [points[0], points[4], points[8], points[9]]
+
+def test_continues_across_batches_from_last_kept_point():
+    first = stationary_points(5, finished=False)
+    second = stationary_points(5, first_second=5)
+
+    kept = thin_points(first, distance=THINNING_DISTANCE)
+    assert kept == [first[0], first[4]]
+    # Pierwszy punkt kolejnej paczki porównywany z ostatnim zachowanym punktem poprzedniej
+    assert thin_points(second, last_kept=kept_point(kept[-1]), distance=THINNING_DISTANCE) == [second[4]]
+
+def test_resets_reference_when_batch_goes_back_in_time():
+    points = stationary_points(5, first_second=10)
+
+    last_kept = kept_point(points[2])
+    assert thin_points(points, last_kept=last_kept, distance=THINNING_DISTANCE) == [points[0], points[4]]
+
+@pytest.mark.parametrize("activity, tolerance", [
+    (TripActivity.RUNNING, 0.005),
+    (TripActivity.WALKING, 0.01),
+    (TripActivity.CYCLING, 0.0),
+    (TripActivity.SWIMMING, 0.05),
+])
+@pytest.mark.parametrize("batch_size", [1800, 60, 7])
+def test_thinned_distance_within_tolerance(activity, tolerance, batch_size):
+    points = generate_track_points("session", 1, 1800, activity=activity, rng=random.Random(0))
+
+    kept, last_kept = [], None
+    for start in range(0, len(points), batch_size):
+        batch = thin_points(points[start:start + batch_size], last_kept=last_kept, distance=THINNING_DISTANCE)
+        kept.extend(batch)
+        last_kept = kept_point(batch[-1])
+
+    original, thinned = track_distance(points), track_distance(kept)
+    assert kept[0] == points[0] and kept[-1] == points[-1]
+    assert thinned <= original
+    assert original - thinned <= 2 * THINNING_DISTANCE * (len(points) - len(kept))
+    assert original - thinned <= tolerance * original
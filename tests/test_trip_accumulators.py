@@ -0,0 +1,36 @@
+"""Przyrostowe akumulatory tras przy współbieżnych paczkach punktów."""
+from fitapp_api.trips.accumulators import TripAccumulator, TripAccumulatorStore
+from fitapp_api.trips.utils import GPSTrack
+from tests.conftest import make_points
+
+
+def make_track(first_second: int, count: int) -> GPSTrack:
+    return GPSTrack.from_points(make_points(count, first_second=first_second, finished=False))
+
+def test_creating_batch_after_skipped_batch_is_not_cached():
+    store = TripAccumulatorStore()
+    # Paczka istniejącej już trasy przetworzona przed paczką, która trasę utworzyła
+    store.add_points(session_id="session", track=make_track(10, 10), new_session=False)
+    store.add_points(session_id="session", track=make_track(0, 10), new_session=True)
+    assert store.get("session") is None
+
+    # Odbudowa z QuestDB (wszystkie punkty) trafia do pamięci
+    store.begin_rebuild("session")
+    store.finish_rebuild(TripAccumulator.from_track(session_id="session", track=make_track(0, 20)))
+    assert store.get("session").point_count == 20
+
+def test_creating_batch_first_is_cached():
+    store = TripAccumulatorStore()
+    store.add_points(session_id="session", track=make_track(0, 10), new_session=True)
+    store.add_points(session_id="session", track=make_track(10, 10), new_session=False)
+    assert store.get("session").point_count == 20
+
+def test_skipped_sessions_are_bounded():
+    store = TripAccumulatorStore(max_sessions=2)
+    for session_id in ("a", "b", "c"):
+        store.add_points(session_id=session_id, track=make_track(0, 2), new_session=False)
+    # Najstarszy wpis wypchnięty - paczka tworząca trasę "a" trafia do pamięci
+    store.add_points(session_id="a", track=make_track(0, 2), new_session=True)
+    assert store.get("a") is not None
+    store.add_points(session_id="c", track=make_track(0, 2), new_session=True)
+    assert store.get("c") is None
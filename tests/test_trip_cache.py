@@ -0,0 +1,119 @@
+"""Pamięć podręczna odpowiedzi zakończonych tras: ETagi, budżet bajtów, unieważnianie i właściciel trasy."""
+import asyncio
+from datetime import timedelta
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session
+from fitapp_api.gps.models import PointsFormat, ResolutionMode
+from fitapp_api.trips import router as trips_router
+from fitapp_api.trips.cache import CachedTripResponse, TripResponseCache, etag_matches, trip_responses
+from fitapp_api.trips.models import Trip, TripSummary
+from fitapp_api.users.models import User
+from tests.conftest import START_TIME, make_points
+
+ETAG = '"0123456789abcdef"'
+
+
+def entry(body: bytes, user_id: int = 1) -> CachedTripResponse:
+    return CachedTripResponse.from_body(user_id=user_id, body=body, media_type="application/json")
+
+def make_user(user_id: int, is_admin: bool = False) -> User:
+    return User(id=user_id, name="Jan", last_name="Kowalski", email=f"user{user_id}@example.com", hashed_password="x", is_admin=is_admin)
+
+
+@pytest.mark.parametrize("if_none_match, matches", [
+    (None, False),
+    ("", False),
+    (ETAG, True),
+    (f"W/{ETAG}", True),
+    (f'"other", {ETAG}', True),
+    (f'"other", W/{ETAG}', True),
+    ('"other", W/"another"', False),
+    ("*", True),
+    (" * ", True),
+    ('"0123456789abcdef', False),
+])
+def test_etag_matches(if_none_match, matches):
+    assert etag_matches(if_none_match, ETAG) is matches
+
+def test_cached_response_returns_304_for_matching_etag():
+    cached = entry(b'{"session_id": "a"}')
+
+    assert cached.to_response().status_code == 200
+    assert cached.to_response().headers["ETag"] == cached.etag
+    not_modified = cached.to_response(if_none_match=f"W/{cached.etag}")
+    assert not_modified.status_code == 304
+    assert not_modified.body == b""
+    assert not_modified.headers["Vary"] == "Accept"
+
+def test_evicts_least_recently_used_over_max_bytes():
+    cache = TripResponseCache(max_bytes=10)
+    cache.put(("a", "json"), entry(b"1234"))
+    cache.put(("b", "json"), entry(b"1234"))
+    cache.get(("a", "json"))
+    cache.put(("c", "json"), entry(b"1234"))
+
+    assert cache.get(("b", "json")) is None
+    assert cache.get(("a", "json")) is not None and cache.get(("c", "json")) is not None
+    assert cache.size_bytes == 8
+    # Odpowiedź większa od budżetu nie jest zapisywana i nie usuwa innych
+    cache.put(("d", "json"), entry(b"x" * 11))
+    assert cache.get(("d", "json")) is None
+    assert cache.size_bytes == 8
+
+def test_put_replaces_entry_size():
+    cache = TripResponseCache(max_bytes=10)
+    cache.put(("a", "json"), entry(b"1234"))
+    cache.put(("a", "json"), entry(b"12"))
+
+    assert cache.size_bytes == 2
+
+def test_invalidate_removes_every_variant():
+    cache = TripResponseCache()
+    for key in [("a", "json", None, None, None), ("a", "columnar", 5.0, None, None), ("a", "json", None, 100, "10s:avg"), ("b", "json", None, None, None)]:
+        cache.put(key, entry(b"body"))
+
+    cache.invalidate("a")
+
+    assert cache.get(("a", "json", None, None, None)) is None
+    assert cache.get(("a", "columnar", 5.0, None, None)) is None
+    assert cache.get(("a", "json", None, 100, "10s:avg")) is None
+    assert cache.get(("b", "json", None, None, None)) is not None
+    assert cache.size_bytes == len(b"body")
+
+
+def test_cached_trip_served_only_to_owner_or_admin(monkeypatch, pg_session):
+    session_id = "cached-trip"
+    points = make_points(20, session_id=session_id)
+    fetched = []
+
+    async def get_gps_points_by_trip_id(session_id, resolution=None, resolution_mode=ResolutionMode.AVG):
+        fetched.append(session_id)
+        return points
+
+    monkeypatch.setattr(trips_router, "get_gps_points_by_trip_id", get_gps_points_by_trip_id)
+    with Session(pg_session) as session:
+        session.add(Trip(id=1, session_id=session_id, user_id=1))
+        session.add(TripSummary(trip_id=1, session_id=session_id, start_time=START_TIME, end_time=START_TIME + timedelta(seconds=19)))
+        session.commit()
+
+    def get_trip(user: User, if_none_match=None):
+        return asyncio.run(trips_router.get_trip_summary(
+            session_id=session_id, format=PointsFormat.JSON, tolerance=None, max_points=None, resolution=None,
+            resolution_mode=ResolutionMode.AVG, accept=None, if_none_match=if_none_match, current_user=user,
+        ))
+
+    try:
+        owner = get_trip(make_user(1))
+        assert owner.status_code == 200
+        assert get_trip(make_user(1), if_none_match=owner.headers["ETag"]).status_code == 304
+        assert get_trip(make_user(3, is_admin=True)).body == owner.body
+        assert fetched == [session_id]
+
+        # Wpis w pamięci podręcznej nie omija sprawdzenia właściciela
+        with pytest.raises(HTTPException) as error:
+            get_trip(make_user(2))
+        assert error.value.status_code == 403
+        assert fetched == [session_id]
+    finally:
+        trip_responses.invalidate(session_id)
@@ -0,0 +1,73 @@
+"""Stronicowanie listy tras kursorem (started_at, id) - trasy z datą i bez daty rozpoczęcia."""
+import asyncio
+import base64
+from datetime import timedelta
+import pytest
+from fastapi import HTTPException, Response
+from sqlmodel import Session
+from fitapp_api.trips import router as trips_router
+from fitapp_api.trips.models import Trip
+from fitapp_api.trips.utils import encode_trip_cursor, select_trip_session_ids
+from fitapp_api.users.models import User
+from tests.conftest import START_TIME
+
+# (id, started_at) - powtórzone daty, trasy bez daty przeplecione z datowanymi oraz trasy innego użytkownika
+TRIPS = [
+    (1, START_TIME),
+    (2, None),
+    (3, START_TIME + timedelta(hours=1)),
+    (4, START_TIME),
+    (5, None),
+    (6, START_TIME + timedelta(hours=2)),
+    (7, START_TIME + timedelta(hours=1)),
+    (8, None),
+]
+EXPECTED = ["trip-6", "trip-7", "trip-3", "trip-4", "trip-1", "trip-8", "trip-5", "trip-2"]
+
+
+@pytest.fixture
+def trips(pg_session):
+    with Session(pg_session) as session:
+        for trip_id, started_at in TRIPS:
+            session.add(Trip(id=trip_id, session_id=f"trip-{trip_id}", user_id=1, started_at=started_at))
+        session.add(Trip(id=100, session_id="other-user", user_id=2, started_at=START_TIME))
+        session.add(Trip(id=101, session_id="other-user-undated", user_id=2))
+        session.commit()
+
+def collect_pages(limit: int) -> list[list[str]]:
+    pages, cursor = [], None
+    while True:
+        session_ids, cursor = asyncio.run(select_trip_session_ids(user_id=1, limit=limit, cursor=cursor))
+        pages.append(session_ids)
+        if cursor is None:
+            return pages
+
+
+def test_without_limit_returns_all_trips(trips):
+    assert asyncio.run(select_trip_session_ids(user_id=1)) == (EXPECTED, None)
+
+@pytest.mark.parametrize("limit", range(1, len(TRIPS) + 2))
+def test_pages_have_no_duplicates_or_gaps(trips, limit):
+    pages = collect_pages(limit)
+
+    assert [session_id for page in pages for session_id in page] == EXPECTED
+    assert all(len(page) == limit for page in pages[:-1])
+    assert 0 < len(pages[-1]) <= limit
+
+def test_cursor_after_last_undated_trip_returns_empty_page(trips):
+    assert asyncio.run(select_trip_session_ids(user_id=1, limit=2, cursor=encode_trip_cursor(None, 2))) == ([], None)
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor!",
+    base64.urlsafe_b64encode(b"[1]").decode(),
+    base64.urlsafe_b64encode(b'["2025-05-01T08:00:00", "x"]').decode(),
+    base64.urlsafe_b64encode(b"[1, 2]").decode(),
+    base64.urlsafe_b64encode(b'{"started_at": null}').decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+])
+def test_malformed_cursor_returns_400(trips, cursor):
+    user = User(id=1, name="Jan", last_name="Kowalski", email="user@example.com", hashed_password="x")
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(trips_router.get_trips_by_user_id(response=Response(), limit=1, cursor=cursor, current_user=user))
+    assert error.value.status_code == 400
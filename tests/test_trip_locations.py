@@ -0,0 +1,46 @@
+"""Uzupełnianie lokalizacji podsumowań zapisanych przed wprowadzeniem geohashy."""
+import asyncio
+from datetime import timedelta
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlmodel import Session
+from fitapp_api.gps import geohash
+from fitapp_api.trips import locations
+from fitapp_api.trips.models import Trip, TripSummary
+from tests.conftest import START_TIME, make_points
+
+
+def test_backfill_fills_only_finished_summaries_without_location(monkeypatch, pg_session):
+    points = {session_id: make_points(30, session_id=session_id) for session_id in ("old", "in-progress")}
+
+    async def get_gps_points_by_trip_id(session_id):
+        if session_id not in points:
+            raise HTTPException(status_code=404, detail="Brak punktów GPS dla tej sesji")
+        return points[session_id]
+
+    monkeypatch.setattr(locations, "get_gps_points_by_trip_id", get_gps_points_by_trip_id)
+    with Session(pg_session) as session:
+        for trip_id, session_id, end_time, start_geohash in [
+            (1, "old", START_TIME + timedelta(seconds=29), None),
+            (2, "in-progress", None, None),
+            (3, "no-points", START_TIME + timedelta(seconds=29), None),
+            (4, "current", START_TIME + timedelta(seconds=29), "u3qcnh"),
+        ]:
+            session.add(Trip(id=trip_id, session_id=session_id, user_id=1))
+            session.add(TripSummary(trip_id=trip_id, session_id=session_id, start_time=START_TIME, end_time=end_time, start_geohash=start_geohash))
+        session.commit()
+
+    assert asyncio.run(locations.backfill_trip_locations(batch_size=1)) == 1
+    # Kolejne uruchomienie pomija uzupełnione podsumowania
+    assert asyncio.run(locations.backfill_trip_locations()) == 0
+
+    with Session(pg_session) as session:
+        summaries = {summary.session_id: summary for summary in session.execute(select(TripSummary)).scalars()}
+    old = points["old"]
+    assert summaries["old"].start_geohash == geohash.encode(old[0].latitude, old[0].longitude)
+    assert summaries["old"].end_geohash == geohash.encode(old[-1].latitude, old[-1].longitude)
+    assert summaries["old"].min_latitude == old[0].latitude
+    assert summaries["old"].max_latitude == old[-1].latitude
+    assert summaries["in-progress"].start_geohash is None
+    assert summaries["no-points"].start_geohash is None
+    assert summaries["current"].start_geohash == "u3qcnh"
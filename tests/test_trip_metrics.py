@@ -0,0 +1,113 @@
+"""Podsumowanie trasy z akumulatora (jednorazowo i paczkami) względem pierwotnej pętli skalarnej."""
+from datetime import datetime, timedelta, timezone
+import random
+import pytest
+from haversine import haversine, Unit
+from fitapp_api.gps.models import GPSPoint
+from fitapp_api.trips.accumulators import TripAccumulator, calculate_trip_metrics
+from fitapp_api.trips.enums import BurnedCaloriesRatio, TripActivity
+from fitapp_api.trips.utils import GPSTrack, calculate_splits, strip_timezone
+from tests.conftest import make_points
+
+# Noc zmiany czasu w Europie
+DST_START = datetime(2025, 3, 30, 0, 59, 30, 123456)
+
+
+def scalar_trip_metrics(points: list[GPSPoint], weight: float = 50.0) -> dict:
+    """Kopia pierwotnej implementacji (sortowanie + pętla haversine)."""
+    if len(points) < 2:
+        return dict(start_time=points[0].timestamp if points else None, end_time=None, duration=None, distance=None, calories_burned=None, end_trip=False)
+    activity = points[0].activity
+    sorted_points = sorted(points, key=lambda p: p.timestamp)
+    start_time = sorted_points[0].timestamp
+    end_time = sorted_points[-1].timestamp
+    duration = (end_time - start_time).total_seconds() if end_time else None
+    end_trip = sorted_points[-1].last_entry
+    distance = 0.0
+    for i in range(1, len(sorted_points)):
+        distance += haversine((sorted_points[i - 1].latitude, sorted_points[i - 1].longitude), (sorted_points[i].latitude, sorted_points[i].longitude), unit=Unit.METERS)
+    user_weight = weight if weight else 50.0
+    calories_burned = distance * BurnedCaloriesRatio.get_ratio(activity=activity) * user_weight / 1000.0 if distance > 0 else 0
+    return dict(
+        start_time=start_time,
+        end_time=sorted_points[-1].timestamp if end_trip else None,
+        duration=duration,
+        distance=distance,
+        calories_burned=calories_burned,
+        end_trip=end_trip,
+    )
+
+def expected_time(timestamp):
+    """Podsumowania mają czas zegarowy urządzenia bez strefy (jak wiersze w QuestDB)."""
+    return strip_timezone(timestamp) if timestamp is not None else None
+
+def incremental_summary(points: list[GPSPoint], batches: int, weight: float):
+    """Akumulator budowany paczkami w kolejności czasu (wewnątrz paczki kolejność dowolna), jak przy zapisie punktów."""
+    ordered = sorted(points, key=lambda point: expected_time(point.timestamp))
+    size = -(-len(ordered) // batches)
+    chunks = [ordered[index:index + size] for index in range(0, len(ordered), size)]
+    for chunk in chunks:
+        random.Random(len(chunk)).shuffle(chunk)
+    accumulator = TripAccumulator.from_track(session_id="session", track=GPSTrack.from_points(chunks[0]))
+    for chunk in chunks[1:]:
+        assert accumulator.update(GPSTrack.from_points(chunk))
+    return accumulator.to_summary(trip_id=1, weight=weight)
+
+def assert_same_summary(summary, end_trip, expected) -> None:
+    assert end_trip == expected["end_trip"]
+    assert summary.start_time == expected_time(expected["start_time"])
+    assert summary.end_time == expected_time(expected["end_time"])
+    for field in ("duration", "distance", "calories_burned"):
+        if expected[field] is None:
+            assert getattr(summary, field) is None
+        else:
+            assert getattr(summary, field) == pytest.approx(expected[field], rel=1e-9, abs=1e-9)
+
+def assert_same_metrics(points: list[GPSPoint], weight: float = 50.0) -> None:
+    expected = scalar_trip_metrics(points, weight)
+    assert_same_summary(*calculate_trip_metrics(trip_id=1, session_id="session", points=points, weight=weight), expected)
+    if len(points) >= 2:
+        for batches in (2, 3, 7):
+            if batches <= len(points):
+                assert_same_summary(*incremental_summary(points, batches, weight), expected)
+
+
+@pytest.mark.parametrize("count", [0, 1, 2, 3, 500])
+@pytest.mark.parametrize("finished", [True, False])
+def test_matches_scalar_loop(count, finished):
+    assert_same_metrics(make_points(count, start_time=DST_START, finished=finished, seed=1))
+
+@pytest.mark.parametrize("seed", range(5))
+def test_shuffled_points(seed):
+    points = make_points(200, start_time=DST_START, seed=seed)
+    random.Random(seed).shuffle(points)
+    assert_same_metrics(points, weight=72.5)
+
+@pytest.mark.parametrize("tz", [timezone.utc, timezone(timedelta(hours=2)), timezone(timedelta(hours=-5, minutes=-30))])
+@pytest.mark.parametrize("count", [1, 2, 50])
+def test_timezone_aware_points(tz, count):
+    points = make_points(count, start_time=DST_START.replace(tzinfo=tz), seed=count)
+    random.Random(count).shuffle(points)
+    assert_same_metrics(points)
+
+def test_activity_and_zero_weight():
+    assert_same_metrics(make_points(30, start_time=DST_START, activity=TripActivity.CYCLING, seed=1), weight=0)
+
+def test_incremental_splits_match_full_track():
+    points = make_points(600, start_time=DST_START, seed=4)
+    summary, _ = calculate_trip_metrics(trip_id=1, session_id="session", points=points)
+    incremental, _ = incremental_summary(points, batches=9, weight=50.0)
+    full = calculate_splits(trip_id=1, track=GPSTrack.from_points(points), split_distance=1000.0)
+    for splits in (summary.splits, incremental.splits):
+        assert [split.index for split in splits] == [split.index for split in full]
+        for split, expected in zip(splits, full):
+            assert split.distance == pytest.approx(expected.distance)
+            assert split.duration == pytest.approx(expected.duration)
+            assert split.moving_time == pytest.approx(expected.moving_time)
+
+def test_from_points_timestamps():
+    points = make_points(100, start_time=DST_START, seed=1)
+    points.append(points[-1].model_copy(update={"timestamp": datetime(1969, 12, 31, 23, 59, 59, 999999)}))
+    points.append(points[-1].model_copy(update={"timestamp": datetime(2400, 2, 29, 12, 0, 0, 1)}))
+    track = GPSTrack.from_points(points)
+    assert track.timestamps.astype(datetime).tolist() == [point.timestamp for point in points]
@@ -0,0 +1,48 @@
+"""Uzupełnianie podsumowań strony tras - zapisywane są tylko zakończone trasy."""
+import asyncio
+from datetime import timedelta
+from sqlalchemy import select
+from sqlmodel import Session
+from fitapp_api.trips import router as trips_router
+from fitapp_api.trips.accumulators import TripAccumulator, trip_accumulators
+from fitapp_api.trips.models import Trip, TripSplit, TripSummary
+from fitapp_api.trips.utils import GPSTrack
+from fitapp_api.users.models import User
+from tests.conftest import START_TIME, SessionAdapter, make_points
+
+
+def test_mixed_page_persists_only_finished_trips(monkeypatch, sqlite_engine):
+    saved_rollups = []
+
+    async def add_summary_to_daily_rollups(session, user_id, summary):
+        saved_rollups.append(summary.session_id)
+
+    monkeypatch.setattr(trips_router, "add_summary_to_daily_rollups", add_summary_to_daily_rollups)
+    with Session(sqlite_engine, expire_on_commit=False) as session:
+        trips = [Trip(session_id=session_id, user_id=1) for session_id in ("finished", "in-progress", "single-point")]
+        session.add_all(trips)
+        session.commit()
+        for trip, (count, finished) in zip(trips, [(50, True), (50, False), (1, False)]):
+            trip_accumulators.put(TripAccumulator.from_track(session_id=trip.session_id, track=GPSTrack.from_points(make_points(count, session_id=trip.session_id, finished=finished))))
+
+        user = User(id=1, name="Jan", last_name="Kowalski", email="user@example.com", hashed_password="x")
+        summaries = asyncio.run(trips_router.ensure_trip_summaries(session=SessionAdapter(session), trips=trips, current_user=user))
+
+        assert list(summaries) == ["finished", "in-progress", "single-point"]
+        assert summaries["finished"].end_time == START_TIME + timedelta(seconds=49)
+        assert summaries["in-progress"].end_time is None
+        assert summaries["in-progress"].distance > 0
+        assert summaries["single-point"].end_time is None
+        assert saved_rollups == ["finished"]
+        assert trips[1].summary is None and trips[2].summary is None
+        # Zakończona trasa zamknięta, pozostałe nadal w toku
+        assert trip_accumulators.get("finished") is None
+        assert trip_accumulators.get("in-progress") is not None
+
+    with Session(sqlite_engine) as session:
+        stored = session.execute(select(TripSummary.session_id, TripSummary.end_time)).all()
+        assert stored == [("finished", START_TIME + timedelta(seconds=49))]
+        assert set(session.execute(select(TripSplit.trip_id)).scalars()) <= {trips[0].id}
+
+    for session_id in ("in-progress", "single-point"):
+        trip_accumulators.discard(session_id)